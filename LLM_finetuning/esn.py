@@ -0,0 +1,131 @@
+import argparse
+import time
+from typing import Optional
+import numpy as np
+
+
+class EchoStateNetwork:
+    """
+    Leaky echo state network fed one value at a time, with a linear readout trained online by
+    recursive least squares. The reservoir is random and fixed, scaled to the spectral radius,
+    so an update costs a few small matrix-vector products and no refit of the past.
+    """
+    def __init__(self, reservoir_size: int = 30, spectral_radius: float = 0.9, input_scaling: float = 1.0,
+                 leak_rate: float = 0.5, forgetting: float = 0.99, regularization: float = 1e-2, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.W_in = rng.uniform(-input_scaling, input_scaling, (reservoir_size, 2))  # Input and bias
+        W_res = rng.uniform(-1, 1, (reservoir_size, reservoir_size))
+        self.W_res = W_res * spectral_radius / np.max(np.abs(np.linalg.eigvals(W_res)))
+        self.leak_rate = leak_rate
+        self.forgetting = forgetting
+        self.state = np.zeros(reservoir_size)
+        # Readout on the reservoir state, the input and a bias, and the inverse correlation matrix of RLS
+        self.W_out = np.zeros(reservoir_size + 2)
+        self.P = np.eye(reservoir_size + 2) / regularization
+
+    def features(self, state: np.ndarray, value: float) -> np.ndarray:
+        return np.r_[state, value, 1.0]
+
+    def step(self, state: np.ndarray, value: float) -> np.ndarray:
+        """Reservoir state after feeding value to state."""
+        update = np.tanh(self.W_in @ np.array([value, 1.0]) + self.W_res @ state)
+        return (1 - self.leak_rate) * state + self.leak_rate * update
+
+    def predict(self, value: float) -> float:
+        """Prediction of the value following value, from the current state."""
+        return float(self.W_out @ self.features(self.step(self.state, value), value))
+
+    def fit(self, value: float, target: float):
+        """Feed value to the reservoir and move the readout towards predicting target from it (one RLS step)."""
+        self.state = self.step(self.state, value)
+        x = self.features(self.state, value)
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.W_out += gain * (target - self.W_out @ x)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+
+    def forecast(self, value: float, horizon: int) -> np.ndarray:
+        """The next horizon values after value, each prediction being fed back as the next input."""
+        state = self.state
+        predictions = np.empty(horizon)
+        for i in range(horizon):
+            state = self.step(state, value)
+            value = float(self.W_out @ self.features(state, value))
+            predictions[i] = value
+        return predictions
+
+
+class LossCurveEstimator:
+    """
+    Forecasts the rest of a loss curve from the losses seen so far and estimates when training stops
+    paying off.
+
+    The network learns the change of the log loss (relative to the first loss) from one evaluation to
+    the next, so the forecast follows the shape of the curve rather than its scale. The forecast of
+    the best loss is the running minimum of the forecast, as a checkpoint of the best model is kept.
+    Training stops paying off at the first evaluation after which the forecast best loss improves by
+    less than min_improvement (relative) over the rest of the horizon.
+    """
+    def __init__(self, horizon: int = 50, min_improvement: float = 0.03, warmup: int = 10, **esn_args):
+        self.esn = EchoStateNetwork(**esn_args)
+        self.horizon = horizon
+        self.min_improvement = min_improvement
+        self.warmup = warmup
+        self.losses = []
+        self.deltas = []
+
+    def update(self, loss: float) -> Optional[int]:
+        """Add the loss of the latest evaluation and return stop_index(), None during the warmup."""
+        y = np.log(loss / self.losses[0]) if self.losses else 0.0
+        if self.losses:
+            delta = y - np.log(self.losses[-1] / self.losses[0])
+            if self.deltas:
+                self.esn.fit(self.deltas[-1], delta)
+            self.deltas.append(delta)
+        self.losses.append(loss)
+        return self.stop_index() if len(self.losses) > self.warmup else None
+
+    def forecast(self, horizon: Optional[int] = None) -> np.ndarray:
+        """Forecast losses of the next horizon evaluations."""
+        horizon = horizon or self.horizon
+        if not self.deltas:
+            return np.full(horizon, self.losses[-1] if self.losses else np.nan)
+        deltas = self.esn.forecast(self.deltas[-1], horizon)
+        return self.losses[-1] * np.exp(np.cumsum(deltas))
+
+    def stop_index(self) -> int:
+        """Index of the evaluation (counting from the first one) at which training should stop."""
+        best = np.minimum.accumulate(np.r_[min(self.losses), self.forecast()])
+        # Relative gain still to come after each evaluation of the horizon
+        remaining = (best - best[-1]) / best
+        return len(self.losses) - 1 + int(np.argmax(remaining < self.min_improvement))
+
+
+def replay(losses: np.ndarray, **estimator_args):
+    """Feed losses to a LossCurveEstimator one by one. Returns the estimate after each loss and the time each update took (s)."""
+    estimator = LossCurveEstimator(**estimator_args)
+    estimates, durations = [], []
+    for loss in losses:
+        start = time.perf_counter()
+        estimates.append(estimator.update(float(loss)))
+        durations.append(time.perf_counter() - start)
+    return estimates, np.array(durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay an eval_loss.txt log through the ESN loss-curve estimator")
+    parser.add_argument('losses', type=str, nargs="?", default="eval_loss.txt", help="File with one eval loss per line")
+    parser.add_argument('--horizon', type=int, default=50, help="Number of evaluations forecast")
+    parser.add_argument('--min-improvement', type=float, default=0.03, help="Relative improvement of the best loss over the horizon worth training for")
+    parser.add_argument('--warmup', type=int, default=10, help="Number of evaluations before the first estimate")
+    args = parser.parse_args()
+
+    losses = np.loadtxt(args.losses, ndmin=1)
+    estimates, durations = replay(losses, horizon=args.horizon, min_improvement=args.min_improvement, warmup=args.warmup)
+    stop = next((i for i, estimate in enumerate(estimates) if estimate is not None and estimate <= i), None)
+    print(f"Update time: {durations.mean() * 1000:.3f} ms on average, {durations.max() * 1000:.3f} ms at most")
+    if stop is None:
+        print(f"No stop estimated over the {len(losses)} evaluations, best loss {losses.min():.4f}")
+    else:
+        print(f"Stop at evaluation {stop} with loss {losses[stop]:.4f} (best so far {losses[:stop + 1].min():.4f}), "
+              f"{len(losses) - stop - 1} of {len(losses)} evaluations saved, final best loss {losses.min():.4f}")
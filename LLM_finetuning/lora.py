@@ -55,6 +55,7 @@ trainingArgs = TrainingArguments(
     per_device_train_batch_size=4 if "large" not in model_name else 2,
     evaluation_strategy="steps",  # Run evaluation every few steps
     eval_steps=100,               # Validate every 500 steps
+    logging_steps=100,            # Log the train loss as often, for the overfitting check
     save_strategy="epoch",        # Save checkpoint at the end of each epoch
     learning_rate=2e-4,
 )
@@ -67,12 +68,11 @@ peft_config = LoraConfig(
       task_type="CAUSAL_LM",
 )
 
-# Set the loss threshold
-loss_threshold = 0.1  # Example threshold
 # Initialize the custom callback with the output directory
 # Initialize the custom callback with the model and tokenizer
+# It stops training on a plateau, divergence or overfitting of the eval loss, or when its forecast flattens
 loss_threshold_callback = LossThresholdCallback(
-    threshold=loss_threshold,
+    threshold=None,  # No fixed threshold
     output_dir=trainingArgs.output_dir,
     model=model,
     tokenizer=tokenizer
@@ -0,0 +1,96 @@
+import argparse
+from typing import Optional, Tuple
+import numpy as np
+
+
+def window_slope(values) -> Tuple[float, float]:
+    """Least-squares slope of values per evaluation and its standard error (0 for fewer than 3 values)."""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n < 2:
+        return 0.0, 0.0
+    x = np.arange(n) - (n - 1) / 2
+    slope = float(x @ values / (x @ x))
+    if n < 3:
+        return slope, 0.0
+    residuals = values - values.mean() - slope * x
+    return slope, float(np.sqrt(residuals @ residuals / (n - 2) / (x @ x)))
+
+
+class PlateauDetector:
+    """
+    Decides when to stop training from the eval losses (and the train losses when there are some).
+
+    Each check fits a line to the log losses of the last window evaluations, so slopes are relative
+    changes per evaluation, and the checks go in this order:
+    - divergence: the eval loss is increasing with confidence z and is above its best by more than
+      max_rise (relative), or it is not finite
+    - overfitting: the eval loss is more than max_gap (relative) above the train loss, and the gap
+      is growing by more than min_slope with confidence z
+    - plateau: the eval loss is neither decreasing by more than min_slope nor increasing with
+      confidence z, and is within max_rise of its best, a rising loss being left to the divergence check
+    A check has to hold at patience evaluations in a row (except for a non-finite loss) to stop training.
+    """
+    def __init__(self, window: int = 20, patience: int = 3, min_slope: float = 1e-3, z: float = 1.645,
+                 max_rise: float = 0.1, max_gap: float = 0.1):
+        self.window = window
+        self.patience = patience
+        self.min_slope = min_slope
+        self.z = z
+        self.max_rise = max_rise
+        self.max_gap = max_gap
+        self.eval_losses = []
+        self.gaps = []  # Log of eval loss over train loss, at the evaluations with a train loss
+        self.counters = {"plateau": 0, "divergence": 0, "overfitting": 0}
+        self.reason = None
+
+    def update(self, eval_loss: float, train_loss: Optional[float] = None) -> Optional[str]:
+        """Add the losses of the latest evaluation. Returns why training should stop, None to continue."""
+        if not np.isfinite(eval_loss):
+            self.reason = f"divergence: eval loss is {eval_loss}"
+            return self.reason
+        self.eval_losses.append(eval_loss)
+        if train_loss is not None and train_loss > 0 and eval_loss > 0:
+            self.gaps.append(np.log(eval_loss / train_loss))
+        if len(self.eval_losses) < self.window:
+            return None
+
+        log_losses = np.log(np.maximum(self.eval_losses[-self.window:], np.finfo(float).tiny))
+        slope, stderr = window_slope(log_losses)
+        rising = slope - self.z * stderr > 0
+        risen = eval_loss > min(self.eval_losses) * (1 + self.max_rise)
+        reasons = {
+            "divergence": (rising and risen,
+                           f"eval loss {eval_loss:.4g} is rising, {eval_loss / min(self.eval_losses) - 1:.1%} above its best"),
+        }
+        if len(self.gaps) >= self.window:
+            gap_slope, gap_stderr = window_slope(self.gaps[-self.window:])
+            reasons["overfitting"] = (self.gaps[-1] > np.log1p(self.max_gap) and gap_slope - self.z * gap_stderr > self.min_slope,
+                                      f"eval loss {np.expm1(self.gaps[-1]):.1%} above the train loss and the gap is growing")
+        reasons["plateau"] = (slope + self.z * stderr > -self.min_slope and not (rising or risen),
+                              f"eval loss slope {slope:.2e} ± {stderr:.2e} per evaluation over the last {self.window} evaluations")
+
+        for check, (holds, message) in reasons.items():
+            self.counters[check] = self.counters[check] + 1 if holds else 0
+            if self.counters[check] >= self.patience:
+                self.reason = f"{check}: {message}"
+                return self.reason
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay an eval_loss.txt log through the plateau detector")
+    parser.add_argument('losses', type=str, nargs="?", default="eval_loss.txt", help="File with one eval loss per line")
+    parser.add_argument('--window', type=int, default=20, help="Number of evaluations of the slope test")
+    parser.add_argument('--patience', type=int, default=3, help="Number of evaluations in a row a check has to hold")
+    parser.add_argument('--min-slope', type=float, default=1e-3, help="Relative decrease of the eval loss per evaluation worth training for")
+    args = parser.parse_args()
+
+    losses = np.loadtxt(args.losses, ndmin=1)
+    detector = PlateauDetector(args.window, args.patience, args.min_slope)
+    stop = next((i for i, loss in enumerate(losses) if detector.update(float(loss)) is not None), None)
+    if stop is None:
+        print(f"No stop over the {len(losses)} evaluations, best loss {losses.min():.4f}")
+    else:
+        print(f"Stop at evaluation {stop} ({detector.reason}), best so far {losses[:stop + 1].min():.4f}, "
+              f"{len(losses) - stop - 1} of {len(losses)} evaluations saved, final best loss {losses.min():.4f}")
@@ -1,12 +1,33 @@
 from transformers import TrainerCallback
+import math
 import os
+from LLM_finetuning.esn import LossCurveEstimator
+from LLM_finetuning.plateau import PlateauDetector
 
 class LossThresholdCallback(TrainerCallback):
-    def __init__(self, threshold, output_dir, model, tokenizer):
+    """
+    Logs the eval loss and stops training once it stops paying off: when the eval loss falls below
+    threshold (unless it is None), when the plateau detector finds a plateau, divergence or overfitting,
+    or at the step after which the ESN loss-curve estimator expects no worthwhile improvement. A
+    checkpoint is saved then and stop_reason says why. With stop_training False, training goes on
+    after the checkpoint.
+    """
+    def __init__(self, threshold, output_dir, model, tokenizer, estimator=None, detector=None, stop_training=True):
         self.threshold = threshold
         self.output_dir = output_dir
         self.model = model
         self.tokenizer = tokenizer
+        self.estimator = estimator if estimator is not None else LossCurveEstimator()
+        self.detector = detector if detector is not None else PlateauDetector()
+        self.stop_training = stop_training
+        self.stop_step = None  # Step after which the estimator expects training to stop paying off
+        self.stop_reason = None
+        self.train_loss = None  # Latest logged train loss
+        self.last_eval_step = 0
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs and "loss" in logs:
+            self.train_loss = logs["loss"]
 
     def on_evaluate(self, args, state, control, **kwargs):
         # Access evaluation metrics
@@ -16,20 +37,39 @@ class LossThresholdCallback(TrainerCallback):
         # save eval_loss to file
         with open(os.path.join(self.output_dir, "eval_loss.txt"), "a") as f:
             f.write(f"{eval_loss}\n")
-        
-        # # Check if the evaluation loss is below the threshold
-        # if eval_loss and eval_loss < self.threshold:
-        #     print(f"Stopping training early as eval_loss {eval_loss} < threshold {self.threshold}")
-        #     control.should_training_stop = True  # Signal trainer to stop
-
-        #     # Save model checkpoint manually
-        #     save_path = os.path.join(self.output_dir, f"checkpoint-early-stop")
-        #     self.model.save_pretrained(save_path)
-        #     self.tokenizer.save_pretrained(save_path)
-        #     print(f"Checkpoint saved at {save_path} due to early stopping.")
-
-        # else:
-        #     print(f"Eval loss {eval_loss} is not below threshold {self.threshold}. Continuing training.")
+
+        if eval_loss is None or self.stop_reason is not None:
+            return
+        eval_interval = state.global_step - self.last_eval_step
+        self.last_eval_step = state.global_step
+
+        reason = self.detector.update(eval_loss, self.train_loss)
+        if self.threshold is not None and eval_loss < self.threshold:
+            reason = f"threshold: eval loss {eval_loss} < {self.threshold}"
+
+        stop_index = self.estimator.update(eval_loss) if math.isfinite(eval_loss) else None
+        if stop_index is not None:
+            evaluations_left = stop_index - (len(self.estimator.losses) - 1)
+            self.stop_step = state.global_step + evaluations_left * eval_interval
+            with open(os.path.join(self.output_dir, "stop_estimate.txt"), "a") as f:
+                f.write(f"{state.global_step} {self.stop_step}\n")
+            if reason is None and evaluations_left == 0:
+                reason = f"estimated: the forecast loss curve flattens at step {self.stop_step}"
+
+        if reason is not None:
+            self.stop(state, control, reason)
+
+    def stop(self, state, control, reason):
+        """Save a checkpoint, record why and, with stop_training, signal the trainer to stop."""
+        self.stop_reason = reason
+        save_path = os.path.join(self.output_dir, "checkpoint-early-stop")
+        self.model.save_pretrained(save_path)
+        self.tokenizer.save_pretrained(save_path)
+        with open(os.path.join(self.output_dir, "stop_reason.txt"), "w") as f:
+            f.write(f"{state.global_step} {reason}\n")
+        print(f"Checkpoint saved at {save_path} at step {state.global_step} ({reason}).")
+        if self.stop_training:
+            control.should_training_stop = True  # Signal trainer to stop
 
 
 def prompt_instruction_format(sample):
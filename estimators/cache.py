@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+try:
+    import fcntl
+except ImportError:  # fcntl is POSIX only, without it a cache file is only safe within one process
+    fcntl = None
+
+# Estimates are kept next to the estimators, out of version control
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+class EstimateCache:
+    """
+    A JSON file of estimates by key, read once and rewritten atomically on every new entry. A new
+    entry is merged into the file as it is on disk under an exclusive lock of its .lock file, so the
+    entries of concurrent processes (sweep or Pareto workers) are kept and no process ever reads a
+    half-written file.
+    """
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def get(self, key: str):
+        with self.lock:
+            return self._load().get(key)
+
+    def put(self, key: str, value):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+            with open(f"{self.filename}.lock", "w") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                self.entries = {**self._load(), **self._read(), key: value}
+                temporary = f"{self.filename}.{os.getpid()}.tmp"
+                with open(temporary, "w") as f:
+                    json.dump(self.entries, f, indent=1, sort_keys=True)
+                os.replace(temporary, self.filename)
+
+    def _load(self) -> dict:
+        if self.entries is None:
+            self.entries = self._read()
+        return self.entries
+
+    def _read(self) -> dict:
+        try:
+            with open(self.filename) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
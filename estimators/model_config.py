@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+# lora.py saves each model under <repository>/<name without organization>/model
+MODEL_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Encoder-decoder families whose config uses the T5 or the BART names
+T5_MODELS = {"t5", "mt5", "umt5", "longt5"}
+BART_MODELS = {"bart", "mbart", "pegasus", "marian", "blenderbot", "blenderbot-small", "m2m_100", "nllb-moe"}
+
+# Causal families with a gated (SwiGLU) MLP, RMSNorm and rotary positions
+GATED_CAUSAL_MODELS = {"llama", "mistral", "mixtral", "qwen2", "gemma", "gemma2", "phi3"}
+
+# Modules peft puts LoRA adapters on when LoraConfig gives no target_modules: the query and value projections
+DEFAULT_LORA_TARGETS = ("q", "v")
+
+
+def model_config_path(model_name: str, root: str = MODEL_ROOT) -> str:
+    """Where lora.py saves the config.json of model_name, e.g. <root>/flan-t5-base/model/config.json."""
+    return os.path.join(root, model_name.split("/")[-1], "model", "config.json")
+
+
+def read_config(config) -> dict:
+    """A config dict as is, or read from a config.json file or a directory holding one."""
+    if isinstance(config, dict):
+        return config
+    if os.path.isdir(config):
+        config = os.path.join(config, "config.json")
+    with open(config) as f:
+        return json.load(f)
+
+
+def config_hash(config: dict, *settings) -> str:
+    """Hash of a config and of the settings an estimate depends on."""
+    return hashlib.sha256(json.dumps([config, settings], sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class Architecture:
+    """
+    The shapes of a transformer that parameter counts, memory and FLOPs depend on, read from a
+    Hugging Face config. Causal models have decoder layers without cross-attention.
+    """
+    def __init__(self, config: dict):
+        model_type = config.get("model_type", "")
+        self.model_type = model_type
+        self.encoder_decoder = bool(config.get("is_encoder_decoder", model_type in T5_MODELS | BART_MODELS))
+        self.hidden = config.get("d_model") or config.get("hidden_size") or config.get("n_embd")
+        self.vocab = config["vocab_size"]
+        self.tied = config.get("tie_word_embeddings", True)
+        self.position_embeddings = 0  # Learned position embeddings per stack
+        self.relative_buckets = 0  # T5 relative position buckets, per stack
+        self.final_norm = True  # Norm after the last layer of each stack
+
+        if model_type in T5_MODELS:
+            self.heads = config["num_heads"]
+            self.head_dim = config["d_kv"]
+            self.ffn = config["d_ff"]
+            self.encoder_layers = config["num_layers"]
+            self.decoder_layers = config.get("num_decoder_layers") or config["num_layers"]
+            self.gated = config.get("feed_forward_proj", "relu").startswith("gated")
+            self.bias, self.norm_parameters = False, 1
+            self.relative_buckets = config.get("relative_attention_num_buckets", 32)
+        elif self.encoder_decoder:
+            self.heads = config.get("encoder_attention_heads") or config["num_attention_heads"]
+            self.head_dim = self.hidden // self.heads
+            self.ffn = config.get("encoder_ffn_dim") or config.get("ffn_dim") or 4 * self.hidden
+            self.encoder_layers = config.get("encoder_layers") or config["num_hidden_layers"]
+            self.decoder_layers = config.get("decoder_layers") or self.encoder_layers
+            self.gated, self.bias, self.norm_parameters = False, True, 2
+            self.position_embeddings = config.get("max_position_embeddings", 0) + (2 if model_type in ("bart", "mbart") else 0)
+            self.final_norm = config.get("add_final_layer_norm", config.get("normalize_before", False))
+        else:
+            self.heads = config.get("num_attention_heads") or config["n_head"]
+            self.head_dim = config.get("head_dim") or self.hidden // self.heads
+            self.ffn = config.get("intermediate_size") or config.get("n_inner") or config.get("ffn_dim") or 4 * self.hidden
+            self.encoder_layers = 0
+            self.decoder_layers = config.get("num_hidden_layers") or config["n_layer"]
+            self.gated = model_type in GATED_CAUSAL_MODELS
+            self.bias = config.get("attention_bias", not self.gated)
+            self.norm_parameters = 1 if self.gated else 2
+            if not self.gated:
+                self.position_embeddings = config.get("n_positions") or config.get("max_position_embeddings", 0)
+        self.kv_heads = config.get("num_key_value_heads") or self.heads
+
+    @property
+    def inner(self) -> int:
+        """Width of the attention heads put together."""
+        return self.heads * self.head_dim
+
+    def attention_parameters(self) -> int:
+        kv = self.kv_heads * self.head_dim
+        weights = self.hidden * self.inner * 2 + self.hidden * kv * 2
+        return weights + (self.inner + kv * 2 + self.hidden if self.bias else 0)
+
+    def mlp_parameters(self) -> int:
+        weights = (3 if self.gated else 2) * self.hidden * self.ffn
+        return weights + ((2 if self.gated else 1) * self.ffn + self.hidden if self.bias else 0)
+
+    def stacks(self):
+        """(layers, has cross-attention) of the encoder and decoder stacks."""
+        if self.encoder_decoder:
+            return [(self.encoder_layers, False), (self.decoder_layers, True)]
+        return [(self.decoder_layers, False)]
+
+    def parameters(self) -> dict:
+        """Number of parameters of the embeddings, each stack and the LM head, and in total."""
+        norm = self.norm_parameters * self.hidden
+        counts = {"embeddings": self.vocab * self.hidden}
+        for name, (layers, cross) in zip(["encoder", "decoder"] if self.encoder_decoder else ["decoder"], self.stacks()):
+            layer = self.attention_parameters() * (2 if cross else 1) + self.mlp_parameters() + norm * (3 if cross else 2)
+            extra = self.position_embeddings * self.hidden + self.relative_buckets * self.heads + (norm if self.final_norm else 0)
+            if self.position_embeddings and self.encoder_decoder:
+                extra += norm  # Norm of the embeddings
+            counts[name] = layers * layer + extra
+        counts["lm_head"] = 0 if self.tied else self.vocab * self.hidden
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def attention_blocks(self) -> int:
+        """Attention blocks (self and cross) of the whole model."""
+        return sum(layers * (2 if cross else 1) for layers, cross in self.stacks())
+
+    def lora_parameters(self, r: int, targets: Iterable[str] = DEFAULT_LORA_TARGETS) -> int:
+        """Parameters of rank r LoRA adapters on the targets (q, k, v, o) of every attention block."""
+        kv = self.kv_heads * self.head_dim
+        widths = {"q": self.hidden + self.inner, "k": self.hidden + kv, "v": self.hidden + kv, "o": self.inner + self.hidden}
+        return r * sum(widths[target] for target in targets) * self.attention_blocks()
+
+
+def architecture(config, root: Optional[str] = None) -> Architecture:
+    """Architecture of a config dict, config.json file or directory, or of a model name saved under root."""
+    if isinstance(config, str) and not os.path.exists(config) and root is not None:
+        config = model_config_path(config, root)
+    return Architecture(read_config(config))
@@ -1,28 +1,107 @@
-def estimate_memory_for_task(self) -> float:
-    # Load the model to get the number of parameters
-    model = AutoModel.from_pretrained(self.model_name)
-    num_parameters = sum(p.numel() for p in model.parameters())
-    
-    # Assume FP32 (4 bytes per parameter)
-    bytes_per_parameter = 4
-    
-    # Memory for model parameters
-    memory_for_parameters = num_parameters * bytes_per_parameter
-    
-    # Estimate the size of activations (simplified)
-    activations_size = self.batch_size * self.max_seq_length * (bytes_per_parameter * 128)  # Assuming 128 bytes per activation (this can vary)
-
-    # Memory for gradients (same as parameters)
-    gradients_size = num_parameters * bytes_per_parameter
-    
-    # Optimizer states (for Adam, we need 2x the size of parameters)
-    optimizer_states_size = num_parameters * bytes_per_parameter * 2
-    
-    # Input tensor size
-    input_size = self.batch_size * (self.max_seq_length * bytes_per_parameter)
-    
-    # Total memory required in bytes
-    total_memory = (memory_for_parameters + activations_size + gradients_size + optimizer_states_size + input_size)
-    
-    # Convert bytes to GB
-    return total_memory / (1024 ** 3)  # Convert to GB
+import argparse
+import os
+from typing import Iterable, Optional
+from estimators.cache import CACHE_DIR, EstimateCache
+from estimators.model_config import DEFAULT_LORA_TARGETS, MODEL_ROOT, Architecture, config_hash, model_config_path, read_config
+
+# Bytes per weight of the frozen model, and per activation (int8 models compute in 16 bits)
+PRECISION_BYTES = {"fp32": 4, "bf16": 2, "fp16": 2, "int8": 1}
+ACTIVATION_BYTES = {"fp32": 4, "bf16": 2, "fp16": 2, "int8": 2}
+
+# Bytes per trainable parameter: fp32 weight, gradient and the two Adam moments
+TRAINABLE_BYTES = 16
+
+# CUDA context and allocator reserve of a training process
+CUDA_CONTEXT_GB = 0.5
+
+MEMORY_CACHE = EstimateCache(os.path.join(CACHE_DIR, "training_memory.json"))
+
+
+def activation_bytes(arch: Architecture, batch_size: int, seq_length: int, target_length: int, precision: str,
+                     lora_r: int, lora_targets: Iterable[str]) -> float:
+    """
+    Activations kept for the backward pass, after Korthikanti et al. (2022) without recomputation: per
+    layer 3sbh + 8sbI + 5abs^2 bytes for a 16-bit self-attention block (I the width of the heads), the
+    same with the encoder length for the keys and values of a cross-attention block, 3sbh + 4sbf (6sbf
+    gated) for the MLP and 2sbh per norm. LoRA adds the dropped-out input of each adapter, and the
+    logits are kept in fp32 with their gradient.
+    """
+    scale = ACTIVATION_BYTES[precision] / 2
+    b, h, a, inner = batch_size, arch.hidden, arch.heads, arch.inner
+    mlp = lambda s: 3 * s * b * h + (6 if arch.gated else 4) * s * b * arch.ffn
+    attention = lambda s, s_kv: 3 * s * b * h + 4 * s * b * inner + 4 * s_kv * b * inner + 5 * a * b * s * s_kv
+    adapters = lambda s: 2 * s * b * h * len(tuple(lora_targets)) if lora_r else 0
+
+    total = 0.0
+    if arch.encoder_decoder:
+        s, t = seq_length, target_length
+        total += arch.encoder_layers * (attention(s, s) + mlp(s) + 2 * 2 * s * b * h + adapters(s))
+        total += arch.decoder_layers * (attention(t, t) + attention(t, s) + mlp(t) + 3 * 2 * t * b * h + 2 * adapters(t))
+    else:
+        t = seq_length
+        total += arch.decoder_layers * (attention(t, t) + mlp(t) + 2 * 2 * t * b * h + adapters(t))
+    return total * scale + 2 * 4 * b * t * arch.vocab
+
+
+def estimate_memory(config, batch_size: int = 4, max_seq_length: int = 512, target_length: Optional[int] = None,
+                    precision: str = "fp32", lora_r: int = 64, lora_targets: Iterable[str] = DEFAULT_LORA_TARGETS,
+                    cache: Optional[EstimateCache] = MEMORY_CACHE) -> dict:
+    """
+    GPU memory (GB) to fine-tune the model of a config (dict, config.json file or directory) with Adam,
+    from its shapes alone: the frozen weights at precision, the LoRA adapters of rank lora_r on
+    lora_targets with their gradients and optimizer state (all weights when lora_r is 0), the
+    activations for batch_size sequences of max_seq_length tokens (target_length decoder tokens for
+    encoder-decoder models, max_seq_length by default) and the CUDA context. Estimates are cached by
+    the hash of the config and the settings.
+    """
+    config = read_config(config)
+    lora_targets = tuple(lora_targets)
+    target_length = target_length or max_seq_length
+    key = config_hash(config, batch_size, max_seq_length, target_length, precision, lora_r, lora_targets)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
+
+    arch = Architecture(config)
+    parameters = arch.parameters()["total"]
+    trainable = arch.lora_parameters(lora_r, lora_targets) if lora_r else parameters
+    # Fully fine-tuned weights are in the trainable state, plus their copy at precision in mixed precision
+    weights = parameters * PRECISION_BYTES[precision] if lora_r or precision != "fp32" else 0
+    estimate = {
+        "parameters": parameters,
+        "trainable_parameters": trainable,
+        "weights_gb": weights / 1024 ** 3,
+        "trainable_gb": trainable * TRAINABLE_BYTES / 1024 ** 3,
+        "activations_gb": activation_bytes(arch, batch_size, max_seq_length, target_length, precision, lora_r, lora_targets) / 1024 ** 3,
+        "context_gb": CUDA_CONTEXT_GB,
+    }
+    estimate["total_gb"] = estimate["weights_gb"] + estimate["trainable_gb"] + estimate["activations_gb"] + estimate["context_gb"]
+    if cache is not None:
+        cache.put(key, estimate)
+    return estimate
+
+
+def estimate_memory_for_task(self, precision: str = "fp32", lora_r: int = 64, root: str = MODEL_ROOT) -> float:
+    """GPU memory (GB) to fine-tune the model of a task, from the config.json lora.py saved for it."""
+    return estimate_memory(model_config_path(self.model_name, root), getattr(self, "batch_size", 4),
+                           getattr(self, "max_seq_length", 512), precision=precision, lora_r=lora_r)["total_gb"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate the GPU memory of a fine-tuning from the model config alone")
+    parser.add_argument('configs', nargs='+', type=str, help="config.json files, directories holding one, or model names saved by lora.py")
+    parser.add_argument('--batch-size', type=int, default=4, help="Sequences per batch")
+    parser.add_argument('--seq-length', type=int, default=512, help="Tokens per (encoder) sequence")
+    parser.add_argument('--target-length', type=int, default=None, help="Tokens per decoder sequence of encoder-decoder models (default: --seq-length)")
+    parser.add_argument('--precision', type=str, choices=list(PRECISION_BYTES), default="fp32", help="Precision of the frozen weights")
+    parser.add_argument('--lora-r', type=int, default=64, help="Rank of the LoRA adapters (0: full fine-tuning)")
+    parser.add_argument('--lora-targets', nargs='+', choices=["q", "k", "v", "o"], default=list(DEFAULT_LORA_TARGETS), help="Attention projections with adapters")
+    parser.add_argument('--root', type=str, default=MODEL_ROOT, help="Directory lora.py saved the models in")
+    args = parser.parse_args()
+
+    for config in args.configs:
+        path = config if os.path.exists(config) else model_config_path(config, args.root)
+        estimate = estimate_memory(path, args.batch_size, args.seq_length, args.target_length, args.precision, args.lora_r, args.lora_targets)
+        print(f"{config}: {estimate['total_gb']:.2f} GB ({estimate['parameters'] / 1e6:.1f}M parameters, "
+              f"{estimate['trainable_parameters'] / 1e6:.2f}M trainable; weights {estimate['weights_gb']:.2f} GB, "
+              f"trainable state {estimate['trainable_gb']:.2f} GB, activations {estimate['activations_gb']:.2f} GB)")
@@ -1,24 +1,188 @@
-def estimate_training_time(self) -> float:
-    """
-    Estimate training time using `calculate_flops` from `calflops`.
-    """
-    try:
-        # Load model and tokenizer based on model_name
-        # model = AutoModelForCausalLM.from_pretrained(self.model_name)
-        # tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        
-        # Calculate FLOPs using calflops
-        # flops, macs, params = calculate_flops(
-        #     model=model,
-        #     input_shape=(self.batch_size, self.max_seq_length),
-        #     transformer_tokenizer=tokenizer
-        # )
-        flops, macs, params = 1,1,1 # TODO
-        
-        # Example calculation: converting FLOPs to an arbitrary training time
-        print(f"Model: {self.model_name} FLOPs: {flops} TFLOPs, MACs: {macs} GMACs, Params: {params} B")
-        return flops / (10**12)  # Convert FLOPS to seconds (adjust as needed)
-    
-    except Exception as e:
-        print(f"Error estimating FLOPs for model {self.model_name}: {e}")
-        return 0.0
+import argparse
+import csv
+import math
+import os
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from estimators.cache import CACHE_DIR, EstimateCache
+from estimators.model_config import DEFAULT_LORA_TARGETS, MODEL_ROOT, Architecture, config_hash, model_config_path, read_config
+from estimators.training_memory_estimator import estimate_memory
+
+# Dense peak throughput (TFLOP/s) of each GPU type in fp32 and in 16 bits on tensor cores
+PEAK_TFLOPS = {
+    "H100": (67.0, 989.0),
+    "A100": (19.5, 312.0),
+    "L4": (30.3, 121.0),
+    "V100": (15.7, 125.0),
+    "RTX3090": (35.6, 71.0),
+    "RTX2080Ti": (13.4, 53.8),
+    "T4": (8.1, 65.0),
+}
+
+# Share of the peak throughput a fine-tuning reaches on a GPU type without calibration. A rough guess: the small
+# models of the simulator spend most of a step outside the matrix products, and their profiled times are tens
+# of times longer, so model_catalog refuses uncalibrated GPU types unless asked not to
+DEFAULT_EFFICIENCY = 0.3
+
+# Epochs of lora.py, and the training samples of its runs (1890 steps of 4 samples per epoch)
+DEFAULT_EPOCHS = 10
+DEFAULT_DATASET_SIZE = 7560
+
+TIME_CACHE = EstimateCache(os.path.join(CACHE_DIR, "training_time.json"))
+CALIBRATION_CACHE = EstimateCache(os.path.join(CACHE_DIR, "calibration.json"))
+
+# Columns of a calibration CSV, one measured run per row: seconds taken by steps training steps
+CALIBRATION_COLUMNS = ["model", "gpu", "batch_size", "seq_length", "target_length", "precision", "lora_r", "steps", "seconds"]
+
+
+def step_flops(arch: Architecture, batch_size: int, seq_length: int, target_length: Optional[int] = None,
+               lora_r: int = 64, lora_targets: Iterable[str] = DEFAULT_LORA_TARGETS) -> float:
+    """
+    FLOPs of one training step of batch_size sequences. The forward pass costs 2 FLOPs per weight of
+    the layers and of the LM head per token, plus 4 s s_kv I per attention block (scores and weighted
+    values, I the width of the heads) and the adapters. The backward pass costs twice the forward
+    with full fine-tuning, and about once with LoRA, where frozen weights get no gradient.
+    """
+    lora_targets = tuple(lora_targets)
+    adapter = arch.lora_parameters(lora_r, lora_targets) / max(arch.attention_blocks(), 1) if lora_r else 0
+    attention = lambda s, s_kv: 2 * s * (arch.attention_parameters() + adapter) + 4 * s * s_kv * arch.inner
+    mlp = lambda s: 2 * s * arch.mlp_parameters()
+    lm_head = lambda s: 2 * s * arch.hidden * arch.vocab
+
+    if arch.encoder_decoder:
+        s, t = seq_length, target_length or seq_length
+        forward = arch.encoder_layers * (attention(s, s) + mlp(s))
+        forward += arch.decoder_layers * (attention(t, t) + attention(t, s) + mlp(t)) + lm_head(t)
+    else:
+        t = seq_length
+        forward = arch.decoder_layers * (attention(t, t) + mlp(t)) + lm_head(t)
+    return batch_size * forward * (2 if lora_r else 3)
+
+
+def peak_flops(gpu: str, precision: str = "fp32") -> float:
+    if gpu not in PEAK_TFLOPS:
+        raise ValueError(f"Unknown GPU type '{gpu}', expected one of {sorted(PEAK_TFLOPS)}")
+    return PEAK_TFLOPS[gpu][0 if precision == "fp32" else 1] * 1e12
+
+
+def calibration(gpu: str, precision: str = "fp32", cache: Optional[EstimateCache] = CALIBRATION_CACHE) -> dict:
+    """Achieved FLOP/s and overhead per step (s) of a GPU type: calibrated if measured, DEFAULT_EFFICIENCY of the peak otherwise."""
+    calibrated = cache.get(f"{gpu}:{precision}") if cache is not None else None
+    return calibrated or {"flops_per_second": DEFAULT_EFFICIENCY * peak_flops(gpu, precision), "overhead": 0.0, "runs": 0}
+
+
+def calibrate(runs: List[dict], root: str = MODEL_ROOT, cache: Optional[EstimateCache] = CALIBRATION_CACHE) -> Dict[str, dict]:
+    """
+    Fit step time = overhead + FLOPs / FLOP/s to measured runs (dicts of CALIBRATION_COLUMNS, model
+    being a config.json file or a model name saved under root), per GPU type and precision, and
+    save the fits to cache. A single run, or runs of a single shape, only give the FLOP/s.
+    """
+    groups = {}
+    for run in runs:
+        config = run["model"] if os.path.exists(run["model"]) else model_config_path(run["model"], root)
+        flops = step_flops(Architecture(read_config(config)), int(run["batch_size"]), int(run["seq_length"]),
+                           int(run["target_length"] or 0) or None, int(run["lora_r"]))
+        groups.setdefault(f"{run['gpu']}:{run['precision']}", []).append((flops, float(run["seconds"]) / int(run["steps"])))
+
+    fits = {}
+    for key, points in groups.items():
+        flops, step_time = np.array(points).T
+        if len(np.unique(flops)) > 1:
+            slope, overhead = np.polyfit(flops, step_time, 1)
+            if slope <= 0 or overhead < 0:
+                slope, overhead = step_time.sum() / flops.sum(), 0.0
+        else:
+            slope, overhead = step_time.sum() / flops.sum(), 0.0
+        fits[key] = {"flops_per_second": float(1 / slope), "overhead": float(overhead), "runs": len(points)}
+        if cache is not None:
+            cache.put(key, fits[key])
+    return fits
+
+
+def estimate_step_time(config, gpu: str, batch_size: int = 4, seq_length: int = 512, target_length: Optional[int] = None,
+                       precision: str = "fp32", lora_r: int = 64, cache: Optional[EstimateCache] = TIME_CACHE) -> dict:
+    """
+    FLOPs and time (s) of a training step of the model of a config on a GPU type, with its calibration.
+    Cached per config, shape and GPU type, and per calibration so that a new one takes over.
+    """
+    config = read_config(config)
+    fit = calibration(gpu, precision)
+    key = config_hash(config, gpu, batch_size, seq_length, target_length, precision, lora_r, fit)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
+    flops = step_flops(Architecture(config), batch_size, seq_length, target_length, lora_r)
+    estimate = {"flops": flops, "step_time": fit["overhead"] + flops / fit["flops_per_second"], "calibrated": fit["runs"] > 0}
+    if cache is not None:
+        cache.put(key, estimate)
+    return estimate
+
+
+def training_steps(dataset_size: int, batch_size: int, epochs: float = DEFAULT_EPOCHS) -> int:
+    return math.ceil(dataset_size / batch_size) * epochs
+
+
+def estimate_training_time(self, gpu: str = "RTX3090", precision: str = "fp32", lora_r: int = 64, root: str = MODEL_ROOT) -> float:
+    """Training time (s) of a task from the config.json lora.py saved for its model."""
+    batch_size = getattr(self, "batch_size", 4)
+    step = estimate_step_time(model_config_path(self.model_name, root), gpu, batch_size, getattr(self, "max_seq_length", 512),
+                              precision=precision, lora_r=lora_r)
+    return step["step_time"] * training_steps(getattr(self, "dataset_size", DEFAULT_DATASET_SIZE), batch_size,
+                                              getattr(self, "epochs", DEFAULT_EPOCHS))
+
+
+def model_catalog(model_names: Iterable[str], gpu: str = "RTX3090", dataset_size: int = DEFAULT_DATASET_SIZE,
+                  epochs: float = DEFAULT_EPOCHS, batch_size: int = 4, seq_length: int = 512,
+                  target_length: Optional[int] = None, precision: str = "fp32", lora_r: int = 64,
+                  root: str = MODEL_ROOT, calibrated_only: bool = True) -> Dict[str, dict]:
+    """
+    Training time (s) and memory (GB, rounded up) of fine-tuning each model on dataset_size samples for
+    epochs, from the configs lora.py saved under root: the model properties of the simulator. Raises
+    ValueError for a GPU type that was never calibrated, unless calibrated_only is False.
+    """
+    if calibrated_only and calibration(gpu, precision)["runs"] == 0:
+        raise ValueError(f"No calibration of {gpu} in {precision}, the uncalibrated times are far from the profiled ones. "
+                         f"Calibrate it on measured runs with 'python -m estimators.training_time_estimator --calibrate runs.csv' first")
+    catalog = {}
+    for model_name in model_names:
+        path = model_config_path(model_name, root)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No config of {model_name} at {path}, save the model with lora.py or point root at its directory")
+        config = read_config(path)
+        step = estimate_step_time(config, gpu, batch_size, seq_length, target_length, precision, lora_r)
+        memory = estimate_memory(config, batch_size, seq_length, target_length, precision, lora_r)
+        catalog[model_name] = {
+            "training_time": step["step_time"] * training_steps(dataset_size, batch_size, epochs),
+            "memory_required": math.ceil(memory["total_gb"]),
+        }
+    return catalog
+
+
+def read_calibration_runs(filename: str) -> List[dict]:
+    with open(filename, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate fine-tuning times from the model configs and FLOP counts")
+    parser.add_argument('models', nargs='*', type=str, help="Model names saved by lora.py under --root")
+    parser.add_argument('--gpu', type=str, choices=sorted(PEAK_TFLOPS), default="RTX3090", help="GPU type")
+    parser.add_argument('--dataset-size', type=int, default=DEFAULT_DATASET_SIZE, help="Training samples")
+    parser.add_argument('--epochs', type=float, default=DEFAULT_EPOCHS, help="Training epochs")
+    parser.add_argument('--batch-size', type=int, default=4, help="Sequences per batch")
+    parser.add_argument('--seq-length', type=int, default=512, help="Tokens per (encoder) sequence")
+    parser.add_argument('--target-length', type=int, default=None, help="Tokens per decoder sequence of encoder-decoder models (default: --seq-length)")
+    parser.add_argument('--precision', type=str, choices=["fp32", "bf16", "fp16", "int8"], default="fp32", help="Precision of the frozen weights")
+    parser.add_argument('--lora-r', type=int, default=64, help="Rank of the LoRA adapters (0: full fine-tuning)")
+    parser.add_argument('--calibrate', type=str, default=None, help=f"CSV of measured runs ({', '.join(CALIBRATION_COLUMNS)}) to calibrate the GPU types on first")
+    parser.add_argument('--root', type=str, default=MODEL_ROOT, help="Directory lora.py saved the models in")
+    parser.add_argument('--uncalibrated', action='store_true', help=f"Estimate on a GPU type with no calibration, at {DEFAULT_EFFICIENCY:.0%} of its peak throughput")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        for key, fit in calibrate(read_calibration_runs(args.calibrate), args.root).items():
+            print(f"Calibrated {key} on {fit['runs']} runs: {fit['flops_per_second'] / 1e12:.2f} TFLOP/s, {fit['overhead'] * 1000:.1f} ms per step.")
+    catalog = model_catalog(args.models, args.gpu, args.dataset_size, args.epochs, args.batch_size, args.seq_length,
+                            args.target_length, args.precision, args.lora_r, args.root, calibrated_only=not args.uncalibrated)
+    for model_name, properties in catalog.items():
+        print(f"{model_name}: {properties['training_time']:.0f} s ({properties['training_time'] / 3600:.2f} h) on {args.gpu}, {properties['memory_required']} GB")
@@ -0,0 +1,102 @@
+import csv
+import os
+from typing import Callable, Optional
+import numpy as np
+from model.task import Task
+
+# Sample grid trace bundled with the repository: two weeks of hourly carbon intensity (gCO2/kWh) and price (EUR/MWh)
+SAMPLE_GRID_TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "energy_reports", "carbon", "sample_grid_trace.csv")
+
+
+class GridTrace:
+    """
+    A time series of the grid (carbon intensity or price) on the simulation clock, repeated after its
+    last sample so it covers runs of any length. Window means and integrals come from a cumulative
+    integral of the piecewise-linear series, so they cost two interpolations.
+    """
+    def __init__(self, times: np.ndarray, values: np.ndarray, offset: float = 0.0):
+        order = np.argsort(times)
+        self.times = np.asarray(times, dtype=float)[order]
+        self.values = np.asarray(values, dtype=float)[order]
+        # The series repeats with the period of its samples, the last interval going back to the first value
+        step = self.times[-1] - self.times[-2] if len(self.times) > 1 else 3600.0
+        self.period = self.times[-1] - self.times[0] + step
+        self.times = np.r_[self.times, self.times[0] + self.period]
+        self.values = np.r_[self.values, self.values[0]]
+        self.cumulative = np.r_[0.0, np.cumsum((self.values[1:] + self.values[:-1]) / 2 * np.diff(self.times))]
+        self.offset = offset  # Time of the trace at simulation time 0
+
+    @classmethod
+    def from_csv(cls, filename: str, column: str = "carbon_intensity", offset_hours: float = 0.0) -> "GridTrace":
+        """Read a CSV with an hour column and one column per signal (e.g. carbon_intensity, price)."""
+        with open(filename, newline="") as f:
+            rows = list(csv.DictReader(f))
+        hours = np.array([float(row["hour"]) for row in rows])
+        values = np.array([float(row[column]) for row in rows])
+        return cls(hours * 3600, values, offset_hours * 3600)
+
+    def value(self, time):
+        """Value of the series at simulation time(s)."""
+        return np.interp(np.asarray(time, dtype=float) + self.offset - self.times[0], self.times - self.times[0],
+                         self.values, period=self.period)
+
+    def integral(self, time):
+        """Integral of the series from simulation time 0 to time(s), in value x seconds."""
+        return self._cumulative(np.asarray(time, dtype=float) + self.offset) - self._cumulative(self.offset)
+
+    def window_mean(self, start, duration):
+        """Mean of the series over [start, start + duration] for each start."""
+        start = np.asarray(start, dtype=float)
+        if duration <= 0:
+            return self.value(start)
+        return (self.integral(start + duration) - self.integral(start)) / duration
+
+    def _cumulative(self, time):
+        cycles, phase = np.divmod(time - self.times[0], self.period)
+        return cycles * self.cumulative[-1] + np.interp(phase, self.times - self.times[0], self.cumulative)
+
+
+def is_retrain_chunk(task: Task) -> bool:
+    return "_retrain_" in task.id
+
+
+class CarbonDeferral:
+    """
+    Postpones deferrable tasks (DARE retrain chunks by default) into greener windows of a grid trace.
+
+    The chunks of a job run one after the other, so pausing a job before one of its chunks shifts all
+    of its remaining work. A task about to start is deferred by the delay, within the remaining delay
+    budget of its job, that gives the lowest integral of the trace over the remaining work of the job,
+    if that is at least min_saving lower than starting now. Delays are tried every step seconds, and
+    the tasks of a job may be delayed by at most max_delay seconds in total.
+    """
+    def __init__(self, trace: GridTrace, max_delay: float, step: float = 900.0, min_saving: float = 0.02,
+                 deferrable: Optional[Callable[[Task], bool]] = None):
+        self.trace = trace
+        self.max_delay = max_delay
+        self.step = step
+        self.min_saving = min_saving
+        self.deferrable = deferrable or is_retrain_chunk
+        self.job_delays = {}  # Job id -> delay spent deferring its tasks
+        self.job_work = {}  # Job id -> training time of its tasks not started yet
+
+    def add_tasks(self, tasks):
+        """Count the training time of the tasks in the remaining work of their jobs."""
+        for task in tasks:
+            self.job_work[task.job_id] = self.job_work.get(task.job_id, 0.0) + task.training_time
+
+    def defer_until(self, task: Task, now: float, duration: float) -> float:
+        """Time at which the task, taking `duration` once started, should start. Now if it should not wait."""
+        budget = self.max_delay - self.job_delays.get(task.job_id, 0.0)
+        if budget >= self.step and self.deferrable(task):
+            work = max(self.job_work.get(task.job_id, 0.0), duration)
+            starts = now + self.step * np.arange(int(budget // self.step) + 1)
+            cost = self.trace.integral(starts + work) - self.trace.integral(starts)
+            best = int(np.argmin(cost))
+            if cost[best] < cost[0] * (1 - self.min_saving):
+                self.job_delays[task.job_id] = self.job_delays.get(task.job_id, 0.0) + starts[best] - now
+                return float(starts[best])
+        return now
+
+    def task_started(self, task: Task):
+        self.job_work[task.job_id] = self.job_work.get(task.job_id, 0.0) - task.training_time
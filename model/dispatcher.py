@@ -0,0 +1,106 @@
+import threading
+import time
+from colorama import Fore, Style, init
+from model.policy import Policy
+from model.queue import Queue
+from model.records import TaskRecordTable
+from model.scheduler import Scheduler
+from model.task_thread import TaskThread
+
+# Initialize colorama
+init(autoreset=True)
+
+
+class Dispatcher:
+    """
+    Places queued tasks on GPUs for the wall-clock (threaded) simulation.
+
+    Instead of spinning on the queue, the dispatcher sleeps on a condition variable
+    and only wakes up when a UserThread adds a task or Scheduler.release_gpu frees a GPU.
+    """
+    def __init__(self, scheduler: Scheduler, policy: Policy, task_queue: Queue, task_records=None):
+        self.scheduler = scheduler
+        self.policy = policy
+        self.task_queue = task_queue
+        self.condition = threading.Condition()
+        self.events_pending = False
+        self.active_users = 0
+        self.running_tasks = 0
+        self.task_records = task_records if task_records is not None else TaskRecordTable()  # Or a TaskRecordWriter
+        self.records_lock = threading.Lock()
+        self.task_threads = []
+
+        # Counters exposed after the run
+        self.wakeups = 0
+
+        self.scheduler.on_release = self.gpu_released
+
+    def task_arrived(self):
+        """Called by UserThread after adding a task to the queue."""
+        with self.condition:
+            self.events_pending = True
+            self.condition.notify()
+
+    def gpu_released(self):
+        """Called by Scheduler.release_gpu once a GPU is free again."""
+        with self.condition:
+            self.running_tasks -= 1
+            self.events_pending = True
+            self.condition.notify()
+
+    def task_completed(self, task, end_time: float):
+        """Called by TaskThread with the time the task actually finished training."""
+        with self.records_lock:
+            self.task_records.append(task, task.start_time, end_time)
+
+    def user_finished(self):
+        """Called by UserThread once it has requested all its tasks."""
+        with self.condition:
+            self.active_users -= 1
+            self.condition.notify()
+
+    def is_done(self) -> bool:
+        # Nothing can arrive anymore and either the queue is empty or
+        # nothing is running that could free a GPU for what is left
+        return self.active_users == 0 and (len(self.task_queue) == 0 or self.running_tasks == 0)
+
+    def run(self, user_threads):
+        """Start the user threads and dispatch their tasks until all of them have run."""
+        self.active_users = len(user_threads)
+        for u in user_threads:
+            u.start()
+
+        while True:
+            with self.condition:
+                while not self.events_pending and not self.is_done():
+                    self.condition.wait()
+                if not self.events_pending:
+                    break
+                self.events_pending = False
+                self.wakeups += 1
+
+            for task in self.policy.dispatch(self.scheduler, time.time()):
+                with self.condition:
+                    self.running_tasks += 1
+
+                # Start a thread for the task, it adds the task to the records once trained
+                thread = TaskThread(task, self.scheduler, on_complete=self.task_completed)
+                thread.start()
+                self.task_threads.append(thread)
+
+        if len(self.task_queue) > 0:
+            print(Fore.RED + f"{len(self.task_queue)} tasks could not be placed on any GPU.\n")
+
+        # Wait for all threads to complete
+        for thread in self.task_threads:
+            thread.join()
+        for user_thread in user_threads:
+            user_thread.join()
+
+        return self.task_records
+
+    def stats(self) -> dict:
+        return {
+            "wakeups": self.wakeups,
+            "scheduling_attempts": self.policy.scheduling_attempts,
+        }
@@ -0,0 +1,89 @@
+import heapq
+import itertools
+from colorama import Fore, Style, init
+from model.policy import Policy
+from model.queue import Queue
+from model.records import TaskRecordTable
+from model.scheduler import Scheduler
+from model.task import Task
+from model.user import User
+
+# Initialize colorama
+init(autoreset=True)
+
+# Event kinds, processed in this order when they share a timestamp
+TASK_COMPLETED = 0
+TASK_ARRIVED = 1
+WAKE_UP = 2  # Time until which the policy deferred a task
+
+
+class EventSimulator:
+    """
+    Discrete-event simulation of the GPU cluster on a virtual clock.
+
+    Replaces UserThread/TaskThread: task requests and task completions are events
+    on a heap ordered by virtual time (in real, unscaled seconds), so a run takes
+    milliseconds and gives the same records every time.
+    """
+    def __init__(self, scheduler: Scheduler, policy: Policy, task_queue: Queue, verbose: bool = False, task_records=None):
+        self.scheduler = scheduler
+        self.policy = policy
+        self.task_queue = task_queue
+        self.verbose = verbose
+        self.now = 0.0
+        self.events = []  # Heap of (time, kind, sequence number, task)
+        self.sequence = itertools.count()  # Keeps insertion order for events at the same time and kind
+        self.task_records = task_records if task_records is not None else TaskRecordTable()  # Or a TaskRecordWriter
+        self.wakeups = 0  # Number of dispatch rounds
+
+    def schedule(self, time: float, kind: int, task: Task):
+        heapq.heappush(self.events, (time, kind, next(self.sequence), task))
+
+    def add_user(self, user: User):
+        """Turn every request of the user into an arrival event."""
+        for time_of_asking, tasks in user.requests_by_time():
+            for task in tasks:
+                self.schedule(time_of_asking, TASK_ARRIVED, task)
+        user.requests = []
+
+    def run(self):
+        """Process events until none is left and return the task records."""
+        while self.events:
+            self.now, kind, _, task = heapq.heappop(self.events)
+
+            if kind == WAKE_UP:
+                pass
+            elif kind == TASK_ARRIVED:
+                if self.verbose:
+                    print(Fore.CYAN + f"User {task.user_id} is requesting {task.id} at time {self.now}\n")
+                task.arrival_time = self.now
+                self.task_queue.add_task(task)
+            else:
+                # Recorded once done. On the virtual clock the training ends exactly after its
+                # (slowed down) training time, a session may keep the GPU longer.
+                self.task_records.append(task, task.start_time)
+                self.scheduler.release_gpu(task.assigned_gpu.id, task.id, self.now)
+                if self.verbose:
+                    print(Fore.MAGENTA + f"Task {task.id} completed and GPU {task.assigned_gpu.id} released.\n")
+
+            # Dispatch once all the events of this instant have been applied
+            if not self.events or self.events[0][0] > self.now:
+                self.dispatch()
+
+        if len(self.task_queue) > 0:
+            print(Fore.RED + f"{len(self.task_queue)} tasks could not be placed on any GPU.\n")
+        return self.task_records
+
+    def dispatch(self):
+        self.wakeups += 1
+        for task in self.policy.dispatch(self.scheduler, self.now):
+            self.schedule(self.now + self.scheduler.hold_time(task), TASK_COMPLETED, task)
+        for time in self.policy.wake_times:
+            self.schedule(time, WAKE_UP, None)
+        self.policy.wake_times = []
+
+    def stats(self) -> dict:
+        return {
+            "wakeups": self.wakeups,
+            "scheduling_attempts": self.policy.scheduling_attempts,
+        }
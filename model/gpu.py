@@ -1,5 +1,22 @@
 class GPU:
+    __slots__ = ("id", "memory_size", "free_memory", "running", "is_available")
+
     def __init__(self, gpu_id: int, memory_size: float):
         self.id = gpu_id
         self.memory_size = memory_size
-        self.is_available = True
+        self.free_memory = memory_size
+        self.running = []  # Tasks currently placed on the GPU
+        self.is_available = True  # No task is running on the GPU
+
+    def allocate(self, task):
+        self.running.append(task)
+        self.free_memory -= task.memory_required
+        self.is_available = False
+
+    def free(self, task_id: str):
+        """Remove the running task with the given id and return it."""
+        task = next(t for t in self.running if t.id == task_id)
+        self.running.remove(task)
+        self.free_memory += task.memory_required
+        self.is_available = not self.running
+        return task
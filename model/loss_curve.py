@@ -0,0 +1,140 @@
+import os
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+from LLM_finetuning.esn import LossCurveEstimator
+from LLM_finetuning.plateau import PlateauDetector
+
+# Eval losses logged by LossThresholdCallback over a whole LoRA fine-tuning of bart-small (LLM_finetuning/lora.py)
+DEFAULT_LOSS_CURVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "LLM_finetuning", "eval_loss.txt")
+
+# How a DARE job decides to stop retraining:
+# - fixed: no_dare // dare retrain chunks of the profiled duration, whatever the loss does
+# - full: chunks up to the end of the loss curve
+# - target: at the first evaluation within target of the best loss of the curve (an oracle, for reference)
+# - plateau: when the PlateauDetector of the fine-tuning callback finds a plateau
+# - esn: when the ESN loss-curve estimator of the fine-tuning callback expects no worthwhile gain
+STOPPING_RULES = ["fixed", "full", "target", "plateau", "esn"]
+
+
+def read_loss_curve(filename: str) -> np.ndarray:
+    """Eval losses of an eval_loss.txt log, one per line, without the missing (None, nan) ones."""
+    with open(filename) as f:
+        losses = np.array([float(line) for line in f if line.strip() and line.strip() != "None"])
+    return losses[np.isfinite(losses)]
+
+
+def power_law(evaluations, a: float, b: float, c: float) -> np.ndarray:
+    return c + a * np.asarray(evaluations, dtype=float) ** -b
+
+
+def fit_power_law(losses: np.ndarray, grid: int = 200) -> Tuple[float, float, float]:
+    """
+    Least-squares fit of losses (the i-th taken at evaluation i + 1) by c + a * evaluation^-b. For each
+    floor c on a grid below the lowest loss, a and b come from a line fit in log-log space.
+    """
+    evaluations = np.arange(1, len(losses) + 1)
+    best, best_error = (float(losses.mean()), 0.0, 0.0), np.inf
+    for c in np.linspace(0.0, losses.min(), grid, endpoint=False):
+        slope, intercept = np.polyfit(np.log(evaluations), np.log(losses - c), 1)
+        error = np.sum((power_law(evaluations, np.exp(intercept), -slope, c) - losses) ** 2)
+        if error < best_error:
+            best, best_error = (float(np.exp(intercept)), float(-slope), float(c)), error
+    return best
+
+
+class LossCurve:
+    """
+    Eval losses at evenly spaced points of a full training, the i-th of n at fraction (i + 1) / n of it.
+    A curve of any length stands for trainings of any duration, so one log serves every dataset size.
+    """
+    def __init__(self, losses: np.ndarray, target: float = 0.05):
+        self.losses = np.asarray(losses, dtype=float)
+        self.target = target
+        self.stop_indices = {}  # Rule -> evaluation at which it stops, the detectors replay the curve once
+
+    @classmethod
+    def from_file(cls, filename: str, fit: bool = False, **kwargs) -> "LossCurve":
+        """The curve of an eval_loss.txt log, or of the power law fitted to it with fit."""
+        losses = read_loss_curve(filename)
+        if fit:
+            losses = power_law(np.arange(1, len(losses) + 1), *fit_power_law(losses))
+        return cls(losses, **kwargs)
+
+    def fractions(self) -> np.ndarray:
+        return np.arange(1, len(self.losses) + 1) / len(self.losses)
+
+    def stop_index(self, rule: str) -> int:
+        """Evaluation at which rule stops training, the last one if it never does."""
+        if rule not in self.stop_indices:
+            self.stop_indices[rule] = self._stop_index(rule)
+        return self.stop_indices[rule]
+
+    def _stop_index(self, rule: str) -> int:
+        last = len(self.losses) - 1
+        if rule in ("fixed", "full"):
+            return last
+        if rule == "target":
+            return int(np.argmax(self.losses <= self.losses.min() * (1 + self.target)))
+        if rule == "plateau":
+            detector = PlateauDetector()
+            return next((i for i, loss in enumerate(self.losses) if detector.update(float(loss)) is not None), last)
+        if rule == "esn":
+            estimator = LossCurveEstimator()
+            for i, loss in enumerate(self.losses):
+                estimate = estimator.update(float(loss))
+                if estimate is not None and estimate <= i:
+                    return i
+            return last
+        raise ValueError(f"Unknown stopping rule '{rule}', expected one of {STOPPING_RULES}")
+
+
+def retrain_chunks(curve: LossCurve, full_time: float, chunk_time: float, rule: str) -> List[float]:
+    """
+    Durations of the retrain chunks of a DARE job whose full training takes full_time.
+
+    With the fixed rule these are full_time // chunk_time chunks of chunk_time. Otherwise the job
+    trains up to the evaluation at which rule stops on curve. Each chunk lasts at least chunk_time
+    and ends on an evaluation, as that is where the job can decide to go on. The last chunk ends at
+    the stopping evaluation, so it can be shorter.
+    """
+    if rule == "fixed":
+        return [chunk_time] * int(full_time // chunk_time)
+    times = curve.fractions() * full_time
+    stop = times[curve.stop_index(rule)]
+    ends = []
+    end = 0.0
+    while end < stop:
+        next_evaluation = min(int(np.searchsorted(times, end + chunk_time)), len(times) - 1)
+        end = min(times[next_evaluation], stop)
+        ends.append(end)
+    return np.diff(np.r_[0.0, ends]).tolist()
+
+
+def stopping_report(jobs: Iterable[Tuple[str, float]], curves: Dict[str, LossCurve], full_times: Dict[str, float],
+                    chunk_times: Dict[str, float], rules: Iterable[str] = STOPPING_RULES) -> pd.DataFrame:
+    """
+    Retrain chunks and GPU-hours of the (model name, size) DARE jobs under each stopping rule, and the
+    GPU-hours each rule saves compared to the fixed one. full_times and chunk_times are per model, in
+    seconds, the full training time being multiplied by the size of the job.
+    """
+    rows = []
+    for rule in rules:
+        chunks = [retrain_chunks(curves[model_name], full_times[model_name] * size, chunk_times[model_name], rule)
+                  for model_name, size in jobs]
+        rows.append({"rule": rule, "chunks": sum(map(len, chunks)), "gpu_hours": sum(map(sum, chunks)) / 3600})
+    report = pd.DataFrame(rows).set_index("rule")
+    fixed = sum(len(retrain_chunks(curves[m], full_times[m] * size, chunk_times[m], "fixed")) * chunk_times[m]
+                for m, size in jobs) / 3600
+    report["saved_gpu_hours"] = fixed - report["gpu_hours"]
+    report["saved_share"] = report["saved_gpu_hours"] / fixed if fixed > 0 else 0.0
+    return report
+
+
+def load_loss_curves(model_names: Iterable[str], curve_files: Dict[str, str] = None, fit: bool = False) -> Dict[str, LossCurve]:
+    """Loss curve of each model, from its file in curve_files or DEFAULT_LOSS_CURVE, fitted by a power law with fit."""
+    curve_files = curve_files or {}
+    curves = {}
+    for filename in set(curve_files.get(model_name, DEFAULT_LOSS_CURVE) for model_name in model_names):
+        curves[filename] = LossCurve.from_file(filename, fit)
+    return {model_name: curves[curve_files.get(model_name, DEFAULT_LOSS_CURVE)] for model_name in model_names}
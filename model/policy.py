@@ -1,15 +1,51 @@
 
+from typing import Dict, Optional
 from model.queue import Queue
 
 
 class Policy:
-    def __init__(self, policy_type: str, task_queue: Queue):
+    # Queue order used by each policy type
+    QUEUE_ORDER = {
+        "fifo": "arrival",
+        "shortest_job": "training_time",
+        "energy": "arrival",
+    }
+
+    def __init__(self, policy_type: str, task_queue: Queue, backfill: str = None, model_power: Optional[Dict[str, float]] = None,
+                 energy_weight: float = 0.5, idle_power: float = 0.0, gpu_power_scale: Optional[Dict[int, float]] = None,
+                 deferral=None):
+        if policy_type not in self.QUEUE_ORDER:
+            raise ValueError("Unknown policy type")
+        if backfill not in (None, "easy", "conservative"):
+            raise ValueError("Unknown backfill mode")
         self.policy_type = policy_type
         self.task_queue = task_queue
+        self.task_queue.set_order(self.QUEUE_ORDER[policy_type])
+        # With EASY backfilling the first blocked task gets a GPU reservation, with conservative
+        # backfilling every blocked job does. Other tasks may only use a reserved GPU if they
+        # release it before the reservation starts.
+        self.backfill = backfill
+        self.reservations = []  # (queue order, GPU id, start time) of the current dispatch round
+        self.scheduling_attempts = 0  # Number of assign_task_to_gpu calls made by dispatch()
+        # The energy policy serves tasks in arrival order but picks their GPU by expected energy and delay.
+        # model_power is the mean power (W) of each model while training, which includes the idle_power a
+        # GPU draws as soon as it runs anything (GPUs running nothing are assumed to be powered down).
+        # gpu_power_scale scales the power of each GPU (by id) relative to the one the models were profiled on.
+        if not 0 <= energy_weight <= 1:
+            raise ValueError("The energy weight must be between 0 (energy only) and 1 (delay only)")
+        self.model_power = model_power or {}
+        self.energy_weight = energy_weight
+        self.idle_power = idle_power
+        self.gpu_power_scale = gpu_power_scale or {}
+        # Optional CarbonDeferral. A deferred task is held with the rest of its job until the time it
+        # was deferred to, the engine must dispatch again at the times left in wake_times.
+        self.deferral = deferral
+        self.deferred_jobs = {}  # Job id -> time until which its tasks wait
+        self.wake_times = []
 
     def get_next_task(self):
         """Return the next task based on the selected policy."""
-        if self.policy_type == "fifo":
+        if self.policy_type in ("fifo", "energy"):
             return self.get_fifo_task()
         elif self.policy_type == "shortest_job":
             return self.get_shortest_job_task()
@@ -22,10 +58,185 @@ class Policy:
 
     def get_shortest_job_task(self):
         """Shortest Job policy: get the task with the shortest training time."""
-        # Find the task with the shortest training time without removing it
-        if not self.task_queue.tasks:
+        # The queue is a heap ordered by training time, so its head is the shortest task
+        return self.task_queue.get_next_task()
+
+    def dispatch(self, scheduler, now: float = 0) -> list:
+        """Try to place every queued task once, in policy order. Return the tasks that got a GPU."""
+        for job_id, until in list(self.deferred_jobs.items()):
+            if until <= now:
+                del self.deferred_jobs[job_id]
+        self.release_held_tasks(scheduler)
+        self.plan_reservations(scheduler, now)
+
+        placed = []
+        deferred = []
+        while scheduler.has_available_gpu():
+            task = self.task_queue.peek()
+            if task is None:
+                break
+            order = self.task_queue.head_order()
+            # Hold back the tasks that cannot be placed anyway, so they are not scanned again every round:
+            # chunks of a job run one after the other, and big tasks need a big enough free GPU
+            if scheduler.is_job_running(task.job_id) or task.job_id in self.deferred_jobs:
+                self.task_queue.hold_next(("job", task.job_id))
+                self.reserve(scheduler, now, order, task)
+                continue
+            if not scheduler.can_fit(task.memory_required):
+                self.task_queue.hold_next(("memory", task.memory_required))
+                self.reserve(scheduler, now, order, task)
+                continue
+            if self.deferral is not None:
+                until = self.deferral.defer_until(task, now, scheduler.hold_time(task))
+                if until > now:
+                    self.deferred_jobs[task.job_id] = until
+                    self.wake_times.append(until)
+                    self.task_queue.hold_next(("job", task.job_id))
+                    continue
+
+            reserved = self.reserved_gpus(order)
+            gpu_id = self.choose_gpu(scheduler, task, now) if self.policy_type == "energy" else None
+            # Tasks the power cap refuses wait, with the other tasks of their model, for the draw of the cluster to drop
+            if (self.policy_type != "energy" or gpu_id is not None) and not scheduler.power_allows(task, now, reserved, gpu_id):
+                self.task_queue.hold_next(("power", task.model_name))
+                continue
+
+            task = self.get_next_task()
+            self.scheduling_attempts += 1
+            if self.policy_type == "energy":
+                assigned = gpu_id is not None and scheduler.assign_task_to_gpu(task, now, reserved, gpu_id)
+            else:
+                assigned = scheduler.assign_task_to_gpu(task, now, reserved)
+            if assigned:
+                placed.append(task)
+                if self.deferral is not None:
+                    self.deferral.task_started(task)
+            else:
+                deferred.append((order, task))
+
+        # Put back the tasks that could not be placed in their place: ahead of the ones not tried yet, but
+        # behind the held tasks that come before them, whose reservations they must keep honouring
+        self.task_queue.requeue(deferred)
+        return placed
+
+    def pair_cost(self, scheduler, task, gpu, now: float) -> tuple:
+        """
+        Expected energy (J) and delay (s) of running the task on the GPU: right away if it fits now,
+        otherwise once the GPU is empty. The delay counts the wait and the slowdown due to the tasks
+        sharing the GPU. The energy counts the power the task adds to the GPU while it runs, and the
+        idle power for the time the task keeps the GPU busy beyond the tasks already on it.
+        """
+        fits = scheduler.fits_now(gpu.id, task.memory_required)
+        start = now if fits else scheduler.gpu_release_time(gpu.id, now)
+        hold = scheduler.hold_time(task, gpu if fits else None)
+        busy_until = scheduler.gpu_release_time(gpu.id, now) if fits and gpu.running else start
+        scale = self.gpu_power_scale.get(gpu.id, 1.0)
+        dynamic_power = max(self.model_power.get(task.model_name, 0.0) - self.idle_power, 0.0)
+        energy = scale * (dynamic_power * hold + self.idle_power * max(0.0, start + hold - busy_until))
+        delay = start - now + hold - task.training_time
+        return energy, delay
+
+    def pair_score(self, task, energy: float, delay: float) -> float:
+        """Weighted sum of the expected energy and delay of a pair, relative to the task running alone on an idle GPU."""
+        alone_energy = self.model_power.get(task.model_name, 0.0) * task.training_time
+        alone_time = task.training_time
+        return ((1 - self.energy_weight) * (energy / alone_energy if alone_energy > 0 else 0.0)
+                + self.energy_weight * (delay / alone_time if alone_time > 0 else delay))
+
+    def choose_gpu(self, scheduler, task, now: float) -> Optional[int]:
+        """
+        The GPU with the best score for the task among the ones with enough memory, ties going to the
+        shortest delay then to the fullest GPU. None if that GPU cannot take the task right now, the
+        task then waits for it.
+        """
+        candidates = []
+        for gpu in scheduler.gpus.values():
+            if task.memory_required <= gpu.memory_size:
+                energy, delay = self.pair_cost(scheduler, task, gpu, now)
+                candidates.append((self.pair_score(task, energy, delay), delay, gpu.free_memory, gpu.id))
+        if not candidates:
             return None
-        shortest_task = min(self.task_queue.tasks, key=lambda task: task.training_time)
-        self.task_queue.tasks.remove(shortest_task)  # Remove this task from the queue
-        return shortest_task
+        gpu_id = min(candidates)[-1]
+        return gpu_id if scheduler.fits_now(gpu_id, task.memory_required) else None
+
+    def plan_reservations(self, scheduler, now: float):
+        """Reserve GPUs for the tasks held back in earlier rounds, in policy order."""
+        self.reservations = []
+        if not self.backfill:
+            return
+        self.available_at = {gpu_id: scheduler.gpu_release_time(gpu_id, now) for gpu_id in scheduler.gpus}
+        self.reserved_jobs = set()
+        for order, task in self.task_queue.held_in_order():
+            if self.backfill == "easy" and self.reservations:
+                break
+            self.reserve(scheduler, now, order, task)
+
+    def reserve(self, scheduler, now: float, order: tuple, task):
+        """Reserve the GPU on which the blocked task could start the earliest."""
+        if not self.backfill or task.job_id in self.reserved_jobs:
+            return
+        if self.backfill == "easy" and self.reservations:
+            if self.reservations[0][0] < order:
+                return
+            # A task blocked this round comes before the reserved one, move the reservation to it
+            self.reserved_jobs.clear()
+            self.available_at = {gpu_id: scheduler.gpu_release_time(gpu_id, now) for gpu_id in scheduler.gpus}
+            self.reservations = []
+
+        earliest_start = scheduler.job_release_time(task.job_id, now)
+        candidates = [
+            (max(self.available_at[gpu.id], earliest_start), gpu.memory_size, gpu.id)
+            for gpu in scheduler.gpus.values() if task.memory_required <= gpu.memory_size
+        ]
+        if not candidates:
+            return  # The task does not fit on any GPU
+        start_time, _, gpu_id = min(candidates)
+        self.reserved_jobs.add(task.job_id)
+        if start_time <= now:
+            return  # Nothing running stands in its way, it only waits for its turn in this round
+        self.reservations.append((order, gpu_id, start_time))
+        # Later reservations go after this one on the same GPU
+        self.available_at[gpu_id] = start_time + scheduler.hold_time(task)
+
+    def reserved_gpus(self, order: tuple) -> dict:
+        """GPU id -> earliest reservation made for a task that comes before `order`."""
+        reserved = {}
+        for reservation_order, gpu_id, start_time in self.reservations:
+            if reservation_order < order:
+                reserved[gpu_id] = min(start_time, reserved.get(gpu_id, float("inf")))
+        return reserved
+
+    def release_held_tasks(self, scheduler):
+        """Bring back the held tasks that could now be placed, at most one per job."""
+        released_jobs = set()
+        for reason, value in list(self.task_queue.held):
+            if reason == "job" and not scheduler.is_job_running(value) and value not in self.deferred_jobs:
+                self.task_queue.release_next(("job", value))
+                released_jobs.add(value)
+
+        for reason, value in list(self.task_queue.held):
+            if reason != "memory":
+                continue
+            free_slots = scheduler.count_fitting(value)
+            while free_slots > 0:
+                task = self.task_queue.peek_held(("memory", value))
+                if task is None:
+                    break
+                if task.job_id in released_jobs or scheduler.is_job_running(task.job_id):
+                    self.task_queue.release_next(("memory", value), ("job", task.job_id))
+                else:
+                    self.task_queue.release_next(("memory", value))
+                    released_jobs.add(task.job_id)
+                    free_slots -= 1
 
+        # As many tasks held by the power cap as the headroom could take at their lowest clock
+        headroom = scheduler.power_headroom()
+        for reason, value in list(self.task_queue.held):
+            if reason != "power":
+                continue
+            while True:
+                task = self.task_queue.peek_held(("power", value))
+                if task is None or scheduler.min_added_power(task) > headroom:
+                    break
+                self.task_queue.release_next(("power", value))
+                headroom -= scheduler.min_added_power(task)
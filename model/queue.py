@@ -1,23 +1,183 @@
+import heapq
+import itertools
+from collections import deque
 from threading import Lock
-from typing import Optional
+from typing import Callable, List, Optional, Tuple, Union
 from model.task import Task
 
+# Sort keys a queue can be ordered by. Ties are broken by arrival order.
+ORDER_KEYS = {
+    "arrival": lambda task: 0,
+    "training_time": lambda task: task.training_time,
+    "user": lambda task: task.user_id,
+    "deadline": lambda task: task.deadline if task.deadline is not None else float("inf"),
+}
+
 class Queue:
-    def __init__(self):
-        self.tasks = []
-        self.lock = Lock()  # Initialize a lock for the task list
+    """
+    Priority queue of tasks backed by an indexed binary heap.
+
+    Heap entries are [key, sequence number, task]. Removing a task by id only
+    blanks its entry (lazy deletion), so add, peek, pop and remove all run in
+    O(log n) amortized time.
+    """
+    def __init__(self, order_by: Union[str, Callable] = "arrival"):
+        self.heap = []
+        self.entries = {}  # Task id -> live heap entries of that id, in insertion order
+        self.size = 0
+        self.sequence = itertools.count()  # Arrival order, used to break ties
+        self.held = {}  # Group -> heap of the entries set aside until they are released
+        self.lock = Lock()  # Initialize a lock for the heap
+        self.set_order(order_by)
+
+    def set_order(self, order_by: Union[str, Callable]):
+        """Order the queue by one of ORDER_KEYS or by any callable of a task."""
+        self.key = ORDER_KEYS[order_by] if isinstance(order_by, str) else order_by
+        with self.lock:
+            for entry in self.heap:
+                if entry[2] is not None:
+                    entry[0] = self.key(entry[2])
+            heapq.heapify(self.heap)
 
     def add_task(self, task: Task):
         # Lock this section to avoid concurrent modification
         with self.lock:
-            self.tasks.append(task)
+            self._push(task, next(self.sequence))
             # print(f"Task {task.id} added to the queue.")  # Optional logging for debugging
 
     def get_next_task(self) -> Optional[Task]:
-        # Lock this section to safely access and modify the list
+        # Lock this section to safely access and modify the heap
+        with self.lock:
+            entry = self._head()
+            if entry is None:
+                return None  # Return None if queue is empty
+            heapq.heappop(self.heap)
+            self._forget(entry)
+            # print(f"Task {entry[2].id} removed from the queue.")  # Optional logging for debugging
+            return entry[2]
+
+    def peek(self) -> Optional[Task]:
+        """Return the next task without removing it."""
+        with self.lock:
+            entry = self._head()
+            return entry[2] if entry is not None else None
+
+    def remove(self, task_id: str) -> Optional[Task]:
+        """Remove the oldest queued task with the given id and return it."""
         with self.lock:
-            if self.tasks:
-                task = self.tasks.pop(0)
-                # print(f"Task {task.id} removed from the queue.")  # Optional logging for debugging
-                return task
-            return None  # Return None if queue is empty
+            entries = self.entries.get(task_id)
+            if not entries:
+                return None
+            entry = entries[0]
+            self._forget(entry)
+            task = entry[2]
+            entry[2] = None  # Skipped when it reaches the top of the heap
+            return task
+
+    def requeue(self, tasks: List[Tuple[tuple, Task]]):
+        """
+        Put back tasks taken with get_next_task, given as (order, task) with the order head_order gave
+        them. They keep their place, ahead of the tasks not tried yet and behind the held ones before them.
+        """
+        with self.lock:
+            for (_, sequence), task in tasks:
+                self._push(task, sequence)
+
+    def hold_next(self, group):
+        """Set the next task aside under `group`, keeping its place in the order for when it comes back."""
+        with self.lock:
+            entry = self._head()
+            if entry is not None:
+                heapq.heappop(self.heap)
+                heapq.heappush(self.held.setdefault(group, []), entry)
+
+    def head_order(self) -> Optional[tuple]:
+        """Return the (key, sequence number) that places the next task in the order."""
+        with self.lock:
+            entry = self._head()
+            return (entry[0], entry[1]) if entry is not None else None
+
+    def held_in_order(self):
+        """
+        Yield (order, task) for all the held tasks, in queue order. Walks the held heaps
+        lazily, so reading the first k tasks costs O(k log k). The held groups must not
+        change while iterating.
+        """
+        with self.lock:
+            heaps = [held for held in self.held.values() if held]
+        frontier = [(held[0], i, 0) for i, held in enumerate(heaps)]
+        heapq.heapify(frontier)
+        while frontier:
+            entry, i, index = heapq.heappop(frontier)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heaps[i]):
+                    heapq.heappush(frontier, (heaps[i][child], i, child))
+            if entry[2] is not None:
+                yield (entry[0], entry[1]), entry[2]
+
+    def peek_held(self, group) -> Optional[Task]:
+        """Return the first task held under `group` without releasing it."""
+        with self.lock:
+            entry = self._held_head(group)
+            return entry[2] if entry is not None else None
+
+    def release_next(self, group, new_group=None):
+        """Put the first task held under `group` back in its place, or hold it under `new_group` instead."""
+        with self.lock:
+            entry = self._held_head(group)
+            if entry is None:
+                return
+            heapq.heappop(self.held[group])
+            if not self.held[group]:
+                del self.held[group]
+            if new_group is None:
+                heapq.heappush(self.heap, entry)
+            else:
+                heapq.heappush(self.held.setdefault(new_group, []), entry)
+
+    def release(self, group):
+        """Put all the tasks held under `group` back in their place."""
+        with self.lock:
+            for entry in self.held.pop(group, []):
+                if entry[2] is not None:
+                    heapq.heappush(self.heap, entry)
+
+    @property
+    def tasks(self) -> List[Task]:
+        """Queued tasks, held ones included, in no particular order."""
+        with self.lock:
+            entries = self.heap + [entry for group in self.held.values() for entry in group]
+            return [entry[2] for entry in entries if entry[2] is not None]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _push(self, task: Task, sequence: int):
+        entry = [self.key(task), sequence, task]
+        heapq.heappush(self.heap, entry)
+        self.entries.setdefault(task.id, deque()).append(entry)
+        self.size += 1
+
+    def _head(self) -> Optional[list]:
+        # Drop removed entries from the top of the heap
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def _held_head(self, group) -> Optional[list]:
+        held = self.held.get(group)
+        while held and held[0][2] is None:
+            heapq.heappop(held)
+        if held is not None and not held:
+            del self.held[group]
+        return held[0] if held else None
+
+    def _forget(self, entry: list):
+        entries = self.entries[entry[2].id]
+        if entries[0] is entry:
+            entries.popleft()
+        else:
+            entries.remove(entry)
+        if not entries:
+            del self.entries[entry[2].id]
+        self.size -= 1
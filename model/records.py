@@ -0,0 +1,193 @@
+import csv
+import os
+import threading
+from typing import Iterator, List, Optional, Union
+import numpy as np
+import pandas as pd
+from model.task import Task
+
+# Column order of the task_records_*.csv files
+TASK_RECORD_FIELDS = ["GPU_ID", "Arrival_Time", "Start_Time", "End_Time", "Training_Time", "User_ID", "Model_Name", "Task_Id", "Task_Retrain", "Memory_Required"]
+
+
+def make_task_record(task: Task, start_time: float, end_time: Optional[float] = None) -> dict:
+    """
+    Build the record row of a task placed on a GPU at start_time. Without an end_time the task
+    is expected to end after its training time, stretched by the slowdown of its GPU.
+    """
+    job_id, _, retrain = task.id.partition("_retrain_")
+    return {
+        "GPU_ID": task.assigned_gpu.id,
+        "Arrival_Time": task.arrival_time,
+        "Start_Time": start_time,
+        "End_Time": end_time if end_time is not None else start_time + task.training_time * task.slowdown,
+        "Training_Time": task.training_time,
+        "User_ID": task.user_id,
+        "Model_Name": task.model_name,
+        "Task_Id": job_id,
+        "Task_Retrain": int(retrain) if retrain else -1,
+        "Memory_Required": task.memory_required
+    }
+
+
+class TaskRecordTable:
+    """
+    Task records stored column by column in NumPy arrays, one row per task placed on a GPU.
+
+    Model names and job ids are stored as integer codes into lookup lists, so a row
+    costs a few dozen bytes instead of a dict of ten Python objects. Indexing or
+    iterating the table gives the rows back as record dicts.
+    """
+    COLUMN_TYPES = {
+        "GPU_ID": np.int32,
+        "Arrival_Time": np.float64,
+        "Start_Time": np.float64,
+        "End_Time": np.float64,
+        "Training_Time": np.float64,
+        "User_ID": np.int32,
+        "Model_Name": np.int32,  # Code into model_names
+        "Task_Id": np.int32,  # Code into job_ids
+        "Task_Retrain": np.int32,
+        "Memory_Required": np.int32,
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMN_TYPES.items()}
+        self.size = 0
+        self.model_names = []
+        self.model_codes = {}
+        self.job_ids = []
+        self.job_codes = {}
+
+    def append(self, task: Task, start_time: float, end_time: Optional[float] = None):
+        """Record a task placed on a GPU at start_time, see make_task_record for end_time."""
+        if self.size == len(self.columns["GPU_ID"]):
+            self._grow()
+        job_id, _, retrain = task.id.partition("_retrain_")
+        row = self.size
+        columns = self.columns
+        columns["GPU_ID"][row] = task.assigned_gpu.id
+        columns["Arrival_Time"][row] = task.arrival_time
+        columns["Start_Time"][row] = start_time
+        columns["End_Time"][row] = end_time if end_time is not None else start_time + task.training_time * task.slowdown
+        columns["Training_Time"][row] = task.training_time
+        columns["User_ID"][row] = task.user_id
+        columns["Model_Name"][row] = self._code(task.model_name, self.model_names, self.model_codes)
+        columns["Task_Id"][row] = self._code(job_id, self.job_ids, self.job_codes)
+        columns["Task_Retrain"][row] = int(retrain) if retrain else -1
+        columns["Memory_Required"][row] = task.memory_required
+        self.size += 1
+
+    def column(self, name: str) -> np.ndarray:
+        """The filled part of a column, as integer codes for Model_Name and Task_Id."""
+        return self.columns[name][:self.size]
+
+    def to_frame(self) -> pd.DataFrame:
+        """The records as a DataFrame, with categorical Model_Name and Task_Id columns."""
+        data = {name: self.column(name) for name in TASK_RECORD_FIELDS}
+        data["Model_Name"] = pd.Categorical.from_codes(data["Model_Name"], categories=self.model_names)
+        data["Task_Id"] = pd.Categorical.from_codes(data["Task_Id"], categories=self.job_ids)
+        return pd.DataFrame(data, columns=TASK_RECORD_FIELDS)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, row: int) -> dict:
+        if row < 0:
+            row += self.size
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        record = {name: self.columns[name][row].item() for name in TASK_RECORD_FIELDS}
+        record["Model_Name"] = self.model_names[record["Model_Name"]]
+        record["Task_Id"] = self.job_ids[record["Task_Id"]]
+        return record
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self[row] for row in range(self.size))
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, 2 * len(column))
+
+    @staticmethod
+    def _code(value: str, values: list, codes: dict) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+
+class TaskRecordWriter:
+    """
+    Streams task records to a CSV file instead of keeping them in memory.
+
+    Rows are buffered and appended in batches, once flush_rows of them are waiting or
+    flush_interval seconds after the oldest waiting one, so the file can be tailed while
+    a simulation runs and a crash only loses the last batch. Safe to use from several
+    threads. Takes the place of a TaskRecordTable in the simulation engines.
+    """
+    def __init__(self, filename: str, flush_rows: int = 1000, flush_interval: float = 5.0):
+        self.filename = filename
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.rows_written = 0
+        self.lock = threading.Lock()
+        self.timer = None  # Flushes the buffer if no other row comes in time
+        self.file = open(filename, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=TASK_RECORD_FIELDS)
+        self.writer.writeheader()
+        self.file.flush()
+
+    def append(self, task: Task, start_time: float, end_time: Optional[float] = None):
+        """Record a task placed on a GPU at start_time, see make_task_record for end_time."""
+        record = make_task_record(task, start_time, end_time)
+        with self.lock:
+            self.buffer.append(record)
+            if len(self.buffer) >= self.flush_rows:
+                self._flush()
+            elif self.timer is None and self.flush_interval > 0:
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+    def __len__(self) -> int:
+        return self.rows_written + len(self.buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer and not self.file.closed:
+            self.writer.writerows(self.buffer)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.rows_written += len(self.buffer)
+            self.buffer = []
+
+
+def save_task_records(filename: str, task_records: Union[List[dict], TaskRecordTable]):
+    """Save task records as a CSV file."""
+    if isinstance(task_records, TaskRecordTable):
+        task_records.to_frame().to_csv(filename, index=False, lineterminator="\r\n")  # Same line ends as csv.writer
+        return
+    with open(filename, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TASK_RECORD_FIELDS)
+        writer.writeheader()  # Write header
+        writer.writerows(task_records)  # Write each record
@@ -1,4 +1,6 @@
-from typing import List
+import bisect
+from threading import Lock
+from typing import Dict, List, Optional
 from model.gpu import GPU
 from model.task import Task
 from colorama import Fore, Style, init
@@ -7,32 +9,233 @@ from colorama import Fore, Style, init
 init(autoreset=True)
 
 class Scheduler:
-    def __init__(self, gpus: List[GPU]):
+    def __init__(self, gpus: List[GPU], verbose: bool = True, session_duration: float = 0, sharing: bool = False, slowdown: float = 0,
+                 power_cap: float = 0, model_power: Optional[Dict[str, float]] = None, idle_power: float = 0,
+                 min_clock: float = 1.0, clock_power_exponent: float = 3.0):
         self.gpus = {}
-        self.running_tasks = []
+        self.verbose = verbose
+        self.session_duration = session_duration  # When > 0 every task leases its GPU for a whole session
+        # With sharing, tasks are packed on a GPU as long as their memory fits. Each task already
+        # on the GPU when a new one starts makes the new one `slowdown` times its training time longer.
+        self.sharing = sharing
+        self.slowdown = slowdown
+        self.lock = Lock()  # Task threads release GPUs while the dispatcher assigns them
+        self.on_release = None  # Optional callback run after a GPU is released
+        self.running_tasks = set()  # Ids of the jobs holding a GPU
+        self.job_release_times = {}  # Job id -> time at which its running chunk is expected to end
+        # GPUs that can take a task as (free memory, GPU id), sorted so that best-fit lookups are a binary search
+        self.free_gpus = []
         for g in gpus:
             self.gpus[g.id] = g
+            if self._accepts_tasks(g):
+                self.free_gpus.append((g.free_memory, g.id))
+        self.free_gpus.sort()
 
-    def assign_task_to_gpu(self, task: Task) -> bool:
+        # Power model, on when model_power (mean power in W of each model while training) is given. A GPU
+        # draws idle_power as soon as it runs anything (GPUs running nothing are assumed to be powered
+        # down) and each task adds the rest of its model's power. With a power_cap (W) a task only starts
+        # if the cluster stays under the cap, if need be down-clocked to as low as min_clock times the
+        # full clock: its training then takes 1 / clock times longer while its added power scales with
+        # clock ** clock_power_exponent. Tasks that would not fit even at min_clock wait.
+        if power_cap and model_power is None:
+            raise ValueError("A power cap needs the power of the models")
+        self.power_cap = power_cap
+        self.model_power = model_power
+        self.idle_power = idle_power
+        self.min_clock = min_clock
+        self.clock_power_exponent = clock_power_exponent
+        self.power = 0.0  # Current draw of the cluster (W)
+        self.task_power = {}  # Job id -> power added by its running chunk
+        self.power_series = []  # (time, power) after every change of the draw
+        self.lost_gpu_seconds = 0.0  # GPU time added by down-clocking
+        self.downclocked_tasks = 0
+        self.power_rejections = 0  # Placements refused because of the cap
 
-        task_id = task.id.split("_retrain_")[0]
-        if task_id in self.running_tasks:
-            return False
+    def hold_time(self, task: Task, gpu: Optional[GPU] = None) -> float:
+        """How long the task keeps its GPU once started (on `gpu` if it is not placed yet)."""
+        if self.session_duration > 0:
+            return self.session_duration
+        slowdown = task.slowdown if gpu is None else self.slowdown_on(gpu) / (self.power_clock(task, gpu) or 1.0)
+        return task.training_time * slowdown
 
-        # Try to find an available GPU with sufficient memory
-        for gpu_id in self.gpus.keys():
-            gpu = self.gpus[gpu_id]
-            if gpu.is_available and task.memory_required <= gpu.memory_size:
-                task.assign_gpu(gpu)
-                self.running_tasks.append(task_id)
-                gpu.is_available = False  # Mark GPU as in use
+    def slowdown_on(self, gpu: GPU) -> float:
+        """Training time multiplier of a task starting on the GPU next to the ones already there."""
+        return 1 + self.slowdown * len(gpu.running)
+
+    def dynamic_power(self, task: Task) -> float:
+        """Power (W) the task adds to a GPU already running something, at full clock."""
+        return max(self.model_power.get(task.model_name, 0.0) - self.idle_power, 0.0)
+
+    def min_added_power(self, task: Task) -> float:
+        """Least power (W) the task can add to the cluster: at min_clock, on a GPU already running something."""
+        return self.dynamic_power(task) * self.min_clock ** self.clock_power_exponent
+
+    def power_headroom(self) -> float:
+        """Power (W) left under the cap, infinite without one."""
+        return self.power_cap - self.power if self.power_cap else float("inf")
+
+    def power_clock(self, task: Task, gpu: GPU) -> Optional[float]:
+        """
+        Highest clock (fraction of the full one) at which the task can start on the GPU without the
+        cluster going over the power cap, None if not even min_clock keeps it under.
+        """
+        if not self.power_cap:
+            return 1.0
+        headroom = self.power_cap - self.power - (self.idle_power if gpu.is_available else 0.0)
+        dynamic_power = self.dynamic_power(task)
+        if dynamic_power <= headroom:
+            return 1.0
+        if headroom <= 0 or self.min_clock >= 1:
+            return None
+        clock = (headroom / dynamic_power) ** (1 / self.clock_power_exponent)
+        return clock if clock >= self.min_clock else None
+
+    def assign_task_to_gpu(self, task: Task, now: float = 0, reservations: Optional[Dict[int, float]] = None,
+                           gpu_id: Optional[int] = None) -> bool:
+        """
+        Place the task on the best-fitting free GPU, or on GPU `gpu_id` if given. `reservations`
+        maps GPU ids to the time from which they are promised to another task, the task only
+        gets one of those GPUs if it is done by then.
+        """
+        task_id = task.job_id
+        with self.lock:
+            if task_id in self.running_tasks:
+                return False
+
+            index = self._placement(task, now, reservations, gpu_id)
+            if index == len(self.free_gpus):
+                # print(Fore.RED + f"No available GPU found for Task {task.id}.\n")
+                return False
+
+            gpu = self.gpus[self.free_gpus[index][1]]
+            clock = self.power_clock(task, gpu)
+            if clock is None:
+                self.power_rejections += 1
+                return False
+
+            _, gpu_id = self.free_gpus.pop(index)
+            slowdown = self.slowdown_on(gpu) if self.session_duration == 0 else 1.0
+            task.assign_gpu(gpu, now, slowdown / clock)
+            if clock < 1:
+                self.downclocked_tasks += 1
+                self.lost_gpu_seconds += task.training_time * slowdown * (1 / clock - 1)
+            if self.model_power is not None:
+                self.task_power[task_id] = self.dynamic_power(task) * clock ** self.clock_power_exponent
+                self.power += self.task_power[task_id] + (self.idle_power if gpu.is_available else 0.0)
+                self.power_series.append((now, self.power))
+            gpu.allocate(task)  # Mark GPU memory as in use
+            if self._accepts_tasks(gpu):
+                bisect.insort(self.free_gpus, (gpu.free_memory, gpu_id))
+            self.running_tasks.add(task_id)
+            self.job_release_times[task_id] = now + self.hold_time(task)
+            if self.verbose:
                 print(Fore.GREEN + f"Task {task.id} assigned to GPU {gpu_id} with {gpu.memory_size} GB memory.\n")
+            return True
+
+    def power_allows(self, task: Task, now: float = 0, reservations: Optional[Dict[int, float]] = None,
+                     gpu_id: Optional[int] = None) -> bool:
+        """
+        Whether the power cap lets the task start on the GPU assign_task_to_gpu would give it. True
+        without a cap or when no GPU can take the task, it is then refused for another reason.
+        """
+        if not self.power_cap:
+            return True
+        with self.lock:
+            index = self._placement(task, now, reservations, gpu_id)
+            if index == len(self.free_gpus) or self.power_clock(task, self.gpus[self.free_gpus[index][1]]) is not None:
                 return True
-        # print(Fore.RED + f"No available GPU found for Task {task.id}.\n")  # we do not consider parallelization yet
-        return False
-
-    def release_gpu(self, gpu_id: int, task_id: str):
-        task_id = task_id.split("_retrain_")[0]
-        # Release the GPU after task completion
-        self.gpus[gpu_id].is_available = True
-        self.running_tasks.remove(task_id)
+            self.power_rejections += 1
+            return False
+
+    def is_job_running(self, job_id: str) -> bool:
+        """Whether a chunk of the job already holds a GPU."""
+        return job_id in self.running_tasks
+
+    def can_fit(self, memory_required: float) -> bool:
+        """Whether a free GPU has enough memory for a task needing `memory_required` GB."""
+        return self._first_fitting(memory_required) < len(self.free_gpus)
+
+    def count_fitting(self, memory_required: float) -> int:
+        """Number of tasks needing `memory_required` GB that could be placed right now."""
+        index = self._first_fitting(memory_required)
+        if not self.sharing:
+            return len(self.free_gpus) - index
+        return sum(int(free_memory // memory_required) for free_memory, _ in self.free_gpus[index:])
+
+    def gpu_release_time(self, gpu_id: int, now: float) -> float:
+        """Time from which the GPU is expected to be completely free."""
+        gpu = self.gpus[gpu_id]
+        return max([now] + [self.job_release_times[task.job_id] for task in gpu.running])
+
+    def job_release_time(self, job_id: str, now: float) -> float:
+        """Time from which the next chunk of the job can start."""
+        return max(now, self.job_release_times[job_id]) if job_id in self.running_tasks else now
+
+    def fits_now(self, gpu_id: int, memory_required: float) -> bool:
+        """Whether the GPU can take a task needing `memory_required` GB right now."""
+        gpu = self.gpus[gpu_id]
+        return self._accepts_tasks(gpu) and gpu.free_memory >= memory_required
+
+    def has_available_gpu(self) -> bool:
+        return len(self.free_gpus) > 0
+
+    def release_gpu(self, gpu_id: int, task_id: str, now: Optional[float] = None):
+        job_id = task_id.split("_retrain_")[0]
+        # Release the GPU memory of the task after its completion
+        with self.lock:
+            gpu = self.gpus[gpu_id]
+            if self._accepts_tasks(gpu):
+                del self.free_gpus[bisect.bisect_left(self.free_gpus, (gpu.free_memory, gpu_id))]
+            gpu.free(task_id)
+            if self._accepts_tasks(gpu):
+                bisect.insort(self.free_gpus, (gpu.free_memory, gpu_id))
+            self.running_tasks.remove(job_id)
+            del self.job_release_times[job_id]
+            if self.model_power is not None:
+                self.power -= self.task_power.pop(job_id) + (self.idle_power if gpu.is_available else 0.0)
+                if not self.running_tasks:
+                    self.power = 0.0  # Drop the rounding errors
+                self.power_series.append((now, self.power))
+
+        # Wake up whoever is waiting for a free GPU
+        if self.on_release:
+            self.on_release()
+
+    def energy(self) -> float:
+        """Energy (J) drawn by the cluster over the power series, down-clocked tasks at their lower power."""
+        return sum((end - start) * power for (start, power), (end, _) in zip(self.power_series, self.power_series[1:]))
+
+    def power_stats(self) -> dict:
+        """Peak draw and energy of the cluster, and throughput lost to the power cap."""
+        return {
+            "peak_power": max((power for _, power in self.power_series), default=0.0),
+            "energy": self.energy(),
+            "lost_gpu_seconds": self.lost_gpu_seconds,
+            "downclocked_tasks": self.downclocked_tasks,
+            "power_rejections": self.power_rejections,
+        }
+
+    def _accepts_tasks(self, gpu: GPU) -> bool:
+        # Without sharing a GPU only takes a task when it is idle
+        return gpu.free_memory > 0 and (self.sharing or gpu.is_available)
+
+    def _placement(self, task: Task, now: float, reservations: Optional[Dict[int, float]], gpu_id: Optional[int]) -> int:
+        # Index in free_gpus of the GPU the task would get, len(free_gpus) if none can take it
+        if gpu_id is not None:
+            index = bisect.bisect_left(self.free_gpus, (self.gpus[gpu_id].free_memory, gpu_id))
+            if index < len(self.free_gpus) and (self.free_gpus[index][1] != gpu_id
+                                                or self.free_gpus[index][0] < task.memory_required
+                                                or now + self.hold_time(task, self.gpus[gpu_id]) > (reservations or {}).get(gpu_id, float("inf"))):
+                index = len(self.free_gpus)
+            return index
+        # Best fit: the GPU with the least free memory that is still enough for the task,
+        # which packs shared GPUs as tightly as possible
+        index = self._first_fitting(task.memory_required)
+        if reservations:
+            while index < len(self.free_gpus) and now + self.hold_time(task, self.gpus[self.free_gpus[index][1]]) > reservations.get(self.free_gpus[index][1], float("inf")):
+                index += 1
+        return index
+
+    def _first_fitting(self, memory_required: float) -> int:
+        # Index of the GPU with the least free memory that still has `memory_required` GB
+        return bisect.bisect_left(self.free_gpus, (memory_required,))
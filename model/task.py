@@ -2,17 +2,27 @@
 # from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModel
 
 class Task:
+    # Fixed attributes instead of a per-instance dict, large workloads hold many tasks
+    __slots__ = ("id", "job_id", "model_name", "training_time", "memory_required", "assigned_gpu", "start_time",
+                 "slowdown", "arrival_time", "user_id", "deadline")
+
     def __init__(self, task_id: int, model_name: str, training_time: int = 100, memory_required: int = 32, user_id=None):
         self.id = task_id
+        self.job_id = task_id.split("_retrain_")[0]  # Retrain chunks of the same job share it
         self.model_name = model_name
         self.training_time = training_time
         self.memory_required = memory_required
         self.assigned_gpu = None  
+        self.start_time = None
+        self.slowdown = 1.0  # Training time multiplier due to the tasks sharing its GPU
         self.arrival_time = None
         self.user_id = user_id
+        self.deadline = None  # Optional time by which the task should be done
 
-    def assign_gpu(self, gpu):
+    def assign_gpu(self, gpu, start_time=None, slowdown=1.0):
         """
         Assign a GPU to the task.
         """
         self.assigned_gpu = gpu
+        self.start_time = start_time
+        self.slowdown = slowdown
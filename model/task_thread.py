@@ -9,19 +9,27 @@ from model.task import Task
 init(autoreset=True)
 
 class TaskThread(threading.Thread):
-    def __init__(self, task: Task, scheduler: Scheduler, session_duration: float):
+    def __init__(self, task: Task, scheduler: Scheduler, on_complete=None):
         super().__init__()
         self.task = task
         self.scheduler = scheduler
-        self.session_duration = session_duration
+        self.on_complete = on_complete  # Called with the task and its completion time once trained
+        self.end_time = None
     
     def run(self):
 
-        sleep_time = self.session_duration if self.session_duration > 0 else self.task.training_time
+        training_time = self.task.training_time * self.task.slowdown
+        hold_time = self.scheduler.hold_time(self.task)
 
         # Wait for the duration of the task's training time
-        time.sleep(sleep_time)  # Simulate training time
+        time.sleep(training_time)  # Simulate training time
+        self.end_time = time.time()
+        if self.on_complete:
+            self.on_complete(self.task, self.end_time)
+
+        # A session keeps the GPU until it is over
+        time.sleep(max(0.0, hold_time - training_time))
 
         # Release the GPU after the task is done
-        self.scheduler.release_gpu(self.task.assigned_gpu.id, self.task.id)
+        self.scheduler.release_gpu(self.task.assigned_gpu.id, self.task.id, time.time())
         print(Fore.MAGENTA + f"Task {self.task.id} completed and GPU {self.task.assigned_gpu.id} released.\n")
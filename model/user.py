@@ -1,12 +1,23 @@
-from asyncio import Task
-from typing import Dict
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator, List, Tuple
+from model.task import Task
 
 
 class User:
+    __slots__ = ("id", "requests")
+
     def __init__(self, user_id: int):
         self.id = user_id
-        # Map of task objects with their assigned timestamp
-        self.map_task: Dict[int, Task] = {} # type: ignore
+        # (request timestamp, task) pairs in the order they were added.
+        # Retrain chunks can share a timestamp, so the same time can appear several times.
+        self.requests: List[Tuple[float, Task]] = []
+
+    def add_task(self, time: float, task: Task):
+        self.requests.append((time, task))
 
-    def add_task(self, time: int, task: Task):
-        self.map_task[time] = task
+    def requests_by_time(self) -> Iterator[Tuple[float, List[Task]]]:
+        """Yield (time, tasks asked at that time) in time order, keeping the order tasks were added in."""
+        self.requests.sort(key=itemgetter(0))  # Stable, so tasks at the same time keep their order
+        for time, requests in groupby(self.requests, key=itemgetter(0)):
+            yield time, [task for _, task in requests]
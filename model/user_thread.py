@@ -8,20 +8,27 @@ init(autoreset=True)
 
 class UserThread(threading.Thread):
     """Thread for each user that waits and adds tasks at specified times."""
-    def __init__(self, user, task_queue):
+    def __init__(self, user, task_queue, dispatcher=None):
         super().__init__()
         self.user: User = user
         self.task_queue = task_queue
+        self.dispatcher = dispatcher  # Optional Dispatcher to notify about new tasks
 
     def run(self):
-        while self.user.map_task:
-            # Get the earliest task request time
-            time_of_asking = min(self.user.map_task.keys())
-            task = self.user.map_task.pop(time_of_asking)  # Retrieve and remove the task from map_task
-            # Wait until the specified time to request the task
-            time.sleep(time_of_asking)
-            print(Fore.CYAN + f"User {self.user.id} is requesting {task.id} at time {time_of_asking}\n")
-            task.arrival_time = time.time()
-            
-            # Add the task to the queue
-            self.task_queue.add_task(task)
+        started_at = time.time()
+        for time_of_asking, tasks in self.user.requests_by_time():
+            # Wait until the specified time (relative to the thread start) to request the tasks
+            time.sleep(max(0.0, started_at + time_of_asking - time.time()))
+            for task in tasks:
+                print(Fore.CYAN + f"User {self.user.id} is requesting {task.id} at time {time_of_asking}\n")
+                task.arrival_time = time.time()
+
+                # Add the task to the queue
+                self.task_queue.add_task(task)
+
+            if self.dispatcher:
+                self.dispatcher.task_arrived()
+        self.user.requests = []
+
+        if self.dispatcher:
+            self.dispatcher.user_finished()
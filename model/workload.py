@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import random
+import zipfile
+import numpy as np
+
+# Models a user can ask to fine-tune, in the order simulation.py draws them from
+MODEL_NAMES = ["lucadiliello/bart-small", "google/flan-t5-base", "google/flan-t5-small"]
+
+# Columns of a workload, one entry per task, sorted by user then task
+WORKLOAD_COLUMNS = ["user_id", "task_index", "model_id", "request_time", "size"]
+
+
+# Stored random numbers files, and the request time range they were drawn for
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results")
+RANDOM_NUMBERS_RANGE = (0.01, 0.1)
+
+
+def random_numbers_filename(users: int, tasks: int, seed: int) -> str:
+    return os.path.join(RESULTS_DIR, f"random_numbers_users_{users}_tasks_{tasks}_seed_{seed}.json")
+
+
+def generate_random_numbers(users: int, max_tasks: int, min_time: float, max_time: float, seed: int = 10) -> dict:
+    """
+    Draw a workload the way simulation.py does: for each user a number of tasks,
+    then a model and a request time for each task. Seed 10 gives back the
+    results/random_numbers_*_seed_10.json files.
+    """
+    rng = random.Random(seed)
+    random_numbers = {}
+    for user_id in range(1, users + 1):
+        num_tasks = rng.randint(1, max_tasks)
+        random_numbers[f'user_{user_id}_num_tasks'] = num_tasks
+        for t in range(num_tasks):
+            task_id = f"task_{t}_of_user_{user_id}"
+            random_numbers[f'task_{task_id}_model_name'] = rng.choice(MODEL_NAMES)
+            random_numbers[f'task_{task_id}_request_time'] = rng.uniform(min_time, max_time)
+    return random_numbers
+
+
+def load_random_numbers(filename: str) -> dict:
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def generate_workload(users: int, max_tasks: int, min_time: float, max_time: float, seed: int = 10,
+                      size_sigma: float = 0.0) -> dict:
+    """
+    Draw a whole workload at once as columnar arrays. Each user gets 1 to max_tasks tasks, each task a
+    uniform model and a uniform request time in [min_time, max_time]. The size of a task scales the
+    training time of its model, it is lognormal with the given sigma (0 keeps the profiled times).
+    Draws differ from generate_random_numbers for the same seed.
+    """
+    rng = np.random.default_rng(seed)
+    num_tasks = rng.integers(1, max_tasks + 1, size=users)
+    total = int(num_tasks.sum())
+    first_task = np.repeat(np.cumsum(num_tasks) - num_tasks, num_tasks)
+    return {
+        "user_id": np.repeat(np.arange(1, users + 1, dtype=np.int32), num_tasks),
+        "task_index": (np.arange(total) - first_task).astype(np.int32),
+        "model_id": rng.integers(0, len(MODEL_NAMES), size=total, dtype=np.int8),
+        "request_time": rng.uniform(min_time, max_time, size=total),
+        "size": rng.lognormal(0.0, size_sigma, size=total) if size_sigma > 0 else np.ones(total),
+        "model_names": np.array(MODEL_NAMES),
+    }
+
+
+def workload_from_random_numbers(random_numbers: dict) -> dict:
+    """Convert a legacy random_numbers dict (as stored in the JSON files) to a columnar workload."""
+    rows = []
+    user_id = 1
+    while f'user_{user_id}_num_tasks' in random_numbers:
+        for t in range(random_numbers[f'user_{user_id}_num_tasks']):
+            task_id = f"task_{t}_of_user_{user_id}"
+            rows.append((user_id, t, MODEL_NAMES.index(random_numbers[f'task_{task_id}_model_name']),
+                         random_numbers[f'task_{task_id}_request_time']))
+        user_id += 1
+    user_ids, task_indexes, model_ids, request_times = zip(*rows) if rows else ([], [], [], [])
+    return {
+        "user_id": np.array(user_ids, dtype=np.int32),
+        "task_index": np.array(task_indexes, dtype=np.int32),
+        "model_id": np.array(model_ids, dtype=np.int8),
+        "request_time": np.array(request_times, dtype=np.float64),
+        "size": np.ones(len(rows)),
+        "model_names": np.array(MODEL_NAMES),
+    }
+
+
+def save_workload(filename: str, workload: dict):
+    """Save a workload as an uncompressed .npz, so load_workload can memory-map its columns."""
+    np.savez(filename, **workload)
+
+
+def load_workload(filename: str, mmap: bool = True) -> dict:
+    """
+    Load a workload from a .npz file, or convert a legacy random_numbers .json file. The columns
+    of a .npz are memory-mapped straight from the archive, so only the pages read are loaded.
+    """
+    if filename.endswith(".json"):
+        return workload_from_random_numbers(load_random_numbers(filename))
+    if not mmap:
+        with np.load(filename) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    workload = {}
+    with zipfile.ZipFile(filename) as zf, open(filename, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                workload[name] = np.lib.format.read_array(zf.open(info))
+                continue
+            # Skip the local file header to reach the .npy data of the member
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            shape, fortran_order, dtype = (np.lib.format.read_array_header_1_0(f) if version == (1, 0)
+                                           else np.lib.format.read_array_header_2_0(f))
+            if dtype.hasobject or 0 in shape:
+                f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+                workload[name] = np.lib.format.read_array(f)
+            else:
+                workload[name] = np.memmap(filename, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                           order="F" if fortran_order else "C")
+    return workload
+
+
+def workload_model_names(workload: dict) -> list:
+    return [str(name) for name in workload.get("model_names", MODEL_NAMES)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a columnar workload, or convert a random numbers JSON file to one")
+    parser.add_argument('--output', type=str, required=True, help="Workload file to write (.npz)")
+    parser.add_argument('--convert', type=str, help="Random numbers JSON file to convert instead of generating a workload")
+    parser.add_argument('--users', type=int, default=3, help="Number of users")
+    parser.add_argument('--tasks', type=int, default=3, help="Max number of tasks of each user")
+    parser.add_argument('--min-time', type=float, default=0.01, help="Minimum task request time")
+    parser.add_argument('--max-time', type=float, default=0.1, help="Maximum task request time")
+    parser.add_argument('--seed', type=int, default=10, help="Seed of the workload")
+    parser.add_argument('--size-sigma', type=float, default=0.0, help="Sigma of the lognormal task sizes (0: all tasks have the profiled size)")
+    args = parser.parse_args()
+
+    if args.convert:
+        workload = load_workload(args.convert)
+    else:
+        workload = generate_workload(args.users, args.tasks, args.min_time, args.max_time, args.seed, args.size_sigma)
+    save_workload(args.output, workload)
+    print(f"Saved {len(workload['user_id'])} tasks to {args.output}.")
@@ -0,0 +1,85 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style, init
+from plots.energy_attribution import attribute_energy, simulated_power_samples
+from plots.power_traces import idle_power
+from plots.utils import calculate_avg_jct, calculate_total_waiting_time, energy_profiles, new_figure
+from simulation_fixed_rand_v2 import build_parser, run_simulation
+
+# Initialize colorama
+init(autoreset=True)
+
+
+def run_weight(args: argparse.Namespace, energy_weight: float) -> dict:
+    """Simulate the workload of args with the energy policy and the given weight, and return its energy and JCT."""
+    args = argparse.Namespace(**{**vars(args), "scheduling_type": "energy", "energy_weight": energy_weight,
+                                 "engine": "events"})
+    task_records, gpus, _ = run_simulation(args, verbose=False)
+    df = task_records.to_frame()
+
+    # Energy drawn by the GPUs while they run tasks, under the power model of the policy
+    profiles = energy_profiles(args.power_traces)
+    idle = args.idle_power if args.idle_power is not None else idle_power(args.power_traces)
+    gpu_power_scale = {gpu.id: scale for gpu, scale in zip(gpus, args.gpu_power_scale or [])}
+    power_samples = simulated_power_samples(df, profiles, idle, [gpu.id for gpu in gpus], gpu_power_scale)
+    energy = attribute_energy(df, power_samples, profiles)["Energy_J"].sum()
+    return {
+        "energy_weight": energy_weight,
+        "energy": energy,
+        "avg_jct": calculate_avg_jct(df),
+        "mean_waiting_time": calculate_total_waiting_time(df)[0],
+        "makespan": df["End_Time"].max() - df["Arrival_Time"].min(),
+    }
+
+
+def pareto_frontier(points: pd.DataFrame, x: str = "energy", y: str = "avg_jct") -> pd.Series:
+    """True for the points no other point beats on both x and y (lower is better)."""
+    ordered = points.sort_values([x, y])
+    best_before = ordered[y].cummin().shift(fill_value=np.inf)
+    return (ordered[y] < best_before).reindex(points.index)
+
+
+def sweep_weights(args: argparse.Namespace, weights: list, workers: int = None) -> pd.DataFrame:
+    """Run the energy policy for every weight over a process pool and flag the Pareto-optimal ones."""
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        rows = list(pool.map(run_weight, [args] * len(weights), weights))
+    points = pd.DataFrame(rows)
+    points["pareto"] = pareto_frontier(points)
+    return points
+
+
+def plot_frontier(points: pd.DataFrame, file_path: str):
+    fig = new_figure(False, figsize=(6, 4))
+    ax = fig.add_subplot()
+    ax.scatter(points["energy"] / 3.6e6, points["avg_jct"] / 3600, color="gray", label="Energy weights")
+    frontier = points[points["pareto"]].sort_values("energy")
+    ax.plot(frontier["energy"] / 3.6e6, frontier["avg_jct"] / 3600, marker="o", color="#A0153E", label="Pareto frontier")
+    for _, point in points.iterrows():
+        ax.annotate(f"{point['energy_weight']:g}", (point["energy"] / 3.6e6, point["avg_jct"] / 3600), fontsize=8)
+    ax.set_xlabel("Energy [kWh]")
+    ax.set_ylabel("Average JCT [h]")
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(file_path)
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.description = "Sweep the weight of the energy policy and report the energy/JCT Pareto frontier"
+    parser.add_argument('--weights', nargs='+', type=float, default=[round(w, 1) for w in np.linspace(0, 1, 11)], help="Energy weights to simulate (0: energy only, 1: delay only)")
+    parser.add_argument('--output', type=str, default="results/pareto.csv", help="CSV file of the energy and JCT of every weight")
+    parser.add_argument('--plot', type=str, default=None, help="File to save the frontier plot to")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    points = sweep_weights(args, args.weights, args.workers)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    points.to_csv(args.output, index=False)
+    if args.plot:
+        plot_frontier(points, args.plot)
+    print(points.to_string(index=False))
+    print(Fore.GREEN + f"Pareto-optimal weights: {points.loc[points['pareto'], 'energy_weight'].tolist()}")
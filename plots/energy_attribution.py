@@ -0,0 +1,158 @@
+import argparse
+import os
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from plots.power_traces import POLICY_TRACE_DIR, idle_power
+from plots.results_store import read_records
+from plots.utils import energy_profiles
+
+# Columns added to the task records, next to the TASK_RECORD_FIELDS
+ENERGY_COLUMNS = ["Energy_J", "Idle_Energy_J", "Total_Energy_J"]
+
+# Columns of a power timeline, one sample of the power drawn by a GPU (W) per row
+POWER_SAMPLE_COLUMNS = ["GPU_ID", "timestamp", "power"]
+
+
+def model_power(task_records: pd.DataFrame, profiles: Dict[str, dict]) -> np.ndarray:
+    """Mean power (W) of the model of each record, 0 for the models missing from profiles."""
+    mean_power = {model_name: profile["mean_W"] for model_name, profile in profiles.items()}
+    return task_records["Model_Name"].astype(str).map(mean_power).fillna(0.0).to_numpy(dtype=float)
+
+
+def simulated_power_samples(task_records: pd.DataFrame, profiles: Optional[Dict[str, dict]] = None,
+                            idle: float = 0.0, gpu_ids: Optional[Iterable[int]] = None,
+                            gpu_power_scale: Optional[Dict[int, float]] = None) -> pd.DataFrame:
+    """
+    Power timeline of the GPUs of gpu_ids (the GPUs in the records by default) implied by the records.
+    A GPU draws idle watts, plus what the mean power of each model it runs adds to them, all scaled
+    by its gpu_power_scale (1 by default). The power is a step function with a sample on both sides
+    of each step, so interpolating the samples is exact.
+    """
+    gpu_power_scale = gpu_power_scale or {}
+    profiles = profiles if profiles is not None else energy_profiles()
+    start, end = task_records["Start_Time"].to_numpy(), task_records["End_Time"].to_numpy()
+    begin, finish = min(task_records["Arrival_Time"].min(), start.min()), end.max()
+    power = np.maximum(model_power(task_records, profiles) - idle, 0.0)
+    gpu = task_records["GPU_ID"].to_numpy()
+
+    timelines = []
+    for gpu_id in (gpu_ids if gpu_ids is not None else np.unique(gpu)):
+        on_gpu = gpu == gpu_id
+        times = np.concatenate([start[on_gpu], end[on_gpu]])
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        level = np.cumsum(np.concatenate([power[on_gpu], -power[on_gpu]])[order])
+        running = np.cumsum(np.repeat([1, -1], on_gpu.sum())[order])
+        # Keep the state after the last change at each time
+        last = np.r_[times[1:] != times[:-1], True] if len(times) else np.zeros(0, dtype=bool)
+        times, after = times[last], idle + np.where(running[last] > 0, level[last], 0.0)
+        # A GPU without records keeps no steps, only its idle draw over the whole run
+        before = np.r_[idle, after][:len(after)]
+        timelines.append(pd.DataFrame({
+            "GPU_ID": gpu_id,
+            "timestamp": np.r_[begin, np.repeat(times, 2), finish],
+            "power": np.r_[idle, np.column_stack([before, after]).ravel(), idle] * gpu_power_scale.get(gpu_id, 1.0),
+        }))
+    return pd.concat(timelines, ignore_index=True) if timelines else pd.DataFrame(columns=POWER_SAMPLE_COLUMNS)
+
+
+def attribute_energy(task_records: pd.DataFrame, power_samples: pd.DataFrame,
+                     profiles: Optional[Dict[str, dict]] = None) -> pd.DataFrame:
+    """
+    Join the records to the power timelines of their GPUs and return them with the ENERGY_COLUMNS (J).
+
+    The timeline of a GPU is integrated once into a cumulative energy on sorted arrays, so the energy
+    between any two times is a difference of two interpolated values. Energy_J is the energy drawn
+    while the record runs; when several records share a GPU it is split by the mean power of their
+    models (from profiles, energy_profiles() by default, equal shares for unknown models). The energy
+    drawn while a GPU runs nothing is idle energy, Idle_Energy_J shares the idle energy of the whole
+    cluster between the records by their GPU-seconds.
+    """
+    profiles = profiles if profiles is not None else energy_profiles()
+    start, end = task_records["Start_Time"].to_numpy(dtype=float), task_records["End_Time"].to_numpy(dtype=float)
+    weight = model_power(task_records, profiles)
+    weight = np.where(weight > 0, weight, 1.0)
+    gpu = task_records["GPU_ID"].to_numpy()
+    energy = np.zeros(len(task_records))
+    idle_energy = 0.0
+
+    power_samples = power_samples.sort_values(["GPU_ID", "timestamp"], kind="stable")
+    sample_gpu = power_samples["GPU_ID"].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, sample_gpu[1:] != sample_gpu[:-1], True])
+    for first, stop in zip(bounds[:-1], bounds[1:]):
+        times = power_samples["timestamp"].to_numpy(dtype=float)[first:stop]
+        power = power_samples["power"].to_numpy(dtype=float)[first:stop]
+        cumulative = np.r_[0.0, np.cumsum((power[1:] + power[:-1]) / 2 * np.diff(times))]
+
+        rows = np.flatnonzero(gpu == sample_gpu[first])
+        s, e, w = start[rows], end[rows], weight[rows]
+        points = np.unique(np.concatenate([times, s, e]))
+        segment_energy = np.diff(np.interp(points, times, cumulative))
+
+        # Records running on each segment between consecutive points, and the sum of their weights
+        s_order, e_order = np.argsort(s), np.argsort(e)
+        s_at = np.searchsorted(s[s_order], points[:-1], side="right")
+        e_at = np.searchsorted(e[e_order], points[:-1], side="right")
+        running = s_at - e_at
+        total_weight = np.r_[0.0, np.cumsum(w[s_order])][s_at] - np.r_[0.0, np.cumsum(w[e_order])][e_at]
+
+        busy = running > 0
+        idle_energy += segment_energy[~busy].sum()
+        per_weight = np.zeros(len(segment_energy))
+        per_weight[busy] = segment_energy[busy] / total_weight[busy]
+        per_weight = np.r_[0.0, np.cumsum(per_weight)]
+        energy[rows] = w * (per_weight[np.searchsorted(points, e)] - per_weight[np.searchsorted(points, s)])
+
+    gpu_seconds = end - start
+    idle_share = gpu_seconds / gpu_seconds.sum() if gpu_seconds.sum() > 0 else np.full(len(gpu_seconds), 1 / max(len(gpu_seconds), 1))
+    return task_records.assign(Energy_J=energy, Idle_Energy_J=idle_energy * idle_share,
+                               Total_Energy_J=energy + idle_energy * idle_share)
+
+
+def attribute_carbon(task_records: pd.DataFrame, carbon_intensity) -> pd.DataFrame:
+    """
+    Add a Carbon_g column (gCO2) to records with attributed energy: the Energy_J of each record drawn
+    evenly over its run, times the carbon intensity (gCO2/kWh, a model.carbon.GridTrace) at that time.
+    """
+    start, end = task_records["Start_Time"].to_numpy(dtype=float), task_records["End_Time"].to_numpy(dtype=float)
+    duration = end - start
+    intensity = np.where(duration > 0, (carbon_intensity.integral(end) - carbon_intensity.integral(start)) / np.where(duration > 0, duration, 1.0),
+                         carbon_intensity.value(start))
+    return task_records.assign(Carbon_g=task_records["Energy_J"].to_numpy() / 3.6e6 * intensity)
+
+
+def energy_by(task_records: pd.DataFrame, by) -> pd.DataFrame:
+    """Sum the ENERGY_COLUMNS (and Carbon_g) of attributed records per group of by, e.g. ["User_ID", "Task_Id"] for jobs."""
+    columns = ENERGY_COLUMNS + (["Carbon_g"] if "Carbon_g" in task_records.columns else [])
+    return task_records.groupby(list(by), observed=True)[columns].sum()
+
+
+def energy_filename(records_file: str) -> str:
+    return os.path.splitext(records_file)[0] + "_energy.csv"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attribute the energy of power timelines to the task records, jobs and users")
+    parser.add_argument('records', type=str, help="Task records file (.csv or .parquet)")
+    parser.add_argument('--samples', type=str, default=None, help="CSV of power samples (GPU_ID, timestamp, power in W), simulated from the records and the model power profiles by default")
+    parser.add_argument('--idle', type=float, default=None, help="Power (W) of a GPU running nothing in the simulated timelines (default: measured on the traces)")
+    parser.add_argument('--traces', type=str, default=POLICY_TRACE_DIR, help="Directory of the energon power traces")
+    parser.add_argument('--gpus', type=int, default=7, help="Number of GPUs of the cluster in the simulated timelines, idle ones included")
+    parser.add_argument('--output', type=str, default=None, help="Records with the energy columns (default: <records>_energy.csv)")
+    args = parser.parse_args()
+
+    task_records = read_records(args.records)
+    profiles = energy_profiles(args.traces)
+    if args.samples:
+        power_samples = pd.read_csv(args.samples)
+    else:
+        idle = args.idle if args.idle is not None else idle_power(args.traces)
+        power_samples = simulated_power_samples(task_records, profiles, 0.0 if np.isnan(idle) else idle,
+                                                range(1, args.gpus + 1))
+    task_records = attribute_energy(task_records, power_samples, profiles)
+
+    output = args.output or energy_filename(args.records)
+    task_records.to_csv(output, index=False)
+    print(energy_by(task_records, ["User_ID"]).to_string())
+    print(f"Saved the records with their energy to {output}.")
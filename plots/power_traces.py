@@ -0,0 +1,189 @@
+import argparse
+import functools
+import glob
+import os
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+# Energon traces of the DARE (profiled) runs, and of the full training runs when they are available
+POLICY_TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "energy_reports", "policy")
+FULL_TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "energy_reports", "no-policy")
+
+# Model traced by each file, by the prefix of its name (bart-policy.csv, base_no_policy.csv, ...)
+TRACE_MODELS = {
+    "bart": "lucadiliello/bart-small",
+    "base": "google/flan-t5-base",
+    "small": "google/flan-t5-small",
+}
+
+# Power columns of a trace, by component
+POWER_COLUMNS = {
+    "total": "energon_total_in_power_mW",
+    "cpu": "energon_cpu_in_power_mW",
+    "gpu": "energon_gpu_in_power_mW",
+}
+
+# Samples taken while the GPU usage is below this are outside of the training (loading, evaluation, idle)
+BUSY_GPU_USAGE = 70
+
+# Samples taken while the GPU usage is at most this are idle
+IDLE_GPU_USAGE = 5
+
+# The flan-t5-base runs use 4 times the power of one trace (get_real_plots.ipynb adds 3 times its mean)
+TRACE_POWER_SCALE = {"google/flan-t5-base": 4.0}
+
+# The traces are in mW, MODEL_ENERGY_PROFILES in W as get_real_plots.ipynb computes them
+PROFILE_POWER_UNIT = 1000.0
+
+
+def trace_model(path: str) -> Optional[str]:
+    """Model traced by a file, or None if its name does not start with a known prefix."""
+    prefix = os.path.basename(path).replace("_", "-").split("-")[0]
+    return TRACE_MODELS.get(prefix)
+
+
+def read_trace(path: str, chunksize: int = 100_000, busy_only: bool = True) -> pd.DataFrame:
+    """
+    Read an energon trace in chunks of chunksize rows, keeping one sample per timestamp. Energon
+    writes -1 for missing values, those samples are dropped. With busy_only, only the samples
+    taken while the GPU trains (usage above BUSY_GPU_USAGE) are kept.
+    """
+    columns = list(POWER_COLUMNS.values()) + ["energon_gpu_total_usage_percentage", "timestamp"]
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        chunk = chunk.drop_duplicates(subset="timestamp")
+        valid = (chunk[list(POWER_COLUMNS.values())] >= 0).all(axis=1)
+        if busy_only:
+            valid &= chunk["energon_gpu_total_usage_percentage"] > BUSY_GPU_USAGE
+        chunks.append(chunk[valid])
+    trace = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    # Duplicates can straddle two chunks
+    return trace.drop_duplicates(subset="timestamp").sort_values("timestamp", ignore_index=True)
+
+
+def sample_gaps(timestamps: np.ndarray, max_gap: float) -> np.ndarray:
+    """True for each interval between consecutive samples longer than max_gap, i.e. where the trace has a hole."""
+    return np.diff(timestamps) > max_gap
+
+
+def resample_trace(trace: pd.DataFrame, period: float = 1.0, max_gap: float = 5.0) -> pd.DataFrame:
+    """
+    Interpolate the power columns of a trace on a regular grid of the given period (seconds). Grid
+    points falling in a hole of the trace (samples more than max_gap seconds apart) are dropped.
+    """
+    timestamps = trace["timestamp"].to_numpy(dtype=float)
+    if len(timestamps) < 2:
+        return trace[["timestamp"] + list(POWER_COLUMNS.values())].reset_index(drop=True)
+    grid = np.arange(timestamps[0], timestamps[-1], period)
+    interval = np.clip(np.searchsorted(timestamps, grid, side="right") - 1, 0, len(timestamps) - 2)
+    grid = grid[~sample_gaps(timestamps, max_gap)[interval]]
+
+    resampled = {"timestamp": grid}
+    for column in POWER_COLUMNS.values():
+        resampled[column] = np.interp(grid, timestamps, trace[column].to_numpy(dtype=float))
+    return pd.DataFrame(resampled)
+
+
+def integrate_power(trace: pd.DataFrame, max_gap: float = 5.0) -> dict:
+    """
+    Integrate each power column of a trace over time with the trapezoidal rule, skipping the holes
+    longer than max_gap seconds. Returns the covered duration (s), and the energy (column unit times
+    hours, e.g. mWh) and mean power of each component of POWER_COLUMNS.
+    """
+    timestamps = trace["timestamp"].to_numpy(dtype=float)
+    dt = np.diff(timestamps)
+    dt[sample_gaps(timestamps, max_gap)] = 0.0
+    duration = float(dt.sum())
+
+    summary = {"duration": duration}
+    for component, column in POWER_COLUMNS.items():
+        power = trace[column].to_numpy(dtype=float)
+        energy = float(np.dot((power[1:] + power[:-1]) / 2, dt)) / 3600
+        summary[f"energy_{component}"] = energy
+        summary[f"mean_{component}"] = energy * 3600 / duration if duration > 0 else np.nan
+    return summary
+
+
+def summarize_traces(trace_dir: str = POLICY_TRACE_DIR, period: Optional[float] = 1.0, max_gap: float = 5.0,
+                     chunksize: int = 100_000) -> pd.DataFrame:
+    """
+    Integrate every model trace of trace_dir (see TRACE_MODELS), resampled to period seconds (None keeps
+    the raw samples). Returns one row per model with the covered duration and the energy and mean
+    power of each component, in the units of the trace.
+    """
+    rows = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "*.csv"))):
+        model_name = trace_model(path)
+        if model_name is None:
+            continue
+        trace = read_trace(path, chunksize)
+        if period:
+            trace = resample_trace(trace, period, max_gap)
+        rows.append({"Model_Name": model_name, "trace": os.path.basename(path), **integrate_power(trace, max_gap)})
+    return pd.DataFrame(rows).set_index("Model_Name") if rows else pd.DataFrame()
+
+
+def idle_power(trace_dir: str = POLICY_TRACE_DIR, chunksize: int = 100_000) -> float:
+    """
+    Mean total power of the idle samples (GPU usage at most IDLE_GPU_USAGE) of the model traces of
+    trace_dir, in the unit of MODEL_ENERGY_PROFILES. NaN if the traces have no idle sample.
+    """
+    power = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "*.csv"))):
+        if trace_model(path) is None:
+            continue
+        trace = read_trace(path, chunksize, busy_only=False)
+        power.append(trace.loc[trace["energon_gpu_total_usage_percentage"] <= IDLE_GPU_USAGE, POWER_COLUMNS["total"]])
+    power = pd.concat(power) if power else pd.Series(dtype=float)
+    return float(power.mean()) / PROFILE_POWER_UNIT if len(power) else np.nan
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_summary(trace_dir: str, period: Optional[float], max_gap: float, mtimes: tuple) -> pd.DataFrame:
+    return summarize_traces(trace_dir, period, max_gap)
+
+
+def trace_summary(trace_dir: str, period: Optional[float] = 1.0, max_gap: float = 5.0) -> pd.DataFrame:
+    """summarize_traces, computed once per process as long as the trace files do not change."""
+    if not os.path.isdir(trace_dir):
+        return pd.DataFrame()
+    mtimes = tuple((path, os.path.getmtime(path)) for path in sorted(glob.glob(os.path.join(trace_dir, "*.csv"))))
+    return _cached_summary(os.path.abspath(trace_dir), period, max_gap, mtimes)
+
+
+def model_power_profiles(fallback: Dict[str, dict], trace_dir: str = POLICY_TRACE_DIR,
+                         full_trace_dir: str = FULL_TRACE_DIR, period: Optional[float] = 1.0,
+                         max_gap: float = 5.0) -> Dict[str, dict]:
+    """
+    Power profiles of the models in the format of MODEL_ENERGY_PROFILES, measured on the traces.
+
+    mean_W is the mean total power (W) of the model's training trace (the full training trace if
+    there is one, the DARE one otherwise), and cpu_W and gpu_W split it by component. The profiling correction is the energy of the full training
+    over the energy of the DARE run when both traces exist. Anything the traces do not cover is
+    taken from fallback.
+    """
+    policy = trace_summary(trace_dir, period, max_gap)
+    full = trace_summary(full_trace_dir, period, max_gap)
+
+    profiles = {model_name: dict(profile) for model_name, profile in fallback.items()}
+    for model_name in set(policy.index) | set(full.index):
+        summary = full.loc[model_name] if model_name in full.index else policy.loc[model_name]
+        scale = TRACE_POWER_SCALE.get(model_name, 1.0) / PROFILE_POWER_UNIT
+        profile = profiles.setdefault(model_name, {"profiling_correction": 1.0})
+        profile["mean_W"] = float(summary["mean_total"]) * scale
+        profile["cpu_W"] = float(summary["mean_cpu"]) * scale
+        profile["gpu_W"] = float(summary["mean_gpu"]) * scale
+        if model_name in full.index and model_name in policy.index:
+            profile["profiling_correction"] = float(full.loc[model_name, "energy_total"] / policy.loc[model_name, "energy_total"])
+    return profiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Integrate the energon power traces of the models")
+    parser.add_argument('--traces', type=str, default=POLICY_TRACE_DIR, help="Directory of the energon CSV traces (bart-*.csv, base-*.csv, small-*.csv)")
+    parser.add_argument('--period', type=float, default=1.0, help="Resampling period in seconds (0: integrate the raw samples)")
+    parser.add_argument('--max-gap', type=float, default=5.0, help="Samples further apart than this many seconds are a hole in the trace")
+    args = parser.parse_args()
+
+    print(summarize_traces(args.traces, args.period or None, args.max_gap).to_string())
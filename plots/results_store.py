@@ -0,0 +1,240 @@
+import argparse
+import glob
+import os
+import re
+from typing import List, Optional
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, without it the store reads the CSV files with typed columns
+    pq = None
+
+# Column types of the task records, the strings repeated on every row are categorical
+RECORD_DTYPES = {
+    "GPU_ID": "int32",
+    "Arrival_Time": "float64",
+    "Start_Time": "float64",
+    "End_Time": "float64",
+    "Training_Time": "float64",
+    "User_ID": "int32",
+    "Model_Name": "category",
+    "Task_Id": "category",
+    "Task_Retrain": "int32",
+    "Memory_Required": "int32",
+}
+
+# Run parameters encoded in the name of a task records file. Older files have no session and no engine suffix,
+# the flags are the other options that were not at their default (e.g. "_backfill_easy_share_gpus")
+RESULTS_FILENAME = re.compile(
+    r"task_records_users_(?P<users>\d+)_tasks_(?P<tasks>\d+)_seed_(?P<seed>\d+)_scheduling_(?P<scheduling>\w+?)"
+    r"_range_(?P<min_time>[\d.]+)_(?P<max_time>[\d.]+)_dare_(?P<dare>True|False)"
+    r"(?:_session_(?P<session>True|False))?(?P<flags>_[\w.\-]+?)??(?:_(?P<engine>v2|des))?\.(?:csv|parquet)$"
+)
+
+# Files covered by the dataset index, relative to its root
+RESULTS_PATTERNS = ["*_users_*/task_records_*", "task_records_*"]
+
+INDEX_COLUMNS = ["path", "users", "tasks", "seed", "scheduling", "min_time", "max_time", "dare", "session", "flags",
+                 "engine", "rows", "mtime"]
+
+FILTER_OPERATORS = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "in": lambda column, value: column.isin(value),
+}
+
+
+def parse_results_filename(path: str) -> Optional[dict]:
+    """Return the run parameters of a task records file, or None if its name does not follow the pattern."""
+    match = RESULTS_FILENAME.search(os.path.basename(path))
+    if match is None:
+        return None
+    parameters = match.groupdict()
+    return {
+        "users": int(parameters["users"]),
+        "tasks": int(parameters["tasks"]),
+        "seed": int(parameters["seed"]),
+        "scheduling": parameters["scheduling"],
+        "min_time": float(parameters["min_time"]),
+        "max_time": float(parameters["max_time"]),
+        "dare": parameters["dare"] == "True",
+        "session": parameters["session"] == "True",
+        "flags": (parameters["flags"] or "").lstrip("_"),
+        "engine": parameters["engine"] or "",
+    }
+
+
+def typed_records(task_records: pd.DataFrame) -> pd.DataFrame:
+    """Cast the known columns of task records to RECORD_DTYPES."""
+    return task_records.astype({c: t for c, t in RECORD_DTYPES.items() if c in task_records.columns})
+
+
+def parquet_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def read_records(path: str, columns: Optional[List[str]] = None, filters: Optional[list] = None) -> pd.DataFrame:
+    """
+    Read a task records file. A .csv with an up-to-date .parquet next to it is read from the
+    .parquet. Filters are (column, operator, value) tuples that must all hold, on Parquet
+    they are pushed down to the reader.
+    """
+    if path.endswith(".csv") and pq is not None and os.path.exists(parquet_path(path)) \
+            and os.path.getmtime(parquet_path(path)) >= os.path.getmtime(path):
+        path = parquet_path(path)
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+    header = pd.read_csv(path, nrows=0).columns
+    task_records = pd.read_csv(path, usecols=columns,
+                               dtype={c: t for c, t in RECORD_DTYPES.items() if c in header})
+    return apply_filters(task_records, filters)
+
+
+def write_records(task_records: pd.DataFrame, path: str) -> str:
+    """Write typed task records to the .parquet version of path and return it. Needs pyarrow."""
+    if pq is None:
+        raise ImportError("Writing Parquet results needs pyarrow, install it with 'pip install pyarrow'.")
+    path = parquet_path(path)
+    typed_records(task_records).to_parquet(path, index=False)
+    return path
+
+
+def apply_filters(df: pd.DataFrame, filters: Optional[list]) -> pd.DataFrame:
+    """Keep the rows of df matching all the (column, operator, value) filters."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, operator, value in filters:
+        mask &= FILTER_OPERATORS[operator](df[column], value)
+    return df[mask]
+
+
+def parse_filters(expression: str) -> list:
+    """Turn "dare=True, users>=20" into [("dare", "==", True), ("users", ">=", 20)]."""
+    filters = []
+    for condition in filter(None, (c.strip() for c in expression.split(","))):
+        match = re.fullmatch(r"(\w+)\s*(==|!=|<=|>=|<|>|=)\s*(.+)", condition)
+        if match is None:
+            raise ValueError(f"Cannot parse filter '{condition}'.")
+        column, operator, value = match.groups()
+        value = value.strip()
+        if value in ("True", "False"):
+            value = value == "True"
+        else:
+            try:
+                value = int(value)
+            except ValueError:
+                try:
+                    value = float(value)
+                except ValueError:
+                    pass
+        filters.append((column, "==" if operator == "=" else operator, value))
+    return filters
+
+
+def index_path(root: str) -> str:
+    return os.path.join(root, "results_index.parquet" if pq is not None else "results_index.csv")
+
+
+def build_index(root: str = "results", convert: bool = True) -> pd.DataFrame:
+    """
+    Index every task records file under root by its run parameters and save the index in root.
+    With pyarrow, CSV files are converted to Parquet first (unless convert is False) and the
+    index points at the Parquet files. Files unchanged since the last index are not reopened.
+    """
+    previous = {}
+    if os.path.exists(index_path(root)):
+        previous = {row["path"]: row for row in load_index(root).to_dict("records")}
+
+    paths = sorted({path for pattern in RESULTS_PATTERNS for path in glob.glob(os.path.join(root, pattern))
+                    if path.endswith((".csv", ".parquet"))})
+    files = []
+    for path in paths:
+        if parse_results_filename(path) is None:
+            continue
+        csv_path = os.path.splitext(path)[0] + ".csv"
+        if path.endswith(".parquet") and csv_path in paths:
+            continue  # Indexed through its CSV, which may be newer
+        if path.endswith(".csv") and pq is not None:
+            parquet = parquet_path(path)
+            stale = not os.path.exists(parquet) or os.path.getmtime(parquet) < os.path.getmtime(path)
+            if convert and stale:
+                write_records(read_records(path), path)
+                stale = False
+            if not stale:
+                path = parquet
+        files.append(path)
+
+    index = []
+    for path in files:
+        relative = os.path.relpath(path, root)
+        mtime = os.path.getmtime(path)
+        if relative in previous and previous[relative]["mtime"] == mtime and "flags" in previous[relative]:
+            index.append(previous[relative])
+            continue
+        if path.endswith(".parquet"):
+            num_rows = pq.ParquetFile(path).metadata.num_rows
+        else:
+            num_rows = sum(1 for _ in open(path)) - 1
+        index.append({"path": relative, **parse_results_filename(path), "rows": num_rows, "mtime": mtime})
+
+    index = pd.DataFrame(index, columns=INDEX_COLUMNS)
+    if pq is not None:
+        index.to_parquet(index_path(root), index=False)
+    else:
+        index.to_csv(index_path(root), index=False)
+    return index
+
+
+def load_index(root: str = "results", filters: Optional[list] = None) -> pd.DataFrame:
+    """Read the rows of the dataset index matching the filters."""
+    if pq is not None:
+        return pd.read_parquet(index_path(root), filters=filters or None)
+    index = pd.read_csv(index_path(root), keep_default_na=False, dtype={"flags": str, "engine": str})
+    return apply_filters(index, filters)
+
+
+def load_results(filters=None, record_filters: Optional[list] = None, columns: Optional[List[str]] = None,
+                 root: str = "results") -> pd.DataFrame:
+    """
+    Load the task records of the runs matching filters (on the run parameters, e.g. "dare=True, users>=20"),
+    with the run parameters as extra columns. Only the files of the matching runs are opened, and
+    record_filters (on the record columns) are pushed down to the Parquet reader.
+    """
+    if isinstance(filters, str):
+        filters = parse_filters(filters)
+    if not os.path.exists(index_path(root)):
+        build_index(root)
+    runs = load_index(root, filters)
+
+    frames = []
+    for run in runs.to_dict("records"):
+        task_records = read_records(os.path.join(root, run["path"]), columns, record_filters)
+        frames.append(task_records.assign(**{p: run[p] for p in INDEX_COLUMNS[1:-2]}))
+    if not frames:
+        return pd.DataFrame(columns=(columns or list(RECORD_DTYPES)) + INDEX_COLUMNS[1:-2])
+    # Categories differ between files, union them so the columns stay categorical
+    for column in ("Model_Name", "Task_Id"):
+        if all(column in frame and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = pd.api.types.union_categoricals([frame[column] for frame in frames]).categories
+            frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert task records to Parquet, index them and query the index")
+    parser.add_argument('--root', type=str, default="results", help="Directory holding the task records")
+    parser.add_argument('--no-convert', action='store_true', help="Index the CSV files without converting them to Parquet")
+    parser.add_argument('--where', type=str, default=None, help="Only list the runs matching these filters, e.g. \"dare=True, users>=20\"")
+    args = parser.parse_args()
+
+    index = build_index(args.root, convert=not args.no_convert)
+    if args.where:
+        index = load_index(args.root, parse_filters(args.where))
+    print(index.drop(columns="mtime").to_string(index=False))
@@ -2,22 +2,88 @@ import matplotlib.pyplot as plt
 import matplotlib.patheffects as path_effects  # Import path effects for text outline
 import pandas as pd
 import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
 from matplotlib.patches import Patch
+from plots.power_traces import POLICY_TRACE_DIR, model_power_profiles
+from plots.results_store import read_records
 
 smallest_time = 0.2 # Smallest desired training time (e.g., set to 1 unit for fastest simulation)
 original_smallest_time = 1154.37700009346  # Smallest original time in each policy
 scaling_factor = smallest_time / original_smallest_time
 
 def load_task_records(file_path):
-    """Load task records from a CSV file."""
+    """Load task records from a CSV file (or its up-to-date Parquet version) with typed, categorical columns."""
     try:
-        task_records = pd.read_csv(file_path)
+        task_records = read_records(file_path)
         return task_records
     except Exception as e:
         print(f"Error loading task records: {e}")
         return None
     
-def generate_gantt_arrival_ending_time(task_records):
+def _subpixel_runs(lanes, starts, ends, min_width):
+    """Order of the segments by lane and start, and the position in that order of the first segment of each merged run."""
+    order = np.lexsort((starts, lanes))
+    lanes, starts, ends = lanes[order], starts[order], ends[order]
+    small = ends - starts < min_width
+    joins_previous = np.zeros(len(starts), dtype=bool)
+    joins_previous[1:] = small[1:] & small[:-1] & (lanes[1:] == lanes[:-1]) & (starts[1:] - ends[:-1] < min_width)
+    return order, np.flatnonzero(~joins_previous)
+
+def merge_subpixel_segments(lanes, starts, ends, min_width):
+    """
+    Down-sample the segments of a Gantt chart: runs of consecutive segments of a lane that are
+    narrower than min_width (e.g. one pixel in data units) and less than min_width apart are merged
+    into one segment. Wider segments are kept as they are. Returns the (lanes, starts, ends) left.
+    """
+    lanes, starts, ends = np.asarray(lanes), np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+    if len(starts) == 0 or min_width <= 0:
+        return lanes, starts, ends
+    order, first = _subpixel_runs(lanes, starts, ends, min_width)
+    return lanes[order][first], starts[order][first], np.maximum.reduceat(ends[order], first)
+
+def merge_subpixel_rows(lanes, rows, starts, ends, min_width, height=0.8):
+    """
+    merge_subpixel_segments for a chart with one row per segment (e.g. per task) grouped in lanes
+    (e.g. per GPU): the runs are merged within a lane and a merged segment spans the rows of its
+    run. Returns the (rows, starts, ends, heights) to draw with gantt_collection.
+    """
+    lanes, rows = np.asarray(lanes), np.asarray(rows, dtype=float)
+    starts, ends = np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+    if len(starts) == 0 or min_width <= 0:
+        return rows, starts, ends, np.full(len(rows), height)
+    order, first = _subpixel_runs(lanes, starts, ends, min_width)
+    bottoms, tops = np.minimum.reduceat(rows[order], first), np.maximum.reduceat(rows[order], first)
+    return (bottoms + tops) / 2, starts[order][first], np.maximum.reduceat(ends[order], first), tops - bottoms + height
+
+def gantt_collection(lanes, starts, ends, height=0.8, **style):
+    """All the bars of lanes (y), starts and ends (x) as a single PolyCollection of rectangles, height may be per bar."""
+    lanes, starts, ends = np.asarray(lanes, dtype=float), np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+    bottoms, tops = lanes - height / 2, lanes + height / 2
+    verts = np.stack([
+        np.column_stack([starts, bottoms]),
+        np.column_stack([starts, tops]),
+        np.column_stack([ends, tops]),
+        np.column_stack([ends, bottoms]),
+    ], axis=1)
+    return PolyCollection(verts, **style)
+
+def data_units_per_pixel(ax):
+    """Width of one pixel of the axes in x data units."""
+    x_min, x_max = ax.get_xbound()
+    return (x_max - x_min) / max(ax.bbox.width, 1)
+
+def new_figure(show, **kwargs):
+    """A pyplot figure to show, or a headless Agg figure (no GUI backend needed) to save."""
+    if show:
+        return plt.figure(**kwargs)
+    return Figure(**kwargs)
+
+def generate_gantt_arrival_ending_time(task_records, show = True, file_path = None, downsample = True):
+    """
+    Gantt chart of the wait and burst time of the tasks of each GPU, one row per task. The segments
+    of each kind are drawn as one collection, with sub-pixel segments merged unless downsample is False.
+    """
 
     # check if task_records["Task_Retrain"] contains -1 values
     is_retrain = -1 not in list(task_records["Task_Retrain"].unique())
@@ -32,7 +98,8 @@ def generate_gantt_arrival_ending_time(task_records):
     min_start_time = task_records["Start_Time"].min()
     min_arrival_time = task_records["Arrival_Time"].min()
 
-    fig, axs = plt.subplots(4, 2, figsize=(15, 10))  # Adjust figsize if needed
+    fig = new_figure(show, figsize=(15, 10))  # Adjust figsize if needed
+    axs = fig.subplots(4, 2)
 
     # Iterate over GPUs to create individual plots
     for g in gpus:
@@ -45,24 +112,30 @@ def generate_gantt_arrival_ending_time(task_records):
         tot_training_time = gpu_tasks['Training_Time'].sum()
         print(f"GPU {g} Tasks: {len(gpu_tasks)}, Total Training Time: {tot_training_time}, Unique Users: {gpu_tasks['User_ID'].nunique()}")
 
-        for i, row in gpu_tasks.iterrows():
-            arrival = row['Arrival_Time'] - min_arrival_time
-            start = row['Start_Time'] - min_start_time
-            training = row['Training_Time']
-            user_id = row['User_ID']
-
-            wait_time = start - arrival  # Calculate wait time
-
-            # Plot wait time segment
-            if wait_time > 0:  # Ensure wait time is positive
-                axs[r, c].barh(y=i, width=wait_time, left=arrival, color=wait_color, edgecolor='black', align="center")
-
-            # Plot burst time segment (training time)
-            axs[r, c].barh(y=i, width=training, left=start, color=burst_color, edgecolor='black', align="center")
-
-            # Center the user ID label on the burst time bar
-            mid_point = start + training / 2
-            if not is_retrain:
+        rows = gpu_tasks.index.to_numpy()
+        arrival = gpu_tasks['Arrival_Time'].to_numpy() - min_arrival_time
+        start = gpu_tasks['Start_Time'].to_numpy() - min_start_time
+        training = gpu_tasks['Training_Time'].to_numpy()
+
+        wait_time = start - arrival  # Calculate wait time
+
+        # Bound the axes to the tasks first, so that a pixel has a width in data units
+        axs[r, c].set_xbound(min(arrival.min(), start.min()), (start + training).max())
+        min_width = data_units_per_pixel(axs[r, c]) if downsample else 0
+
+        # Wait time segments (only the positive ones) and burst time segments (training time), one collection each
+        waiting = wait_time > 0
+        # The rows are unique per task, so the segments are merged in one lane per GPU and span the rows they cover
+        lanes = np.full(len(rows), g)
+        wait_rows, wait_starts, wait_ends, wait_heights = merge_subpixel_rows(lanes[waiting], rows[waiting], arrival[waiting], start[waiting], min_width)
+        burst_rows, burst_starts, burst_ends, burst_heights = merge_subpixel_rows(lanes, rows, start, start + training, min_width)
+        axs[r, c].add_collection(gantt_collection(wait_rows, wait_starts, wait_ends, height=wait_heights, facecolor=wait_color, edgecolor='black'))
+        axs[r, c].add_collection(gantt_collection(burst_rows, burst_starts, burst_ends, height=burst_heights, facecolor=burst_color, edgecolor='black'))
+        axs[r, c].autoscale_view()
+
+        # Center the user ID label on the burst time bar
+        if not is_retrain:
+            for i, mid_point, user_id in zip(rows, start + training / 2, gpu_tasks['User_ID']):
                 text = axs[r, c].text(mid_point, i, f"User {user_id}", va='center', ha='center', color='black', fontsize=8)
 
                 # Apply white outline around the text
@@ -88,30 +161,31 @@ def generate_gantt_arrival_ending_time(task_records):
     if len(gpus) < 8:
         axs[3, 1].axis('off')  # Turn off the bottom-right subplot
     
-    plt.tight_layout()  # Adjust layout to prevent clipping of elements
+    fig.tight_layout()  # Adjust layout to prevent clipping of elements
 
     fig.suptitle("Gantt Chart of Task Wait and Burst Time", fontsize=16, x=0.5, y=1.05)
-    plt.show()  # Display all subplots at once
+    if file_path:
+        fig.savefig(file_path, bbox_inches="tight")
+    if show:
+        plt.show()  # Display all subplots at once
 
 # Assuming you have a DataFrame `task_records` already defined
 # generate_gantt_arrival_ending_time(task_records)
 
 def get_gpus(task_records):
     """Get unique GPU IDs from task records."""
-    gpu_ids = []  # Initialize an empty list to store unique GPU IDs
-
-    # Iterate through each record in the task_records DataFrame
-    for _, record in task_records.iterrows():
-        gpu_id = record['GPU_ID']
-
-        if gpu_id not in gpu_ids:
-            gpu_ids.append(gpu_id)
+    # In order of first appearance
+    return pd.unique(task_records['GPU_ID']).tolist()
 
-    return gpu_ids
-
-def generate_gantt_gantt_executions(task_records, file_path):
+def generate_gantt_gantt_executions(task_records, file_path, show = True, downsample = True):
+    """
+    Gantt chart of the trainings on each GPU, saved to file_path + ".pdf". The bars of a model are
+    drawn as one collection, with sub-pixel bars merged unless downsample is False. With show=False
+    the chart is drawn on a headless Agg figure and only saved.
+    """
     gpus = get_gpus(task_records)
-    fig, ax = plt.subplots(figsize=(20, 6))
+    fig = new_figure(show, figsize=(20, 6))
+    ax = fig.subplots()
 
     model_names = [
         "google/flan-t5-base",
@@ -131,39 +205,39 @@ def generate_gantt_gantt_executions(task_records, file_path):
         "o"
     ]
 
-    def get_color(model_name):
-        if model_name in model_names:
-            if model_name == model_names[0]:
-                return (colors[0], hatchs[0])
-            elif model_name == model_names[1]:
-                return (colors[1], hatchs[1])
-            elif model_name == model_names[2]:
-                return (colors[2], hatchs[2])
-            
     min_start_time = task_records['Start_Time'].min()
 
     # draw a vertical line at x = 111 with lower z-order to make it appear behind the bars
     ax.axvline(x=111, color='gray', linestyle='--', zorder=0)
 
-    # Plot each task on the Gantt chart
-    for _, row in task_records.iterrows():
-        gpu_id = row['GPU_ID']
-        start = parse_seconds_to_hours(row['Start_Time'] - min_start_time) / scaling_factor
-        duration = parse_seconds_to_hours(row['Training_Time']) / scaling_factor
-        name = row['Model_Name']
-        color, hatch = get_color(name)
+    gpu_ids = task_records['GPU_ID'].to_numpy()
+    starts = parse_seconds_to_hours(task_records['Start_Time'].to_numpy() - min_start_time) / scaling_factor
+    durations = parse_seconds_to_hours(task_records['Training_Time'].to_numpy()) / scaling_factor
 
-        ax.barh(gpu_id, duration, left=start, color=color, edgecolor='black', hatch=hatch, zorder=3)
+    # Bound the axes to the schedule first (at least the 140 h of the usual chart), so that a pixel has a width in data units
+    x_max = max(140, (starts + durations).max())
+    ax.set_xbound(0, x_max)
+    min_width = data_units_per_pixel(ax) if downsample else 0
+
+    # Plot the tasks of each model on the Gantt chart in one go
+    names = task_records['Model_Name'].astype(str).to_numpy()
+    for name, color, hatch in zip(model_names, colors, hatchs):
+        is_model = names == name
+        lanes, bar_starts, bar_ends = merge_subpixel_segments(gpu_ids[is_model], starts[is_model], starts[is_model] + durations[is_model], min_width)
+        ax.add_collection(gantt_collection(lanes, bar_starts, bar_ends, facecolor=color, edgecolor='black', hatch=hatch, zorder=3))
+    ax.set_ybound(min(gpus) - 0.5, max(gpus) + 0.5)
 
     # Configure chart
     ax.set_yticks(gpus)
     ax.set_yticklabels([f"GPU {gpu}" for gpu in gpus])
-    ax.set_xticks([20, 40, 60, 80, 100, 120, 140])
-    ax.set_xticklabels([f"{x}" for x in [20, 40, 60, 80, 100, 120, 140]])
-    ax.set_xbound(0, 140)
+    if x_max == 140:
+        ax.set_xticks([20, 40, 60, 80, 100, 120, 140])
+        ax.set_xticklabels([f"{x}" for x in [20, 40, 60, 80, 100, 120, 140]])
+    ax.set_xbound(0, x_max)
     ax.set_xlabel("Time [h]")
 
 
+    title = file_path
     if file_path == "dare_False_session_False_v2.csv":
         title = "Baseline FIFO"
     elif file_path == "dare_True_session_False_v2.csv":
@@ -189,59 +263,88 @@ def generate_gantt_gantt_executions(task_records, file_path):
     ax.tick_params(axis='x', labelsize=16)
     ax.tick_params(axis='y', labelsize=16)
 
-    plt.tight_layout()
+    fig.tight_layout()
 
-    plt.savefig(file_path + ".pdf")
-    plt.show()
+    fig.savefig(file_path + ".pdf")
+    if show:
+        plt.show()
 
 # Example of how to call the function with dummy data
 # Uncomment the line below when you have your DataFrame ready
 # generate_gantt_gantt_executions(task_records)
 
-def calculate_total_waiting_time(task_records, user_id = None):
-    """Calculate the total waiting time across all tasks in a DataFrame."""
-
+def job_waiting_times(task_records):
+    """
+    Waiting time of every job, as a frame with User_ID, Task_Id and Waiting_Time columns.
+    A retrained job waits as long as its last retrain chunk, any other row is a job of its own.
+    """
     df = task_records
+    retrain = df["Task_Retrain"].to_numpy() if "Task_Retrain" in df.columns else np.full(len(df), -1)
+    is_chunk = retrain != -1
+
+    # Older records have no Task_Id (nor Task_Retrain) column
+    columns = [c for c in ["User_ID", "Task_Id", "Start_Time", "Arrival_Time"] if c in df.columns]
+    jobs = df.loc[~is_chunk, columns]
+    if is_chunk.any():
+        # Sort the chunks by job then retrain index and keep the last chunk of each job
+        chunks = df.loc[is_chunk, ["User_ID", "Task_Id", "Task_Retrain", "Start_Time", "Arrival_Time"]]
+        chunks = chunks.sort_values(["Task_Id", "Task_Retrain"], kind="stable")
+        last_chunks = chunks.drop_duplicates("Task_Id", keep="last").drop(columns="Task_Retrain")
+        jobs = pd.concat([jobs, last_chunks], ignore_index=True)
+
+    return pd.DataFrame({
+        "User_ID": jobs["User_ID"].to_numpy(),
+        "Task_Id": jobs["Task_Id"].to_numpy() if "Task_Id" in jobs.columns else None,
+        "Waiting_Time": jobs["Start_Time"].to_numpy() - jobs["Arrival_Time"].to_numpy(),
+    })
+
+
+def waiting_time_stats(task_records):
+    """
+    Waiting time statistics as a tidy frame with a row per job (level "task"), per user (level "user")
+    and one for all the jobs (level "global"). Columns: level, User_ID, Task_Id, count, mean, std, sum.
+    std is the population standard deviation, as in np.std.
+    """
+    waits = job_waiting_times(task_records)
+
+    tasks = pd.DataFrame({
+        "level": "task",
+        "User_ID": waits["User_ID"],
+        "Task_Id": waits["Task_Id"],
+        "count": 1,
+        "mean": waits["Waiting_Time"],
+        "std": 0.0,
+        "sum": waits["Waiting_Time"],
+    })
+    users = waits.groupby("User_ID", sort=True)["Waiting_Time"].agg(["count", "mean", "sum"])
+    users["std"] = waits.groupby("User_ID", sort=True)["Waiting_Time"].std(ddof=0)
+    users = users.reset_index().assign(level="user", Task_Id=None)
+    overall = pd.DataFrame([{
+        "level": "global",
+        "User_ID": None,
+        "Task_Id": None,
+        "count": len(waits),
+        "mean": waits["Waiting_Time"].mean() if len(waits) else np.nan,
+        "std": waits["Waiting_Time"].std(ddof=0) if len(waits) else np.nan,
+        "sum": waits["Waiting_Time"].sum(),
+    }])
+
+    columns = ["level", "User_ID", "Task_Id", "count", "mean", "std", "sum"]
+    return pd.concat([tasks[columns], users[columns], overall[columns]], ignore_index=True)
 
-    if user_id != None:
-        df = task_records[task_records["User_ID"] == user_id]
-
-    tot_times = []
-    checked_ids = []
-
-    for i, row in df.iterrows():
-        if row["Task_Retrain"] == -1:
-            tot_times += [row["Start_Time"] - row["Arrival_Time"]]
-        else:
-
-            if row["Task_Id"] in checked_ids:
-                continue
-
-            last_retraing = df[df["Task_Id"] == row["Task_Id"]]
-            last_retraing = last_retraing.sort_values(by=['Task_Retrain'])
-
-
-            last_start_time = last_retraing["Start_Time"].tail(1)
-            last_arrival_time = last_retraing["Arrival_Time"].tail(1)
 
-            tot_times += [last_start_time - last_arrival_time]
-            checked_ids += [row["Task_Id"]]
+def calculate_total_waiting_time(task_records, user_id = None):
+    """Calculate the mean, standard deviation and total of the job waiting times, over all users or for one."""
 
+    waits = job_waiting_times(task_records)["Waiting_Time"] if user_id is None else \
+        job_waiting_times(task_records[task_records["User_ID"] == user_id])["Waiting_Time"]
 
-    mean_tot_times = np.array(tot_times).mean()
-    std_tot_times = np.array(tot_times).std()
-    sum_tot_times = np.array(tot_times).sum()
+    mean_tot_times = waits.to_numpy().mean()
+    std_tot_times = waits.to_numpy().std()
+    sum_tot_times = waits.to_numpy().sum()
 
     return (mean_tot_times, std_tot_times, sum_tot_times)
 
-
-    # # Calculate waiting times
-    # task_records['Waiting_Time'] = task_records['Start_Time'] - task_records['Arrival_Time']
-    
-    # # # Sum the waiting times
-    # total_waiting_time = task_records['Waiting_Time'].sum()
-    # return total_waiting_time
-
 def plot_waiting_times(task_records):
     fig, ax = plt.subplots(figsize=(10, 6))
 
@@ -251,14 +354,18 @@ def plot_waiting_times(task_records):
     # Scale x positions to increase space between clusters
     x = np.arange(len(user_ids)) * 2.5
 
+    # Statistics of all the users at once
+    stats = waiting_time_stats(task_records)
+    user_stats = stats[stats["level"] == "user"].set_index("User_ID")
+
     for idx, u_id in enumerate(user_ids):
-        user_metrics = calculate_total_waiting_time(task_records=task_records, user_id=u_id)
+        user_metrics = user_stats.loc[u_id]
 
         # Bar plot for average waiting times
-        ax.bar(x[idx] - bar_width/2, user_metrics[0], color='#00224D', alpha=1, label='Average Waiting Time' if idx == 0 else "")
+        ax.bar(x[idx] - bar_width/2, user_metrics["mean"], color='#00224D', alpha=1, label='Average Waiting Time' if idx == 0 else "")
 
         # Bar plot for total waiting times on top
-        ax.bar(x[idx] + bar_width/2, user_metrics[2], color='#A0153E', alpha=1, label='Total Waiting Time' if idx == 0 else "")
+        ax.bar(x[idx] + bar_width/2, user_metrics["sum"], color='#A0153E', alpha=1, label='Total Waiting Time' if idx == 0 else "")
 
     ax.set_xlabel('User ID')
     ax.set_ylabel('Waiting Time (seconds)')
@@ -270,32 +377,53 @@ def plot_waiting_times(task_records):
     fig.tight_layout()
     plt.show()
 
-def calc_tot_energy_from_df(df, profiling = False):
-    BASE_MEAN_mW = 378.8556695697469
+# Mean power draw of each model while training (W) and the factor its usage is divided by when the
+# retrain chunks are profiled. Models missing from the table count towards GPU usage but not energy.
+# These are the paper's values, energy_profiles() replaces them with the ones measured on the traces.
+MODEL_ENERGY_PROFILES = {
+    "google/flan-t5-base": {"mean_W": 378.8556695697469, "profiling_correction": 92.70503491796818},
+    "google/flan-t5-small": {"mean_W": 93.54626298542978, "profiling_correction": 21.795236303013805},
+    "lucadiliello/bart-small": {"mean_W": 93.95008267753535, "profiling_correction": 53.371237007832384},
+}
 
-    SMALL_MEAN_mW = 93.54626298542978
+def energy_profiles(trace_dir = POLICY_TRACE_DIR):
+    """Model power profiles integrated from the energon traces of trace_dir, MODEL_ENERGY_PROFILES where they have no trace."""
+    return model_power_profiles(MODEL_ENERGY_PROFILES, trace_dir)
 
-    BART_MEAN_mW = 93.95008267753535
+def usage_and_energy(df, profiling = False, by = ("GPU_ID", "Model_Name", "User_ID"), profiles = None):
+    """
+    Training time (GPU usage) and energy of the records, summed per group of `by` in one groupby.
 
-    # check if Task_Retrain column contains -1 values
-    is_retrain = -1 not in list(df["Task_Retrain"].unique())
+    Energy is the mean power of the model from `profiles` (energy_profiles() by default) times its usage, in Wh. With
+    profiling, runs made only of retrain chunks have their usage and energy divided by the
+    profiling correction of the model. Returns a frame indexed by `by` with Training_Time
+    and Energy columns.
+    """
+    by = list(by)
+    usage = df.groupby(by + ([] if "Model_Name" in by else ["Model_Name"]), observed=True)["Training_Time"].sum().reset_index()
+
+    profile = pd.DataFrame.from_dict(profiles if profiles is not None else energy_profiles(), orient="index")
+    model_names = usage["Model_Name"].astype(str)
+    mean_W = model_names.map(profile["mean_W"]).to_numpy(dtype=float)
+    usage["Energy"] = mean_W * usage["Training_Time"].to_numpy() / 3600
 
-    df_base = df[df["Model_Name"] == "google/flan-t5-base"]
-    df_small = df[df["Model_Name"] == "google/flan-t5-small"]
-    df_bart = df[df["Model_Name"] == "lucadiliello/bart-small"]
+    # check if Task_Retrain column contains -1 values
+    is_retrain = "Task_Retrain" in df.columns and not (df["Task_Retrain"] == -1).any()
+    if is_retrain and profiling:
+        correction = model_names.map(profile["profiling_correction"]).fillna(1.0).to_numpy(dtype=float)
+        usage["Training_Time"] = usage["Training_Time"] / correction
+        usage["Energy"] = usage["Energy"] / correction
 
-    tot_base_training_time = df_base["Training_Time"].sum()
-    tot_small_training_time = df_small["Training_Time"].sum()
-    tot_bart_training_time = df_bart["Training_Time"].sum()
+    return usage.groupby(by, observed=True)[["Training_Time", "Energy"]].sum(min_count=1)
 
-    tot_base_energy = (BASE_MEAN_mW * tot_base_training_time) / 3600
-    tot_small_energy = (SMALL_MEAN_mW * tot_small_training_time) / 3600
-    tot_bart_energy = (BART_MEAN_mW * tot_bart_training_time) / 3600
+def calc_tot_energy_from_df(df, profiling = False, profiles = None):
+    """Energy (Wh) of the flan-t5-base, flan-t5-small and bart-small runs of the records."""
+    energy = usage_and_energy(df, profiling, by=["Model_Name"], profiles=profiles)["Energy"]
+    energy.index = energy.index.astype(str)
 
-    if is_retrain and profiling:
-        tot_base_energy = tot_base_energy / 92.70503491796818
-        tot_small_energy = tot_small_energy / 21.795236303013805
-        tot_bart_energy = tot_bart_energy / 53.371237007832384
+    tot_base_energy = energy.get("google/flan-t5-base", 0.0)
+    tot_small_energy = energy.get("google/flan-t5-small", 0.0)
+    tot_bart_energy = energy.get("lucadiliello/bart-small", 0.0)
 
     return (tot_base_energy, tot_small_energy, tot_bart_energy)
 
@@ -303,27 +431,40 @@ def parse_seconds_to_hours(seconds):
     hours = seconds / 3600
     return hours
 
-def gpus_usage(df, profiling = False):
+def gpus_usage(df, profiling = False, gpu_ids = range(1, 8)):
+    """Training time run on each GPU of gpu_ids (the 7 GPUs of the paper by default, None for the GPUs in the records)."""
+    usage = usage_and_energy(df, profiling, by=["GPU_ID"])["Training_Time"]
+    if gpu_ids is None:
+        gpu_ids = sorted(usage.index)
+    return [usage.get(gpu_id, 0) for gpu_id in gpu_ids]
+
+def calculate_gpu_utilization(task_records, gpu_memory):
+    """
+    Calculate the GPU utilization of a run, per GPU-second and per GB-second.
+
+    Parameters:
+    task_records (pd.DataFrame): A DataFrame with 'GPU_ID', 'Start_Time', 'End_Time' and 'Memory_Required' columns.
+    gpu_memory (dict): Memory size in GB of every GPU of the cluster, by GPU id.
 
-    is_retrain = -1 not in list(df["Task_Retrain"].unique())
+    Returns:
+    tuple: The share of GPU-seconds during which a GPU ran at least one task, and the
+    share of GB-seconds of GPU memory allocated to tasks, over the span of the run.
+    """
+    start = task_records["Start_Time"].min()
+    makespan = task_records["End_Time"].max() - start
 
-    gpus_usage = {}
-    for gpu_id in range(1, 8):
-        gpus_usage[gpu_id] = 0
-        gpu_df = df[df["GPU_ID"] == gpu_id]
-        gpu_usage_base = gpu_df[df["Model_Name"] == "google/flan-t5-base"]["Training_Time"].sum()
-        gpu_usage_small = gpu_df[df["Model_Name"] == "google/flan-t5-small"]["Training_Time"].sum()
-        gpu_usage_bart = gpu_df[df["Model_Name"] == "lucadiliello/bart-small"]["Training_Time"].sum()
+    # Tasks sharing a GPU overlap, so a GPU is busy over the union of their intervals
+    intervals = task_records.sort_values(["GPU_ID", "Start_Time"])
+    busy_until = intervals.groupby("GPU_ID")["End_Time"].cummax()
+    previous_busy_until = busy_until.groupby(intervals["GPU_ID"]).shift().fillna(start)
+    busy_seconds = (intervals["End_Time"] - np.maximum(intervals["Start_Time"], previous_busy_until)).clip(lower=0).sum()
 
-        if is_retrain and profiling:
-            gpu_usage_base = gpu_usage_base / 92.70503491796818
-            gpu_usage_small = gpu_usage_small / 21.795236303013805
-            gpu_usage_bart = gpu_usage_bart / 53.371237007832384
+    used_gb_seconds = (task_records["Memory_Required"] * (task_records["End_Time"] - task_records["Start_Time"])).sum()
 
-        gpus_usage[gpu_id] = gpu_usage_base + gpu_usage_small + gpu_usage_bart
+    gpu_seconds_utilization = busy_seconds / (len(gpu_memory) * makespan)
+    gb_seconds_utilization = used_gb_seconds / (sum(gpu_memory.values()) * makespan)
 
-    
-    return list(gpus_usage.values())
+    return (gpu_seconds_utilization, gb_seconds_utilization)
 
 def calculate_avg_jct(task_records):
     """
@@ -0,0 +1,48 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from colorama import Fore, Style, init
+from plots.utils import calculate_avg_jct, calculate_total_waiting_time
+from simulation_fixed_rand_v2 import build_parser, run_simulation
+
+# Initialize colorama
+init(autoreset=True)
+
+
+def run_cap(args: argparse.Namespace, power_cap: float) -> dict:
+    """Simulate the workload of args under the given power cap (W) and return its JCT and the throughput lost to the cap."""
+    args = argparse.Namespace(**{**vars(args), "power_cap": power_cap, "engine": "events"})
+    task_records, _, scheduler = run_simulation(args, verbose=False)
+    df = task_records.to_frame()
+    return {
+        "power_cap": power_cap,
+        "tasks": len(df),
+        "avg_jct": calculate_avg_jct(df),
+        "mean_waiting_time": calculate_total_waiting_time(df)[0],
+        "makespan": df["End_Time"].max() - df["Arrival_Time"].min(),
+        **scheduler.power_stats(),
+    }
+
+
+def sweep_caps(args: argparse.Namespace, power_caps: list, workers: int = None) -> pd.DataFrame:
+    """Run the simulation for every power cap over a process pool."""
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return pd.DataFrame(list(pool.map(run_cap, [args] * len(power_caps), power_caps)))
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.description = "Simulate a workload under several cluster power caps to size the power budget"
+    parser.add_argument('--caps', nargs='+', type=float, required=True, help="Power caps to simulate, in W")
+    parser.add_argument('--output', type=str, default="results/power_caps.csv", help="CSV file of the results of every cap")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    results = sweep_caps(args, args.caps, args.workers)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(results.to_string(index=False))
+    unplaced = results[results["tasks"] < results["tasks"].max()]
+    if len(unplaced):
+        print(Fore.RED + f"Some tasks never fit under the caps {unplaced['power_cap'].tolist()} W.")
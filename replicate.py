@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style, init
+from sweep import GRID_PARAMETERS, cell_key, expand_grid, run_cells
+
+# Initialize colorama
+init(autoreset=True)
+
+# Index columns aggregated over the seeds of a configuration
+METRICS = ["avg_jct", "mean_waiting_time", "energy"]
+
+# Parameters of a configuration, i.e. of a cell without its seed
+CONFIG_PARAMETERS = [p for p in GRID_PARAMETERS if p != "seed"]
+
+
+def bootstrap_ci(values, confidence: float = 0.95, resamples: int = 2000, seed: int = 0) -> tuple:
+    """Percentile bootstrap confidence interval of the mean of values."""
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    means = values[rng.integers(0, len(values), size=(resamples, len(values)))].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    return float(np.quantile(means, alpha)), float(np.quantile(means, 1 - alpha))
+
+
+def summarize(rows: pd.DataFrame, confidence: float = 0.95, resamples: int = 2000) -> dict:
+    """Mean, standard deviation and bootstrap CI of every metric over the seeds in rows."""
+    summary = {"seeds": len(rows)}
+    for metric in METRICS:
+        values = rows[metric].to_numpy(dtype=float)
+        ci_low, ci_high = bootstrap_ci(values, confidence, resamples)
+        summary[f"{metric}_mean"] = values.mean()
+        summary[f"{metric}_std"] = values.std(ddof=1)
+        summary[f"{metric}_ci_low"] = ci_low
+        summary[f"{metric}_ci_high"] = ci_high
+    return summary
+
+
+def is_precise(summary: dict, target_width: float) -> bool:
+    """True when the CI of every metric is narrower than target_width times its mean."""
+    return all(summary[f"{m}_ci_high"] - summary[f"{m}_ci_low"] <= target_width * abs(summary[f"{m}_mean"])
+               for m in METRICS)
+
+
+def replicate(grid: dict, output_dir: str, min_time: float, max_time: float, first_seed: int = 10,
+              min_seeds: int = 5, max_seeds: int = 50, seed_step: int = None, target_width: float = 0.05,
+              confidence: float = 0.95, workers: int = None) -> pd.DataFrame:
+    """
+    Run every configuration of the grid on seeds first_seed, first_seed + 1, ... and aggregate the metrics
+    over the seeds. A configuration starts with min_seeds seeds and gets seed_step more each round until
+    its CIs are narrower than target_width (relative to the mean) or it reaches max_seeds, so the
+    simulations go to the noisy configurations. The runs of each round share one process pool.
+    """
+    min_seeds = max(min_seeds, 2)
+    seed_step = seed_step or min_seeds
+    configs = {}
+    for cell in expand_grid({**grid, "seed": [first_seed]}):
+        config = {p: cell[p] for p in CONFIG_PARAMETERS}
+        configs["_".join(f"{p}_{config[p]}" for p in CONFIG_PARAMETERS)] = config
+
+    seeds = {key: min_seeds for key in configs}
+    summaries = {}
+    pending = list(configs)
+    while pending:
+        cells = {key: [{**configs[key], "seed": first_seed + i} for i in range(seeds[key])] for key in pending}
+        index = run_cells([cell for key in pending for cell in cells[key]], output_dir, min_time, max_time, workers)
+        index = index.set_index("key")
+
+        still_pending = []
+        for key in pending:
+            keys = [k for k in (cell_key(cell, min_time, max_time) for cell in cells[key]) if k in index.index]
+            if len(keys) < 2:
+                print(Fore.RED + f"Configuration {key} has fewer than 2 successful runs, skipping it.")
+                continue
+            summary = summarize(index.loc[keys], confidence)
+            summary["precise"] = is_precise(summary, target_width)
+            summaries[key] = {**configs[key], **summary}
+            if summary["precise"] or seeds[key] >= max_seeds:
+                color = Fore.GREEN if summary["precise"] else Fore.YELLOW
+                print(color + f"Configuration {key} done after {summary['seeds']} seeds.")
+            else:
+                seeds[key] = min(seeds[key] + seed_step, max_seeds)
+                still_pending.append(key)
+        pending = still_pending
+
+    replicates = pd.DataFrame(list(summaries.values()))
+    replicates.to_csv(os.path.join(output_dir, "replicates.csv"), index=False)
+    return replicates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replicate GPU scheduler simulations over seeds until the metrics' confidence intervals are narrow enough")
+    parser.add_argument('--grid', type=str, help="JSON file mapping parameters (users, tasks, scheduling_type, policy_dare, session, backfill, share_gpus) to lists of values")
+    parser.add_argument('--output', type=str, default="results/replicates", help="Directory of the task records, of the run index and of replicates.csv")
+    parser.add_argument('--min-time', type=float, default=0.01, help="Minimum task request time interval")
+    parser.add_argument('--max-time', type=float, default=0.1, help="Maximum task request time interval")
+    parser.add_argument('--first-seed', type=int, default=10, help="First workload seed, the next ones follow it")
+    parser.add_argument('--min-seeds', type=int, default=5, help="Seeds run for every configuration (at least 2)")
+    parser.add_argument('--max-seeds', type=int, default=50, help="Seeds after which a configuration stops even if its CIs are still wide")
+    parser.add_argument('--seed-step', type=int, default=None, help="Seeds added to a configuration each round (default: --min-seeds)")
+    parser.add_argument('--target-width', type=float, default=0.05, help="Stop once every CI is narrower than this fraction of its mean")
+    parser.add_argument('--confidence', type=float, default=0.95, help="Confidence level of the bootstrap intervals")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+
+    replicates = replicate(grid, args.output, args.min_time, args.max_time, args.first_seed, args.min_seeds,
+                           args.max_seeds, args.seed_step, args.target_width, args.confidence, args.workers)
+    columns = CONFIG_PARAMETERS + ["seeds"] + [f"{m}_{s}" for m in METRICS for s in ("mean", "ci_low", "ci_high")]
+    print(replicates[columns].to_string(index=False))
@@ -26,7 +26,6 @@ def main(args):
 
     # Create GPUs
     gpus = [GPU(gpu_id=i + 1, memory_size=memory) for i, memory in enumerate(args.gpus)]
-    scheduler = Scheduler(gpus=gpus)
     task_queue = Queue()
 
     # Scaling factor to adjust training times down to smallest unit possible
@@ -50,6 +49,9 @@ def main(args):
 
     SESSION_DURATION = 14 * 60 * 60 * scaling_factor
 
+    # A session keeps its GPU for the whole session
+    scheduler = Scheduler(gpus=gpus, session_duration=SESSION_DURATION if args.session else 0)
+
     # Create users and their tasks
     user_threads = []
     task_records = []  # List to store task allocations for Gantt charts
@@ -117,7 +119,7 @@ def main(args):
                 })
 
                 # Start a thread for the task
-                thread = TaskThread(current_task, scheduler, SESSION_DURATION if args.session else 0)
+                thread = TaskThread(current_task, scheduler)
                 thread.start()
                 threads.append(thread)
             else:
@@ -1,71 +1,118 @@
 import argparse
+import os
 import random
 import time
 from colorama import init
 from model.gpu import GPU
 from model.policy import Policy
 from model.scheduler import Scheduler
-from model.task_thread import TaskThread
+from model.dispatcher import Dispatcher
+from model.event_simulator import EventSimulator
+from estimators.training_time_estimator import DEFAULT_DATASET_SIZE, PEAK_TFLOPS, model_catalog
+from estimators.model_config import MODEL_ROOT
+from model.carbon import SAMPLE_GRID_TRACE, CarbonDeferral, GridTrace
+from model.loss_curve import STOPPING_RULES, load_loss_curves, retrain_chunks, stopping_report
+from model.records import TaskRecordWriter
 from model.user import User
 from model.queue import Queue
 from model.task import Task
 from model.user_thread import UserThread
+from model.workload import WORKLOAD_COLUMNS, generate_random_numbers, load_workload, workload_from_random_numbers, workload_model_names
 import csv
 import json  # Import json to handle saving dictionaries
 
 from plots.utils import *
+from plots.energy_attribution import attribute_carbon, attribute_energy, energy_by, simulated_power_samples
+from plots.power_traces import idle_power
+from plots.results_store import pq, write_records
 
 # Initialize colorama
 init(autoreset=True)
 
-def main(args):
-    # Dictionary to store random numbers for reproducibility
-    random_numbers = {}
-
+def run_simulation(args, verbose=True, task_records=None):
+    """
+    Build the workload described by args, simulate it and return the task records, the GPUs and the scheduler.
+    Records go to task_records if given (e.g. a TaskRecordWriter), otherwise to a new TaskRecordTable.
+    """
     # Create GPUs
     gpus = [GPU(gpu_id=i + 1, memory_size=memory) for i, memory in enumerate(args.gpus)]
-    scheduler = Scheduler(gpus=gpus)
     task_queue = Queue()
 
 
     # Scaling factor to adjust training times down to smallest unit possible
     # smallest_time = 0.02 # Smallest desired training time (e.g., set to 1 unit for fastest simulation)
+    # The event engine runs on a virtual clock in real seconds, so it does not need it
+    time_scale = scaling_factor if args.engine == "threads" else 1
+    # Request times in the random files are expressed on the scaled clock
+    request_time_scale = 1 if args.engine == "threads" else 1 / scaling_factor
 
     # Define model properties
     model_properties_dare = {
-        "lucadiliello/bart-small": {"training_time": 2228.8450000286102 * scaling_factor, "memory_required": 11},
-        "google/flan-t5-base": {"training_time": 1584.233999967575 * scaling_factor, "memory_required": 24},
-        "google/flan-t5-small": {"training_time": 1154.37700009346 * scaling_factor, "memory_required": 11},
+        "lucadiliello/bart-small": {"training_time": 2228.8450000286102 * time_scale, "memory_required": 11},
+        "google/flan-t5-base": {"training_time": 1584.233999967575 * time_scale, "memory_required": 24},
+        "google/flan-t5-small": {"training_time": 1154.37700009346 * time_scale, "memory_required": 11},
     }
     model_properties_no_dare = {
-        "lucadiliello/bart-small": {"training_time": 47806.575000047684 * scaling_factor, "memory_required": 11},
-        "google/flan-t5-base": {"training_time": 141987.64184201873 * scaling_factor, "memory_required": 24},
-        "google/flan-t5-small": {"training_time": 61417.08800005913 * scaling_factor, "memory_required": 11},
+        "lucadiliello/bart-small": {"training_time": 47806.575000047684 * time_scale, "memory_required": 11},
+        "google/flan-t5-base": {"training_time": 141987.64184201873 * time_scale, "memory_required": 24},
+        "google/flan-t5-small": {"training_time": 61417.08800005913 * time_scale, "memory_required": 11},
     }
 
-    SESSION_DURATION = 14 * 60 * 60 * scaling_factor
+    if args.model_catalog == "estimated":
+        # Full training times and memory from the model configs and FLOP counts instead of the profiled constants,
+        # DARE keeps its profiled chunk duration
+        catalog = model_catalog(model_properties_no_dare, args.gpu_type, args.dataset_size, root=args.model_root)
+        model_properties_no_dare = {model_name: {"training_time": properties["training_time"] * time_scale,
+                                                 "memory_required": properties["memory_required"]}
+                                    for model_name, properties in catalog.items()}
+        for model_name, properties in model_properties_dare.items():
+            properties["memory_required"] = catalog[model_name]["memory_required"]
+
+    SESSION_DURATION = 14 * 60 * 60 * time_scale
+
+    # Mean power of the models and of an idle GPU, for the energy policy and the power cap
+    model_power, idle = None, 0.0
+    if args.scheduling_type == "energy" or args.power_cap:
+        model_power = {model_name: profile["mean_W"] for model_name, profile in energy_profiles(args.power_traces).items()}
+        idle = args.idle_power if args.idle_power is not None else idle_power(args.power_traces)
+        idle = 0.0 if np.isnan(idle) else idle
+
+    # A session keeps its GPU for the whole session
+    scheduler = Scheduler(gpus=gpus, verbose=args.engine == "threads", session_duration=SESSION_DURATION if args.session else 0,
+                          sharing=args.share_gpus, slowdown=args.colocation_slowdown, power_cap=args.power_cap,
+                          model_power=model_power, idle_power=idle, min_clock=args.min_clock,
+                          clock_power_exponent=args.clock_power_exponent)
 
     # Create users and their tasks
-    user_threads = []
-    task_records = []  # List to store task allocations for Gantt charts
+    users = []
 
-    # Use random variables read from input file
+    # Use the workload read from input file (.npz, or a legacy random numbers .json)
     if args.random_file:
-        # Load random numbers from the specified file
-        with open(args.random_file, 'r') as f:
-            random_numbers = json.load(f)  # Load the dictionary from the file
-
-    for user_id in range(1, args.users + 1):
+        workload = load_workload(args.random_file)
+    else:
+        # Draw the workload from the seed
+        workload = workload_from_random_numbers(generate_random_numbers(args.users, args.tasks, args.min_time, args.max_time, args.seed))
+    model_names = workload_model_names(workload)
+
+    # Loss curves of the models, for the DARE stopping rules
+    loss_curves = {}
+    if args.policy_dare and (args.stopping_rule != "fixed" or verbose):
+        loss_curves = load_loss_curves(model_names, dict(args.loss_curves), args.loss_curve_fit)
+
+    # Group the task rows of the workload by user, keeping their order
+    tasks_by_user = {}
+    for user_id, t, model_id, request_time, size in zip(*(workload[column].tolist() for column in WORKLOAD_COLUMNS)):
+        tasks_by_user.setdefault(user_id, []).append((t, model_names[model_id], request_time, size))
+
+    for user_id, user_tasks in tasks_by_user.items():
         user = User(user_id=user_id)
-        num_tasks= random_numbers[f'user_{user_id}_num_tasks']
 
-        for t in range(num_tasks):
+        for t, model_name, request_time, size in user_tasks:
             task_id = f"task_{t}_of_user_{user_id}"
-            model_name=random_numbers[f'task_{task_id}_model_name']
             
             if not args.policy_dare:
                 model_properties = model_properties_no_dare
-                training_time = model_properties[model_name]["training_time"]
+                training_time = model_properties[model_name]["training_time"] * size
                 memory_required = model_properties[model_name]["memory_required"]
 
                 if not args.session:
@@ -77,7 +124,7 @@ def main(args):
                         user_id=user_id
                     )
                     # Assign a time for when this task will be requested by the user
-                    time_of_asking_the_task=random_numbers[f'task_{task_id}_request_time']
+                    time_of_asking_the_task=request_time * request_time_scale
                     user.add_task(time_of_asking_the_task, task)
 
                 # no DARE with session
@@ -95,7 +142,7 @@ def main(args):
                                 user_id=user_id
                             )
                             # Assign a time for when this task will be requested by the user
-                            time_of_asking_the_task=random_numbers[f'task_{task_id}_request_time'] +1e-17*index
+                            time_of_asking_the_task=request_time * request_time_scale +1e-17*index
                             user.add_task(time_of_asking_the_task, task)
 
                             remaining_time -= SESSION_DURATION
@@ -109,7 +156,7 @@ def main(args):
                             user_id=user_id
                         )
                         # Assign a time for when this task will be requested by the user
-                        time_of_asking_the_task=random_numbers[f'task_{task_id}_request_time']
+                        time_of_asking_the_task=request_time * request_time_scale
                         user.add_task(time_of_asking_the_task, task)
                         
 
@@ -129,7 +176,7 @@ def main(args):
                 #         user_id=user_id
                 #     )
                 #     # Assign a time for when this task will be requested by the user
-                #     time_of_asking_the_task=random_numbers[f'task_{task_id}_request_time'] +1e-17*index
+                #     time_of_asking_the_task=request_time +1e-17*index
                 #     user.add_task(time_of_asking_the_task, task)
 
                 #     remaining_time -= this_training_time
@@ -137,11 +184,11 @@ def main(args):
 
                 
 
-                n_retrains = int(model_properties_no_dare[model_name]["training_time"] // model_properties_dare[model_name]["training_time"])
-                for nr in range(n_retrains):
-                    model_properties = model_properties_dare
-                    training_time = model_properties[model_name]["training_time"]
-                    memory_required = model_properties[model_name]["memory_required"]
+                # Chunks of the profiled DARE duration, up to where the stopping rule ends the training on the loss curve
+                chunk_times = retrain_chunks(loss_curves.get(model_name), model_properties_no_dare[model_name]["training_time"] * size,
+                                             model_properties_dare[model_name]["training_time"], args.stopping_rule)
+                for nr, training_time in enumerate(chunk_times):
+                    memory_required = model_properties_dare[model_name]["memory_required"]
 
                     task = Task(
                         task_id=f"{task_id}_retrain_{nr}",
@@ -151,75 +198,133 @@ def main(args):
                         user_id=user_id
                     )
                     # Assign a time for when this task will be requested by the user
-                    time_of_asking_the_task=random_numbers[f'task_{task_id}_request_time']+1e-17*nr
+                    time_of_asking_the_task=request_time * request_time_scale+1e-17*nr
                     user.add_task(time_of_asking_the_task, task)
-                # print("user tasks",user.id,n_retrains, len(user.map_task))
-
-        # Create a thread for each user with their tasks
-        user_thread = UserThread(user=user, task_queue=task_queue)
-        user_threads.append(user_thread)
+                # print("user tasks",user.id,len(chunk_times), len(user.requests))
+
+        users.append(user)
+
+    if args.policy_dare and verbose:
+        # GPU-hours of the retrain chunks of the workload under each stopping rule
+        jobs = [(model_names[model_id], size) for model_id, size in zip(workload["model_id"].tolist(), workload["size"].tolist())]
+        report = stopping_report(jobs, loss_curves, {m: p["training_time"] / time_scale for m, p in model_properties_no_dare.items()},
+                                 {m: p["training_time"] / time_scale for m, p in model_properties_dare.items()})
+        for rule, row in report.iterrows():
+            print(f"Stopping rule {rule}: {int(row['chunks'])} retrain chunks, {row['gpu_hours']:.1f} GPU-hours, "
+                  f"{row['saved_gpu_hours']:.1f} saved ({row['saved_share']:.1%})" + (" <- simulated" if rule == args.stopping_rule else ""))
+
+    # Defer DARE retrain chunks into the greener (or cheaper) hours of the grid trace
+    deferral = None
+    if args.carbon_aware:
+        if args.engine != "events":
+            raise ValueError("Carbon-aware deferral needs the events engine")
+        trace = GridTrace.from_csv(args.grid_trace or SAMPLE_GRID_TRACE, args.grid_signal, args.grid_offset)
+        deferral = CarbonDeferral(trace, args.max_delay * 3600)
+        for user in users:
+            deferral.add_tasks(task for _, task in user.requests)
 
     # Initialize Policy
-    policy = Policy(policy_type=args.scheduling_type, task_queue=task_queue)
+    if args.scheduling_type == "energy":
+        gpu_power_scale = {gpu.id: scale for gpu, scale in zip(gpus, args.gpu_power_scale or [])}
+        policy = Policy(policy_type=args.scheduling_type, task_queue=task_queue, backfill=args.backfill, model_power=model_power,
+                        energy_weight=args.energy_weight, idle_power=idle, gpu_power_scale=gpu_power_scale, deferral=deferral)
+    else:
+        policy = Policy(policy_type=args.scheduling_type, task_queue=task_queue, backfill=args.backfill, deferral=deferral)
+
+    if args.engine == "events":
+        simulator = EventSimulator(scheduler, policy, task_queue, task_records=task_records)
+        for user in users:
+            simulator.add_user(user)
+        task_records = simulator.run()
+        stats = simulator.stats()
+        if verbose:
+            print(f"Simulator ran {stats['wakeups']} dispatch rounds and made {stats['scheduling_attempts']} scheduling attempts.")
+    else:
+        task_records = run_threads(users, scheduler, policy, task_queue, task_records)
+
+    return task_records, gpus, scheduler
+
+# Flags already in every results file name, and flags that do not change the results
+NAMED_FLAGS = {"users", "tasks", "seed", "scheduling_type", "min_time", "max_time", "policy_dare", "session", "engine"}
+OUTPUT_FLAGS = {"flush_interval"}
+
+def flag_value(value):
+    """A flag value as it goes into a file name: files by their name, lists joined by dashes."""
+    if isinstance(value, (list, tuple)):
+        return "-".join(flag_value(item) for item in value)
+    if isinstance(value, str) and ("/" in value or "." in os.path.basename(value)):
+        return os.path.splitext(os.path.basename(os.path.normpath(value)))[0]
+    return str(value)
+
+def results_filename(args):
+    """Generate a filename based on input parameters, with every other flag that is not at its default."""
+    suffix = "des" if args.engine == "events" else "v2"
+    parser = build_parser()
+    flags = ""
+    for dest, value in vars(args).items():
+        if dest in NAMED_FLAGS or dest in OUTPUT_FLAGS or value == parser.get_default(dest):
+            continue
+        flags += f"_{dest}" if value is True else f"_{dest}_{flag_value(value)}"
+    return f"results/task_records_users_{args.users}_tasks_{args.tasks}_seed_{args.seed}_scheduling_{args.scheduling_type}_range_{args.min_time}_{args.max_time}_dare_{str(args.policy_dare)}_session_{str(args.session)}{flags}_{suffix}.csv"
 
-    # Start user threads to request tasks
-    for u in user_threads:
-        u.start()
+def main(args):
+    filename = results_filename(args)
+
+    # Stream task_records to a CSV file while the simulation runs
+    with TaskRecordWriter(filename, flush_interval=args.flush_interval) as task_records:
+        _, gpus, scheduler = run_simulation(args, task_records=task_records)
+
+    if len(task_records):
+        df = load_task_records(filename)
+        # Keep a typed columnar copy next to the CSV for the loaders
+        if pq is not None:
+            write_records(df, filename)
+        gpu_utilization, memory_utilization = calculate_gpu_utilization(df, {gpu.id: gpu.memory_size for gpu in gpus})
+        print(f"GPU utilization: {gpu_utilization:.1%} of GPU-seconds, {memory_utilization:.1%} of GB-seconds.")
+        energy = calc_tot_energy_from_df(df, profiles=energy_profiles(args.power_traces))
+        print(f"Energy: {sum(energy):.2f} Wh (flan-t5-base {energy[0]:.2f}, flan-t5-small {energy[1]:.2f}, bart-small {energy[2]:.2f}).")
+
+        if args.carbon_aware or args.grid_trace:
+            # Emissions of every job, next to its energy, on the carbon intensity of the grid trace
+            profiles = energy_profiles(args.power_traces)
+            power_samples = simulated_power_samples(df, profiles, 0.0, [gpu.id for gpu in gpus])
+            carbon_intensity = GridTrace.from_csv(args.grid_trace or SAMPLE_GRID_TRACE, "carbon_intensity", args.grid_offset)
+            jobs = energy_by(attribute_carbon(attribute_energy(df, power_samples, profiles), carbon_intensity), ["User_ID", "Task_Id"])
+            jobs_file = filename.replace("task_records_", "job_carbon_", 1)
+            jobs.to_csv(jobs_file)
+            print(f"Carbon: {jobs['Carbon_g'].sum() / 1000:.2f} kgCO2, {jobs['Carbon_g'].mean():.1f} gCO2 per job on average, "
+                  f"{jobs['Carbon_g'].sum() / jobs['Energy_J'].sum() * 3.6e6:.1f} gCO2/kWh, per job in {jobs_file}.")
+
+    if scheduler.model_power is not None:
+        # Draw of the cluster over time, next to the task records
+        power_file = power_series_filename(filename)
+        pd.DataFrame(scheduler.power_series, columns=["Time", "Power"]).to_csv(power_file, index=False)
+        stats = scheduler.power_stats()
+        print(f"Peak power: {stats['peak_power']:.1f} W" + (f" (cap {args.power_cap:.1f} W)" if args.power_cap else "") + f", series saved to {power_file}.")
+        # Unlike the profile energy above, the series has down-clocked tasks at their lower power
+        print(f"Cluster energy: {stats['energy'] / 3600:.2f} Wh over the power series.")
+        if args.power_cap:
+            print(f"Power cap: {stats['downclocked_tasks']} tasks down-clocked, {parse_seconds_to_hours(stats['lost_gpu_seconds']):.2f} GPU-hours lost, "
+                  f"{stats['power_rejections']} placement attempts refused.")
+
+def power_series_filename(records_filename):
+    return records_filename.replace("task_records_", "power_series_", 1)
+
+def run_threads(users, scheduler, policy, task_queue, task_records=None):
+    """Run the simulation in wall-clock time with one thread per user and per task."""
+    dispatcher = Dispatcher(scheduler, policy, task_queue, task_records)
+
+    # Create a thread for each user with their tasks
+    user_threads = [UserThread(user=user, task_queue=task_queue, dispatcher=dispatcher) for user in users]
 
     # Process tasks as they arrive in the task queue
-    threads = []
-    while any(thread.is_alive() for thread in user_threads) or len(task_queue.tasks)>0:
-        # Get the next task based on the scheduling policy
-        current_task = policy.get_next_task()
-        if current_task:
-            if scheduler.assign_task_to_gpu(current_task):
-                # Track task start and end time for analysis
-                start_time = time.time()
-                end_time = start_time + current_task.training_time
-
-                task_retrain = -1
-                if len(current_task.id.split("_retrain_")) > 1:
-                    task_retrain = current_task.id.split("_retrain_")[1]
-
-                # Add task details to records for analysis
-                task_records.append({
-                    "GPU_ID": current_task.assigned_gpu.id,
-                    "Arrival_Time": current_task.arrival_time,
-                    "Start_Time": start_time,
-                    "End_Time": end_time,
-                    "Training_Time": current_task.training_time,
-                    "User_ID": current_task.user_id,
-                    "Model_Name": current_task.model_name,
-                    "Task_Id": current_task.id.split("_retrain_")[0],
-                    "Task_Retrain": task_retrain
-                })
-
-                # Start a thread for the task
-                thread = TaskThread(current_task, scheduler, SESSION_DURATION if args.session else 0)
-                thread.start()
-                threads.append(thread)
-            else:
-                # Re-add the task to the queue if no GPU is available
-                task_queue.add_task(current_task)
-
-    # Wait for all threads to complete
-    for thread in threads:
-        thread.join()
-
-    # Wait for all user threads to complete
-    for user_thread in user_threads:
-        user_thread.join()
-
-    # Generate a filename based on input parameters
-    filename = f"results/task_records_users_{args.users}_tasks_{args.tasks}_seed_{10}_scheduling_{args.scheduling_type}_range_{args.min_time}_{args.max_time}_dare_{str(args.policy_dare)}_session_{str(args.session)}_v2.csv"
-    
-    # Save task_records as a CSV file
-    with open(filename, "w", newline="") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=["GPU_ID", "Arrival_Time", "Start_Time", "End_Time", "Training_Time", "User_ID", "Model_Name", "Task_Id", "Task_Retrain"])
-        writer.writeheader()  # Write header
-        writer.writerows(task_records)  # Write each record
+    task_records = dispatcher.run(user_threads)
 
-if __name__ == "__main__":
+    stats = dispatcher.stats()
+    print(f"Dispatcher woke up {stats['wakeups']} times and made {stats['scheduling_attempts']} scheduling attempts.")
+    return task_records
+
+def build_parser():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Run a GPU Scheduler Simulation for ML Tasks")
     parser.add_argument(
@@ -231,12 +336,40 @@ if __name__ == "__main__":
     )
     parser.add_argument('--users', type=int, required=True, default=3, help="Number of users to create")
     parser.add_argument('--tasks', type=int, required=True, default=10, help="Max number of tasks each user wants to submit")
-    parser.add_argument('--scheduling-type', type=str, default='fifo', help="Task scheduling policy (fifo or shortest_job)")
+    parser.add_argument('--scheduling-type', type=str, default='fifo', help="Task scheduling policy (fifo, shortest_job or energy)")
     parser.add_argument('--min-time', type=float, required=True, default=1, help="Minimum task request time interval")
     parser.add_argument('--max-time', type=float, required=True, default=2, help="Maximum task request time interval")
     parser.add_argument('--policy-dare', type=bool, default=False, help="Use Dare policy or not")
     parser.add_argument('--session', type=bool, default=False, help="Use Dare policy or not")
-    parser.add_argument('--random-file', type=str, help="File path to load random numbers from")
+    parser.add_argument('--random-file', type=str, help="File path to load the workload from (.npz workload or random numbers .json)")
+    parser.add_argument('--seed', type=int, default=10, help="Seed of the workload, drawn when no random file is given")
+    parser.add_argument('--backfill', type=str, choices=["easy", "conservative"], default=None, help="Reserve GPUs for blocked tasks and backfill smaller tasks around the reservations")
+    parser.add_argument('--share-gpus', action='store_true', help="Pack several tasks on a GPU as long as their memory fits")
+    parser.add_argument('--colocation-slowdown', type=float, default=0.0, help="Training time increase of a task for each task already running on its GPU (e.g. 0.3 = +30%%)")
+    parser.add_argument('--flush-interval', type=float, default=5.0, help="Seconds after which buffered task records are written to the results file")
+    parser.add_argument('--energy-weight', type=float, default=0.5, help="Trade-off of the energy policy between expected energy (0) and expected delay (1)")
+    parser.add_argument('--idle-power', type=float, default=None, help="Power (W) a GPU draws as long as it runs anything (default: measured on the power traces)")
+    parser.add_argument('--gpu-power-scale', nargs='+', type=float, default=None, help="Power of each GPU of --gpus relative to the one the models were profiled on (default: 1 for all)")
+    parser.add_argument('--power-cap', type=float, default=0, help="Power budget of the cluster in W, tasks are delayed or down-clocked to stay under it (0: no cap)")
+    parser.add_argument('--min-clock', type=float, default=1.0, help="Lowest clock (fraction of the full one) tasks can be down-clocked to under the power cap (1: never down-clock)")
+    parser.add_argument('--clock-power-exponent', type=float, default=3.0, help="Exponent of the clock in the power a down-clocked task adds")
+    parser.add_argument('--carbon-aware', action='store_true', help="Defer DARE retrain chunks into the low-carbon hours of the grid trace (events engine only)")
+    parser.add_argument('--grid-trace', type=str, default=None, help="CSV of the grid with an hour column and carbon_intensity (gCO2/kWh) and price columns (default: the bundled sample trace)")
+    parser.add_argument('--grid-signal', type=str, default="carbon_intensity", help="Column of the grid trace the deferral minimizes (carbon_intensity or price)")
+    parser.add_argument('--grid-offset', type=float, default=0.0, help="Hour of the grid trace at which the simulation starts")
+    parser.add_argument('--max-delay', type=float, default=12.0, help="Maximum time (hours) the tasks of a job may be deferred in total")
+    parser.add_argument('--stopping-rule', type=str, choices=STOPPING_RULES, default="fixed", help="When DARE jobs stop retraining: after no_dare // dare chunks (fixed), or where the rule stops on the loss curve of the model")
+    parser.add_argument('--loss-curves', nargs='+', type=lambda item: tuple(item.split("=", 1)), default=[], help="eval_loss.txt log of a model, as MODEL=FILE (default: LLM_finetuning/eval_loss.txt for every model)")
+    parser.add_argument('--loss-curve-fit', action='store_true', help="Use the power law fitted to each loss curve instead of its raw eval losses")
+    parser.add_argument('--model-catalog', type=str, choices=["profiled", "estimated"], default="profiled", help="Training times and memory of the models: profiled constants, or estimated from the configs saved by lora.py on a calibrated --gpu-type (see estimators/)")
+    parser.add_argument('--gpu-type', type=str, choices=sorted(PEAK_TFLOPS), default="RTX3090", help="GPU type the estimated catalog is computed (and calibrated) for")
+    parser.add_argument('--dataset-size', type=int, default=DEFAULT_DATASET_SIZE, help="Training samples of a job of size 1 in the estimated catalog")
+    parser.add_argument('--model-root', type=str, default=MODEL_ROOT, help="Directory lora.py saved the models (and their config.json) in")
+    parser.add_argument('--power-traces', type=str, default=POLICY_TRACE_DIR, help="Directory of the energon power traces the model power profiles are measured on")
+    parser.add_argument('--engine', type=str, choices=["events", "threads"], default="events", help="Discrete-event simulation on a virtual clock (events) or wall-clock threads (threads)")
+
+    return parser
 
-    args = parser.parse_args()
+if __name__ == "__main__":
+    args = build_parser().parse_args()
     main(args)
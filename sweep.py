@@ -0,0 +1,177 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from colorama import Fore, Style, init
+from model.records import save_task_records
+from model.workload import RANDOM_NUMBERS_RANGE, random_numbers_filename
+from plots.utils import calculate_total_waiting_time, calculate_avg_jct, calc_tot_energy_from_df, calculate_gpu_utilization
+from simulation_fixed_rand_v2 import build_parser, run_simulation
+
+# Initialize colorama
+init(autoreset=True)
+
+# Parameters that identify a cell of the sweep, in the order used for its key and the index columns
+GRID_PARAMETERS = ["users", "tasks", "seed", "scheduling_type", "policy_dare", "session", "backfill", "share_gpus"]
+
+# Grid of the runs in results/{1,5,10,15,20,25,30}_users_3_tasks
+DEFAULT_GRID = {
+    "users": [1, 5, 10, 15, 20, 25, 30],
+    "tasks": [3],
+    "seed": [10],
+    "scheduling_type": ["fifo"],
+    "policy_dare": [False, True],
+    "session": [False, True],
+    "backfill": [None],
+    "share_gpus": [False],
+}
+
+# Request time range of every cell of a sweep, part of the key as it changes the workload
+RANGE_PARAMETERS = ["min_time", "max_time"]
+
+INDEX_FIELDS = GRID_PARAMETERS + RANGE_PARAMETERS + ["key", "records_file", "num_records", "mean_waiting_time", "avg_jct",
+                                                     "makespan", "energy", "gpu_utilization", "memory_utilization"]
+
+
+def expand_grid(grid: dict) -> list:
+    """Return every combination of the grid as a dict, skipping DARE with sessions (DARE already chunks the jobs)."""
+    grid = {**DEFAULT_GRID, **grid}
+    cells = []
+    for values in itertools.product(*(grid[p] for p in GRID_PARAMETERS)):
+        cell = dict(zip(GRID_PARAMETERS, values))
+        if cell["policy_dare"] and cell["session"]:
+            continue
+        cells.append(cell)
+    return cells
+
+
+def cell_key(cell: dict, min_time: float, max_time: float) -> str:
+    values = {**cell, "min_time": min_time, "max_time": max_time}
+    return "_".join(f"{p}_{values[p]}" for p in GRID_PARAMETERS + RANGE_PARAMETERS)
+
+
+def load_index(index_file: str) -> dict:
+    """
+    Return the rows of an existing sweep index, by cell key. An index with other columns (from an
+    older version) is rewritten with INDEX_FIELDS first, its cells being run again under their new key.
+    """
+    if not os.path.exists(index_file):
+        return {}
+    with open(index_file, newline="") as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    if reader.fieldnames != INDEX_FIELDS:
+        with open(index_file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS, restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    return {row["key"]: row for row in rows}
+
+
+def run_cell(cell: dict, min_time: float, max_time: float, output_dir: str) -> dict:
+    """Simulate one cell of the grid, save its task records and return its index row."""
+    argv = [
+        "--users", str(cell["users"]),
+        "--tasks", str(cell["tasks"]),
+        "--min-time", str(min_time),
+        "--max-time", str(max_time),
+        "--scheduling-type", cell["scheduling_type"],
+        "--seed", str(cell["seed"]),
+    ]
+    # Reuse the stored workload of the seed if there is one for the range of the cell, otherwise it is drawn from the seed
+    random_file = random_numbers_filename(cell["users"], cell["tasks"], cell["seed"])
+    if (min_time, max_time) == RANDOM_NUMBERS_RANGE and os.path.exists(random_file):
+        argv += ["--random-file", random_file]
+    if cell["policy_dare"]:
+        argv += ["--policy-dare", "True"]
+    if cell["session"]:
+        argv += ["--session", "True"]
+    if cell["backfill"]:
+        argv += ["--backfill", cell["backfill"]]
+    if cell["share_gpus"]:
+        argv += ["--share-gpus"]
+    args = build_parser().parse_args(argv)
+
+    task_records, gpus, _ = run_simulation(args, verbose=False)
+
+    key = cell_key(cell, min_time, max_time)
+    records_file = os.path.join(output_dir, f"task_records_{key}.csv")
+    save_task_records(records_file, task_records)
+
+    df = task_records.to_frame()
+    gpu_utilization, memory_utilization = calculate_gpu_utilization(df, {gpu.id: gpu.memory_size for gpu in gpus})
+    return {
+        **cell,
+        "min_time": min_time,
+        "max_time": max_time,
+        "key": key,
+        "records_file": os.path.basename(records_file),
+        "num_records": len(df),
+        "mean_waiting_time": calculate_total_waiting_time(df)[0],
+        "avg_jct": calculate_avg_jct(df),
+        "makespan": df["End_Time"].max() - df["Arrival_Time"].min(),
+        "energy": sum(calc_tot_energy_from_df(df)),
+        "gpu_utilization": gpu_utilization,
+        "memory_utilization": memory_utilization,
+    }
+
+
+def run_sweep(grid: dict, output_dir: str, min_time: float, max_time: float, workers: int = None) -> pd.DataFrame:
+    """Run the cells of the grid missing from the index of output_dir over a process pool and return the index."""
+    return run_cells(expand_grid(grid), output_dir, min_time, max_time, workers)
+
+
+def run_cells(cells: list, output_dir: str, min_time: float, max_time: float, workers: int = None) -> pd.DataFrame:
+    """Run the given cells missing from the index of output_dir over a process pool and return the index."""
+    os.makedirs(output_dir, exist_ok=True)
+    index_file = os.path.join(output_dir, "index.csv")
+    index = load_index(index_file)
+
+    key = lambda cell: cell_key(cell, min_time, max_time)
+    cells = [cell for cell in cells
+             if key(cell) not in index or not os.path.exists(os.path.join(output_dir, index[key(cell)]["records_file"]))]
+    print(f"{len(cells)} cells to run, {len(index)} already in {index_file}.")
+
+    if cells:
+        new_index_file = not os.path.exists(index_file)
+        with open(index_file, "a", newline="") as f, ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+            if new_index_file:
+                writer.writeheader()
+            futures = {pool.submit(run_cell, cell, min_time, max_time, output_dir): cell for cell in cells}
+            for future in as_completed(futures):
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(Fore.RED + f"Cell {key(futures[future])} failed: {e}")
+                    continue
+                # Append each cell as soon as it is done, so an interrupted sweep keeps its progress
+                writer.writerow(row)
+                f.flush()
+                print(Fore.GREEN + f"Cell {row['key']} done: {row['num_records']} records.")
+
+    if not os.path.exists(index_file):
+        return pd.DataFrame(columns=INDEX_FIELDS)
+    # Later rows win if a cell was rerun
+    return pd.read_csv(index_file).drop_duplicates(subset="key", keep="last")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a grid of GPU scheduler simulations over a process pool")
+    parser.add_argument('--grid', type=str, help="JSON file mapping parameters (users, tasks, seed, scheduling_type, policy_dare, session, backfill, share_gpus) to lists of values")
+    parser.add_argument('--output', type=str, default="results/sweep", help="Directory of the task records and of the sweep index")
+    parser.add_argument('--min-time', type=float, default=0.01, help="Minimum task request time interval")
+    parser.add_argument('--max-time', type=float, default=0.1, help="Maximum task request time interval")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+
+    index = run_sweep(grid, args.output, args.min_time, args.max_time, args.workers)
+    print(index[GRID_PARAMETERS + RANGE_PARAMETERS + ["num_records", "mean_waiting_time", "avg_jct", "energy"]].to_string(index=False))
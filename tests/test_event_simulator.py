@@ -0,0 +1,69 @@
+from model.event_simulator import EventSimulator
+from model.gpu import GPU
+from model.policy import Policy
+from model.queue import Queue
+from model.scheduler import Scheduler
+from model.task import Task
+from model.user import User
+from model.workload import generate_random_numbers
+
+# Profiled training time (s) and memory (GB) of the models without DARE
+MODEL_PROPERTIES = {
+    "lucadiliello/bart-small": (47806.575, 11),
+    "google/flan-t5-base": (141987.642, 24),
+    "google/flan-t5-small": (61417.088, 11),
+}
+
+
+def simulate(users, gpu_memory, session_duration=0):
+    queue = Queue()
+    scheduler = Scheduler([GPU(i + 1, memory) for i, memory in enumerate(gpu_memory)], verbose=False,
+                          session_duration=session_duration)
+    simulator = EventSimulator(scheduler, Policy("fifo", queue), queue)
+    for user in users:
+        simulator.add_user(user)
+    return simulator.run()
+
+
+def seeded_users(num_users, max_tasks, seed):
+    random_numbers = generate_random_numbers(num_users, max_tasks, 0.01, 0.1, seed)
+    users = []
+    for user_id in range(1, num_users + 1):
+        user = User(user_id)
+        for t in range(random_numbers[f'user_{user_id}_num_tasks']):
+            task_id = f"task_{t}_of_user_{user_id}"
+            model_name = random_numbers[f'task_{task_id}_model_name']
+            training_time, memory_required = MODEL_PROPERTIES[model_name]
+            user.add_task(random_numbers[f'task_{task_id}_request_time'] * 3600,
+                          Task(task_id, model_name, training_time, memory_required, user_id))
+        users.append(user)
+    return users
+
+
+def test_same_seeded_workload_gives_identical_records():
+    first = simulate(seeded_users(20, 3, seed=10), [24, 24, 40, 40])
+    second = simulate(seeded_users(20, 3, seed=10), [24, 24, 40, 40])
+    assert len(first) > 0
+    assert first.to_frame().equals(second.to_frame())
+
+
+def test_two_tasks_on_two_gpus():
+    user = User(1)
+    user.add_task(0, Task("task_0_of_user_1", "google/flan-t5-small", 100, 11, 1))
+    user.add_task(10, Task("task_1_of_user_1", "google/flan-t5-small", 50, 11, 1))
+    records = list(simulate([user], [40, 40]))
+
+    # Each task gets a GPU of its own as soon as it arrives
+    assert len(records) == 2
+    assert sorted((r["GPU_ID"], r["Start_Time"], r["End_Time"]) for r in records) == [(1, 0, 100), (2, 10, 60)]
+    assert max(r["End_Time"] for r in records) == 100
+
+
+def test_session_holds_the_gpu_for_the_whole_session():
+    user = User(1)
+    user.add_task(0, Task("task_0_of_user_1", "google/flan-t5-small", 100, 11, 1))
+    user.add_task(0, Task("task_1_of_user_1", "google/flan-t5-small", 100, 11, 1))
+    records = list(simulate([user], [40], session_duration=300))
+
+    # The training ends after 100 s but the GPU only frees up when the 300 s session is over
+    assert [(r["Start_Time"], r["End_Time"]) for r in records] == [(0, 100), (300, 400)]
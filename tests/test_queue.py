@@ -0,0 +1,50 @@
+from model.gpu import GPU
+from model.policy import Policy
+from model.queue import Queue
+from model.scheduler import Scheduler
+from model.task import Task
+
+
+def make_task(task_id, training_time=100, memory_required=20):
+    return Task(task_id, "google/flan-t5-small", training_time, memory_required, user_id=1)
+
+
+def drain(queue):
+    return [task.id for task in iter(queue.get_next_task, None)]
+
+
+def test_equal_keys_come_out_in_arrival_order():
+    queue = Queue("training_time")
+    for task_id, training_time in [("a", 50), ("b", 10), ("c", 50), ("d", 10), ("e", 50)]:
+        queue.add_task(make_task(task_id, training_time))
+    assert drain(queue) == ["b", "d", "a", "c", "e"]
+
+
+def test_removing_a_held_task():
+    queue = Queue()
+    for task_id in ["a", "b"]:
+        queue.add_task(make_task(task_id))
+    queue.hold_next(("memory", 20))
+
+    assert queue.remove("a").id == "a"
+    assert len(queue) == 1
+    assert queue.peek_held(("memory", 20)) is None
+    queue.release(("memory", 20))
+    assert drain(queue) == ["b"]
+
+
+def test_released_tasks_get_their_place_back():
+    queue = Queue()
+    policy = Policy("fifo", queue)
+    scheduler = Scheduler([GPU(i + 1, 40) for i in range(4)], verbose=False)
+    for task_id in ["a", "b", "c", "d"]:
+        queue.add_task(make_task(task_id))
+    # a and c wait for memory, b for an earlier chunk of its job
+    queue.hold_next(("memory", 20))
+    queue.hold_next(("job", "b"))
+    queue.hold_next(("memory", 20))
+
+    assert drain(queue) == ["d"]
+    queue.add_task(make_task("e"))
+    policy.release_held_tasks(scheduler)
+    assert drain(queue) == ["a", "b", "c", "e"]
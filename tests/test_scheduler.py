@@ -0,0 +1,39 @@
+from model.event_simulator import EventSimulator
+from model.gpu import GPU
+from model.policy import Policy
+from model.queue import Queue
+from model.scheduler import Scheduler
+from model.task import Task
+from model.user import User
+
+
+def make_task(task_id, memory_required, training_time=100):
+    return Task(task_id, "google/flan-t5-small", training_time, memory_required, user_id=1)
+
+
+def test_task_goes_to_the_smallest_free_gpu_that_fits():
+    scheduler = Scheduler([GPU(1, 80), GPU(2, 24), GPU(3, 40)], verbose=False)
+    placements = []
+    for task_id, memory_required in [("a", 30), ("b", 20), ("c", 20)]:
+        task = make_task(task_id, memory_required)
+        assert scheduler.assign_task_to_gpu(task)
+        placements.append(task.assigned_gpu.id)
+    assert placements == [3, 2, 1]
+    assert not scheduler.assign_task_to_gpu(make_task("d", 10))
+
+
+def test_easy_backfill_never_delays_the_head_task():
+    # x leaves 20 GB of the shared GPU until t=100, h needs all of it and gets a reservation at t=100.
+    # The long s would run past it and must wait, the short s2 ends before it and may backfill.
+    queue = Queue()
+    scheduler = Scheduler([GPU(1, 80)], verbose=False, sharing=True)
+    simulator = EventSimulator(scheduler, Policy("fifo", queue, backfill="easy"), queue)
+    user = User(1)
+    for time, (task_id, memory_required, training_time) in enumerate([("x", 60, 100), ("h", 80, 10), ("s", 20, 500), ("s2", 20, 50)]):
+        user.add_task(time, make_task(task_id, memory_required, training_time))
+    simulator.add_user(user)
+    starts = {record["Task_Id"]: record["Start_Time"] for record in simulator.run()}
+
+    assert starts["h"] == 100
+    assert starts["s2"] == 3
+    assert starts["s"] >= 110